@@ -5,11 +5,20 @@
 #include <CmdMessenger.h>      // load CmdMessenger library
 #include <Callback.h>
 #include <SoftwareSerial.h>
+#include "Sample4ChannelVoltages.h"
+#include "SampleFifo.h"
 
 extern volatile float g_measuredVoltages[];
 extern volatile int g_switchStatus[];
+extern volatile uint32_t g_sampleTimestamp;
+extern volatile uint16_t g_sampleCounter;
+extern volatile int16_t g_rawCodes[];
 
 extern SoftwareSerial SWSerial;
+extern Sample4ChannelVoltages voltagesSampler;
+extern SampleFifo g_sampleFifo;
+
+#define MaxNoChannels 4
 
 namespace CM_PC 
 {
@@ -19,6 +28,43 @@ int seriesLengthCount;
 
 float measuredTemperature = 0.0;
 
+// streaming of the samples to the PC
+#define STREAMING_OFF     0
+#define STREAMING_CMDMSG  1      // streamedSample frames of CmdMessenger
+#define STREAMING_BINARY  2      // compact binary sample frames
+uint8_t streamingMode = STREAMING_OFF;
+uint16_t lastStreamedSample = 0;
+
+// compact binary sample frame, has to match the frame layout in SampleFrames.py
+#define SAMPLE_FRAME_SYNC0 0xA5
+#define SAMPLE_FRAME_SYNC1 0x5A
+struct SampleFrame
+{
+  uint8_t  sync[2];                     // SAMPLE_FRAME_SYNC0, SAMPLE_FRAME_SYNC1
+  uint16_t sequence;                    // g_sampleCounter of the sample, a gap shows samples not received
+  uint32_t timestamp;                   // milliseconds since start
+  int16_t  codes[MaxNoChannels];        // raw ADC codes
+  uint8_t  switches;                    // bit k set if the switch of channel k+1 is in position 1:1
+  uint16_t crc;                         // CRC-16/CCITT over sequence..switches
+} __attribute__((packed));
+
+// baud rate of the PC link, negotiated with areYouReady
+#define DEFAULT_BAUD_RATE 9600
+#define BAUD_RATE_CONFIRM_TIMEOUT 2000   // fall back to the default baud rate if not confirmed in time (ms)
+const uint32_t supportedBaudRates[] = {115200, 57600, 38400, 19200, 9600};   // highest first
+uint32_t currentBaudRate = DEFAULT_BAUD_RATE;
+bool baudRateConfirmed = true;
+uint32_t baudRateSwitchTime = 0;
+
+// CRC-16/CCITT (polynomial 0x1021, initial value 0xFFFF)
+uint16_t crc16Update(uint16_t crc, uint8_t data)
+{
+  crc ^= (uint16_t)data << 8;
+  for(uint8_t i = 0; i < 8; i++)
+    crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+  return crc;
+}
+
 // Attach a new CmdMessenger object to the default Serial serial port to communicate with the PC via Arduino Monitor
 char field_separator_PC   = ',';
 char command_separator_PC = ';';
@@ -63,6 +109,26 @@ enum
   // sent back a numeric value
   kFloatValue               , // Command to sent back a float value
   kInt16Value               , // Command to sent back a int16 value
+
+  // send all channels in one frame
+  kSendAllChannels          , // Command to send all measured voltages and switch states to the PC
+  kAllChannelsValues        , // Command to sent back all measured voltages and switch states
+
+  // streaming of the samples to the PC
+  kStreamedSample           , // Command to push a timestamped sample of all channels to the PC
+
+  // configuration of the ADS1115
+  kGetAdcConfig             , // Command to ask for the measure mode, data rate and range of the ADS1115
+  kSetAdcConfig             , // Command to set the measure mode, data rate and range of the ADS1115
+  kAdcConfigValues          , // Command to sent back the configuration of the ADS1115
+
+  // block transfer of the buffered samples to the PC
+  kSendSampleBlock          , // Command to send up to N of the buffered samples to the PC
+  kFifoSample               , // Command to sent back one buffered sample
+  kSampleBlock              , // Command to end the block with the number of samples sent and left
+
+  // baud rate negotiation
+  kBaudRateAccepted         , // Command to sent back the baud rate accepted for areYouReady
   
   // Clear & Binary text data test
   kValuePing                , // Command to send value to other side
@@ -111,12 +177,53 @@ void OnAcknowledgePC()
   cmdMessengerPC.sendCmd(kAcknowledge,F("to PC: ACK"));
 }
 
+void switchBaudRate(uint32_t baudRate)
+{
+  SWSerial.end();
+  SWSerial.begin(baudRate);
+  currentBaudRate = baudRate;
+}
+
 void OnArduinoReadyPC()
 {
+  // the optional argument is the highest baud rate supported by the PC:
+  // answer with the highest common baud rate and switch to it
+  uint32_t requestedBaudRate = cmdMessengerPC.readBinArg<uint32_t>();
+  if (cmdMessengerPC.isArgOk())
+  {
+    uint32_t acceptedBaudRate = DEFAULT_BAUD_RATE;
+    for(uint8_t i = 0; i < sizeof(supportedBaudRates)/sizeof(supportedBaudRates[0]); i++)
+    {
+      if (supportedBaudRates[i] <= requestedBaudRate)
+      {
+        acceptedBaudRate = supportedBaudRates[i];
+        break;
+      }
+    }
+    // the answer still goes out with the old baud rate (SoftwareSerial writes blocking)
+    cmdMessengerPC.sendBinCmd(kBaudRateAccepted, acceptedBaudRate);
+    switchBaudRate(acceptedBaudRate);
+    baudRateConfirmed = false;
+    baudRateSwitchTime = millis();
+    return;
+  }
+
   // In response to ping. We just send a throw-away acknowledgment to say "i'm ready"
+  // at a new baud rate this confirms that the PC has switched successfully
+  baudRateConfirmed = true;
   cmdMessengerPC.sendCmd(kAcknowledge,F("to PC: Arduino ready"));
 }
 
+// go back to the default baud rate if the PC did not confirm the new one
+void checkBaudRateConfirmation(uint32_t now)
+{
+  if (!baudRateConfirmed && (now - baudRateSwitchTime) > BAUD_RATE_CONFIRM_TIMEOUT)
+  {
+    switchBaudRate(DEFAULT_BAUD_RATE);
+    baudRateConfirmed = true;
+  }
+}
+
 void OnUnknownCommandPC()
 {
   // Default response for unknown commands and corrupt messages
@@ -176,16 +283,153 @@ void OnSendSwitchStatusChannel4ToPC()
   cmdMessengerPC.sendBinCmd(kInt16Value,g_switchStatus[3]);
 }
 
+void OnSendAllChannelsToPC()
+{
+  // one frame with the four voltages followed by the four switch states
+  cmdMessengerPC.sendCmdStart(kAllChannelsValues);
+  for(uint8_t k = 0; k < MaxNoChannels; k++)
+    cmdMessengerPC.sendCmdBinArg((float)g_measuredVoltages[k]);
+  for(uint8_t k = 0; k < MaxNoChannels; k++)
+    cmdMessengerPC.sendCmdBinArg((int16_t)g_switchStatus[k]);
+  cmdMessengerPC.sendCmdEnd();
+}
+
 void OnTurnOnMeasurements()
 {
-  cmdMessengerPC.sendCmd(kAcknowledge,F("to PC: turn on measurements"));
+  // the optional argument starts streaming the samples to the PC:
+  // 1 = streamedSample frames, 2 = compact binary sample frames
+  int16_t requestedMode = cmdMessengerPC.readBinArg<int16_t>();
+  if (cmdMessengerPC.isArgOk() && (requestedMode == STREAMING_CMDMSG || requestedMode == STREAMING_BINARY))
+  {
+    streamingMode = requestedMode;
+    lastStreamedSample = g_sampleCounter;
+    if (streamingMode == STREAMING_BINARY)
+      cmdMessengerPC.sendCmd(kAcknowledge,F("to PC: turn on measurements binary streaming"));
+    else
+      cmdMessengerPC.sendCmd(kAcknowledge,F("to PC: turn on measurements streaming"));
+  }
+  else
+    cmdMessengerPC.sendCmd(kAcknowledge,F("to PC: turn on measurements"));
 }
 
 void OnTurnOffMeasurements()
 {
+  streamingMode = STREAMING_OFF;
   cmdMessengerPC.sendCmd(kAcknowledge,F("to PC: turn off measurements"));
 }
 
+// write the latest sample as compact binary frame
+void sendBinarySampleFrame()
+{
+  SampleFrame frame;
+  frame.sync[0] = SAMPLE_FRAME_SYNC0;
+  frame.sync[1] = SAMPLE_FRAME_SYNC1;
+  frame.sequence = g_sampleCounter;
+  frame.timestamp = g_sampleTimestamp;
+  frame.switches = 0;
+  for(uint8_t k = 0; k < MaxNoChannels; k++)
+  {
+    frame.codes[k] = g_rawCodes[k];
+    if (g_switchStatus[k] == 1)
+      frame.switches |= (1 << k);
+  }
+
+  // the CRC covers all bytes between the sync bytes and the CRC
+  uint16_t crc = 0xFFFF;
+  const uint8_t *bytes = (const uint8_t *)&frame;
+  for(uint8_t i = sizeof(frame.sync); i < sizeof(frame) - sizeof(frame.crc); i++)
+    crc = crc16Update(crc, bytes[i]);
+  frame.crc = crc;
+
+  SWSerial.write((const uint8_t *)&frame, sizeof(frame));
+}
+
+// push the new sample to the PC if streaming is on, called by the measurements task for every sample
+void streamNewSample()
+{
+  if (streamingMode == STREAMING_OFF || lastStreamedSample == g_sampleCounter)
+    return;
+  lastStreamedSample = g_sampleCounter;
+
+  if (streamingMode == STREAMING_BINARY)
+  {
+    sendBinarySampleFrame();
+    return;
+  }
+
+  cmdMessengerPC.sendCmdStart(kStreamedSample);
+  cmdMessengerPC.sendCmdBinArg((uint32_t)g_sampleTimestamp);
+  for(uint8_t k = 0; k < MaxNoChannels; k++)
+    cmdMessengerPC.sendCmdBinArg((float)g_measuredVoltages[k]);
+  for(uint8_t k = 0; k < MaxNoChannels; k++)
+    cmdMessengerPC.sendCmdBinArg((int16_t)g_switchStatus[k]);
+  cmdMessengerPC.sendCmdEnd();
+}
+
+// measure mode (0 = single shot, 1 = continuous), data rate / SPS, range / mV and the lost conversion sets
+void sendAdcConfig()
+{
+  cmdMessengerPC.sendCmdStart(kAdcConfigValues);
+  cmdMessengerPC.sendCmdBinArg((int16_t)voltagesSampler.getMeasureMode());
+  cmdMessengerPC.sendCmdBinArg((int16_t)voltagesSampler.getDataRate());
+  cmdMessengerPC.sendCmdBinArg((int16_t)voltagesSampler.getRange());
+  cmdMessengerPC.sendCmdBinArg((uint32_t)voltagesSampler.getNoOverflows());
+  cmdMessengerPC.sendCmdEnd();
+}
+
+void OnGetAdcConfig()
+{
+  sendAdcConfig();
+}
+
+void OnSetAdcConfig()
+{
+  // a configuration which is not supported is not applied, the reply
+  // contains the configuration in use in any case
+  int16_t mode = cmdMessengerPC.readBinArg<int16_t>();
+  int16_t dataRate = cmdMessengerPC.readBinArg<int16_t>();
+  int16_t range = cmdMessengerPC.readBinArg<int16_t>();
+  if (cmdMessengerPC.isArgOk() && (mode == MEASURE_SINGLE_SHOT || mode == MEASURE_CONTINUOUS))
+  {
+    uint16_t previousDataRate = voltagesSampler.getDataRate();
+    if (voltagesSampler.setDataRate(dataRate))
+    {
+      if (voltagesSampler.setRange(range))
+        voltagesSampler.setMeasureMode(mode);
+      else
+        voltagesSampler.setDataRate(previousDataRate);
+    }
+  }
+  sendAdcConfig();
+}
+
+void OnSendSampleBlock()
+{
+  // the oldest buffered samples, one fifoSample each, up to the requested number,
+  // the block ends with the number of samples sent, left in the FIFO and lost
+  int16_t maxSamples = cmdMessengerPC.readBinArg<int16_t>();
+  if (!cmdMessengerPC.isArgOk() || maxSamples <= 0 || maxSamples > SampleFifoSize)
+    maxSamples = SampleFifoSize;
+  FifoSample sample;
+  int16_t noSamples = 0;
+  while (noSamples < maxSamples && g_sampleFifo.pop(sample))
+  {
+    cmdMessengerPC.sendCmdStart(kFifoSample);
+    cmdMessengerPC.sendCmdBinArg((uint32_t)sample.timestamp);
+    for(uint8_t k = 0; k < MaxNoChannels; k++)
+      cmdMessengerPC.sendCmdBinArg((float)(sample.codes[k] * (sample.range_mV / 1000.0) / 32768.0));
+    for(uint8_t k = 0; k < MaxNoChannels; k++)
+      cmdMessengerPC.sendCmdBinArg((int16_t)((sample.switches >> k) & 1));
+    cmdMessengerPC.sendCmdEnd();
+    noSamples++;
+  }
+  cmdMessengerPC.sendCmdStart(kSampleBlock);
+  cmdMessengerPC.sendCmdBinArg(noSamples);
+  cmdMessengerPC.sendCmdBinArg((int16_t)g_sampleFifo.count());
+  cmdMessengerPC.sendCmdBinArg((uint32_t)g_sampleFifo.getNoOverflows());
+  cmdMessengerPC.sendCmdEnd();
+}
+
 void OnResetMeasurements()
 {
   cmdMessengerPC.sendCmd(kAcknowledge,F("to PC: reset measurements"));  
@@ -396,10 +640,20 @@ void attachCommandCallbacksPCComms()
   // status of channel4 switch sent to the PC
   cmdMessengerPC.attach(kSendSwitchChannel4, OnSendSwitchStatusChannel4ToPC);
 
+  // all voltages and switch states sent to the PC in one frame
+  cmdMessengerPC.attach(kSendAllChannels, OnSendAllChannelsToPC);
+
   // turn on an off and reset the measurements
   cmdMessengerPC.attach(kturnOnMeasurements, OnTurnOnMeasurements);
   cmdMessengerPC.attach(kturnOffMeasurements, OnTurnOffMeasurements);
   cmdMessengerPC.attach(kResetMeasurements, OnResetMeasurements);
+
+  // configuration of the ADS1115
+  cmdMessengerPC.attach(kGetAdcConfig, OnGetAdcConfig);
+  cmdMessengerPC.attach(kSetAdcConfig, OnSetAdcConfig);
+
+  // block transfer of the buffered samples
+  cmdMessengerPC.attach(kSendSampleBlock, OnSendSampleBlock);
   
   // Clear & Binary text data test
   cmdMessengerPC.attach(kValuePing, OnValuePingPC);
@@ -46,6 +46,9 @@ void CommunicationTask::run(uint32_t now)
   // Process incoming serial data, and perform callbacks
   CM_PC::cmdMessengerPC.feedinSerialData();
 
+  // fall back to the default baud rate if a negotiated one was not confirmed
+  CM_PC::checkBaudRateConfirmation(now);
+
   // Run again in the required number of milliseconds.
   incRunTime(period);
 }
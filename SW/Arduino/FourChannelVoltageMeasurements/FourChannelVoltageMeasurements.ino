@@ -14,7 +14,7 @@
 #include "MeasurementsTask.h"
 
 #define BlinkerPeriod 1000
-#define CommsPeriod 1000         // period between the activations of the communication task in milliseconds
+#define CommsPeriod 10           // period between the activations of the communication task in milliseconds
 #define MeasurementsPeriod 1000  // period between the activations of the measurements task in milliseconds
 
 SoftwareSerial SWSerial(2,3);
@@ -30,7 +30,8 @@ void setup()
   Serial.begin(9600);
 
   // start the debug serial port
-  SWSerial.begin(9600);
+  // the PC link starts with the default baud rate, a higher one is negotiated by the PC
+  SWSerial.begin(DEFAULT_BAUD_RATE);
   // SWSerial.println(F("SWSerial setup done"));
 
   // setup the measurements task
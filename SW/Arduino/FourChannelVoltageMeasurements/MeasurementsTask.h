@@ -7,15 +7,25 @@
 
 #include "Sample4ChannelVoltages.h"
 #include "Handle4ChannelSwitches.h"
+#include "CmdMessengerPC.h"
+#include "SampleFifo.h"
 
 #define MaxNoChannels 4
+#define ContinuousPollPeriod 1   // period between the polls of the conversions in continuous mode in milliseconds
 
 // global variable for the data exchange with the communication task
 volatile float g_measuredVoltages[MaxNoChannels];
 volatile int g_switchStatus[MaxNoChannels];
+volatile int16_t g_rawCodes[MaxNoChannels];   // raw ADC codes for the binary sample frames
+volatile uint32_t g_sampleTimestamp = 0;   // time of the latest sample in milliseconds
+volatile uint16_t g_sampleCounter = 0;     // incremented with every new sample
 float *voltages;
+int16_t *rawCodes;
 int *switches;
 
+// the samples buffered for the block transfer to the PC
+SampleFifo g_sampleFifo;
+
 // The 4-channel voltage sample interface
 Sample4ChannelVoltages voltagesSampler;
 
@@ -31,6 +41,7 @@ public:
 
     void storeMeasurementValues();
     void storeSwitchValues();
+    void storeSample(uint32_t timestamp);
     void setup(void);
     virtual void run(uint32_t now);
     
@@ -49,7 +60,10 @@ MeasurementsTask::MeasurementsTask(uint32_t _period)
 void MeasurementsTask::storeMeasurementValues()
 {
   for(uint8_t k = 0; k < MaxNoChannels; k++)
+  {
      g_measuredVoltages[k] = voltages[k];
+     g_rawCodes[k] = rawCodes[k];
+  }
 }
 
 // store the status of the switches
@@ -80,17 +94,44 @@ void MeasurementsTask::setup(void)
   Serial.println(F("Setup in MeasurementsTask task done"));
 }
 
-void MeasurementsTask::run(uint32_t now)
+// store the latest voltages with the status of the switches as new sample
+void MeasurementsTask::storeSample(uint32_t timestamp)
 {
-  // get the voltage measurements
-  voltagesSampler.getSamples();                      // sample the voltages
   voltages = voltagesSampler.returnSamples();        // return the measured voltages
+  rawCodes = voltagesSampler.returnRawSamples();     // return the raw ADC codes
   storeMeasurementValues();                          // store the measured voltages in the global variable
-  
+
   // get the status of the switches 
   switchesHandler.getSwitchStatus();                  // sample the status of the switches
   switches = switchesHandler.returnSwitchStatus();    // return the status of the switches
   storeSwitchValues();                                // store the status of the switches
+
+  // mark the new sample and push it to the PC right away when streaming is on,
+  // so it cannot be replaced by the next sample before it is streamed
+  g_sampleTimestamp = timestamp;
+  g_sampleCounter++;
+  CM_PC::streamNewSample();
+
+  // buffer the sample until the PC reads it with sendSampleBlock
+  g_sampleFifo.push(timestamp, rawCodes, switches, voltagesSampler.getRange());
+}
+
+void MeasurementsTask::run(uint32_t now)
+{
+  if (voltagesSampler.getMeasureMode() == MEASURE_CONTINUOUS)
+  {
+    // the ADS1115 converts on its own, store every complete set of the four channels
+    uint32_t timestamp;
+    voltagesSampler.pollConversions();
+    while (voltagesSampler.readConversionSet(timestamp))
+      storeSample(timestamp);
+    incRunTime(ContinuousPollPeriod);
+    return;
+  }
+
+  // get the voltage measurements
+  voltagesSampler.getSamples();                      // sample the voltages
+  storeSample(now);
   
   // Run again in the required number of milliseconds.
   incRunTime(period);
@@ -1,7 +1,13 @@
 /***************************************************************************
 * Interface class for the ADS1115_WE library
 *
-* The ADS1115 is used in single shot mode.
+* The ADS1115 is used in single shot mode (default) or in continuous-conversion mode.
+* In continuous mode the ADS1115 converts without being triggered at the selected data
+* rate. The measurements task polls the conversions, a conversion is finished when
+* its conversion time at the data rate has passed. It switches the multiplexer to the
+* next channel and buffers the complete sets of the four channels until they are read.
+* The ALERT/RDY pin is not used: the external interrupt pins 2 and 3 of the Uno/Nano
+* are used by SWSerial, which also takes all pin change interrupts.
 *  
 * Further information can be found on:
 * https://wolles-elektronikkiste.de/ads1115 (German)
@@ -9,12 +15,37 @@
 * 
 ***************************************************************************/
 
+#ifndef SAMPLE4CHANNELVOLTAGES_H
+#define SAMPLE4CHANNELVOLTAGES_H
+
 #include<ADS1115_WE.h> 
 #include<Wire.h>
 #define I2C_ADDRESS 0x48
 #define LED_PIN 10
 #define MaxNoChannels 4
 
+#define MEASURE_SINGLE_SHOT 0
+#define MEASURE_CONTINUOUS  1
+
+#define ConversionBufferSize 8     // complete sets of conversions buffered in continuous mode
+
+// the data rates in SPS and ranges in mV selectable by the PC and their ADS1115_WE settings
+const uint16_t adcDataRates[] = {8, 16, 32, 64, 128, 250, 475, 860};
+const ADS1115_CONV_RATE adcConvRates[] = {ADS1115_8_SPS, ADS1115_16_SPS, ADS1115_32_SPS, ADS1115_64_SPS,
+                                         ADS1115_128_SPS, ADS1115_250_SPS, ADS1115_475_SPS, ADS1115_860_SPS};
+const uint16_t adcRanges[] = {6144, 4096, 2048, 1024, 512, 256};
+const ADS1115_RANGE adcRangeSettings[] = {ADS1115_RANGE_6144, ADS1115_RANGE_4096, ADS1115_RANGE_2048,
+                                          ADS1115_RANGE_1024, ADS1115_RANGE_0512, ADS1115_RANGE_0256};
+const ADS1115_MUX channelMux[MaxNoChannels] = {ADS1115_COMP_0_GND, ADS1115_COMP_1_GND,
+                                               ADS1115_COMP_2_GND, ADS1115_COMP_3_GND};
+
+// the raw codes of the four channels converted in continuous mode
+struct ConversionSet
+{
+  uint32_t timestamp;                 // milliseconds since start at the conversion of channel 1
+  int16_t codes[MaxNoChannels];
+};
+
 class Sample4ChannelVoltages
 {
 public:
@@ -23,10 +54,44 @@ public:
    float readChannel(ADS1115_MUX channel);
    void getSamples();
    float* returnSamples() { return voltages; };
+   int16_t* returnRawSamples() { return rawCodes; };
+
+   // configuration of the ADS1115, false if the value is not supported
+   bool setDataRate(uint16_t dataRate_SPS);
+   bool setRange(uint16_t range_mV);
+   void setMeasureMode(uint8_t mode);
+   uint8_t getMeasureMode() { return measureMode; };
+   uint16_t getDataRate() { return dataRate_SPS; };
+   uint16_t getRange() { return range_mV; };
+   uint32_t getNoOverflows() { return noOverflows; };
+
+   // continuous mode: poll the conversions, read the buffered sets into the samples
+   void pollConversions();
+   bool readConversionSet(uint32_t &timestamp);
 
 private:
+   void startChannel(uint8_t channel);
+   float codeToVoltage(int16_t code) { return code * (range_mV / 1000.0) / 32768.0; };
+
    float voltages[MaxNoChannels];
+   int16_t rawCodes[MaxNoChannels];    // raw conversion results for the binary frames
+   int16_t lastRawCode;
    ADS1115_WE *adc;
+
+   uint8_t measureMode = MEASURE_SINGLE_SHOT;
+   uint16_t dataRate_SPS = 128;
+   uint16_t range_mV = 6144;
+
+   // continuous mode
+   uint8_t currentChannel = 0;
+   bool discardConversion = false;     // the conversion running while the multiplexer was switched
+   uint32_t conversionStart = 0;       // micros() at the start of the current conversion
+   uint32_t conversionTime = 0;        // duration of a conversion in microseconds incl. 10 % tolerance
+   ConversionSet currentSet;
+   ConversionSet conversionBuffer[ConversionBufferSize];
+   uint8_t bufferHead = 0;
+   uint8_t bufferCount = 0;
+   uint32_t noOverflows = 0;           // sets lost because the buffer was full
 };
 
 
@@ -142,6 +207,8 @@ void Sample4ChannelVoltages::setup()
    */
   //adc.setAlertPinToConversionReady(); //uncomment if you want to change the default
 
+  setDataRate(dataRate_SPS);
+
   Serial.println(F("ADS1115 setup done"));
   Serial.println();
 }
@@ -153,6 +220,7 @@ float Sample4ChannelVoltages::readChannel(ADS1115_MUX channel)
   adc->startSingleMeasurement();
   while(adc->isBusy()){}
   voltage = adc->getResult_V(); // alternative: getResult_mV for Millivolt
+  lastRawCode = adc->getRawResult();
   return voltage;
 }
 
@@ -163,21 +231,25 @@ void Sample4ChannelVoltages::getSamples()
   Serial.print("Voltages: CH1: ");
   voltage = readChannel(ADS1115_COMP_0_GND);
   voltages[0] = voltage;
+  rawCodes[0] = lastRawCode;
   Serial.print(voltage);
 
   Serial.print(", CH2: ");
   voltage = readChannel(ADS1115_COMP_1_GND);
   voltages[1] = voltage;
+  rawCodes[1] = lastRawCode;
   Serial.print(voltage);
   
   Serial.print(", CH3: ");
   voltage = readChannel(ADS1115_COMP_2_GND);
   voltages[2] = voltage;
+  rawCodes[2] = lastRawCode;
   Serial.print(voltage);
 
   Serial.print(", CH4: ");
   voltage = readChannel(ADS1115_COMP_3_GND);
   voltages[03] = voltage;
+  rawCodes[3] = lastRawCode;
   Serial.println(voltage);
 
   /*
@@ -187,3 +259,109 @@ void Sample4ChannelVoltages::getSamples()
   digitalWrite(LED_PIN,LOW);
   */
 }
+
+bool Sample4ChannelVoltages::setDataRate(uint16_t dataRate)
+{
+  for(uint8_t i = 0; i < sizeof(adcDataRates)/sizeof(adcDataRates[0]); i++)
+  {
+    if (adcDataRates[i] == dataRate)
+    {
+      adc->setConvRate(adcConvRates[i]);
+      dataRate_SPS = dataRate;
+      // the internal oscillator of the ADS1115 may be up to 10 % slow
+      conversionTime = 1100000UL / dataRate_SPS;
+      return true;
+    }
+  }
+  return false;
+}
+
+bool Sample4ChannelVoltages::setRange(uint16_t range)
+{
+  for(uint8_t i = 0; i < sizeof(adcRanges)/sizeof(adcRanges[0]); i++)
+  {
+    if (adcRanges[i] == range)
+    {
+      adc->setVoltageRange_mV(adcRangeSettings[i]);
+      range_mV = range;
+      return true;
+    }
+  }
+  return false;
+}
+
+void Sample4ChannelVoltages::setMeasureMode(uint8_t mode)
+{
+  measureMode = mode;
+  if (measureMode == MEASURE_CONTINUOUS)
+  {
+    bufferCount = 0;
+    adc->setMeasureMode(ADS1115_CONTINUOUS);
+    startChannel(0);
+  }
+  else
+  {
+    adc->setMeasureMode(ADS1115_SINGLE);
+  }
+}
+
+void Sample4ChannelVoltages::startChannel(uint8_t channel)
+{
+  // switching the multiplexer does not wait for the next conversion as setCompareChannels
+  // does in continuous mode, the conversion running meanwhile is discarded
+  currentChannel = channel;
+  adc->setCompareChannels_nonblock(channelMux[channel]);
+  discardConversion = true;
+  conversionStart = micros();
+}
+
+void Sample4ChannelVoltages::pollConversions()
+{
+  // polled, the conversion has finished after its conversion time
+  if ((micros() - conversionStart) < conversionTime)
+    return;
+
+  conversionStart = micros();
+  if (discardConversion)
+  {
+    discardConversion = false;
+    return;
+  }
+
+  if (currentChannel == 0)
+    currentSet.timestamp = millis();
+  currentSet.codes[currentChannel] = adc->getRawResult();
+  if (currentChannel < MaxNoChannels - 1)
+  {
+    startChannel(currentChannel + 1);
+    return;
+  }
+
+  // a complete set of the four channels, a full buffer loses the newest set
+  if (bufferCount == ConversionBufferSize)
+    noOverflows++;
+  else
+  {
+    conversionBuffer[(bufferHead + bufferCount) % ConversionBufferSize] = currentSet;
+    bufferCount++;
+  }
+  startChannel(0);
+}
+
+bool Sample4ChannelVoltages::readConversionSet(uint32_t &timestamp)
+{
+  if (bufferCount == 0)
+    return false;
+  ConversionSet *set = &conversionBuffer[bufferHead];
+  timestamp = set->timestamp;
+  for(uint8_t k = 0; k < MaxNoChannels; k++)
+  {
+    rawCodes[k] = set->codes[k];
+    voltages[k] = codeToVoltage(set->codes[k]);
+  }
+  bufferHead = (bufferHead + 1) % ConversionBufferSize;
+  bufferCount--;
+  return true;
+}
+
+#endif
@@ -0,0 +1,71 @@
+/* Ring FIFO of the timestamped samples for the block transfer to the PC
+ *
+ * Every sample of the measurements task is pushed, sendSampleBlock drains the
+ * oldest samples. If the PC does not read the samples in time the oldest sample
+ * is overwritten and counted as overflow.
+ */
+#ifndef SAMPLEFIFO_H
+#define SAMPLEFIFO_H
+
+#include <Arduino.h>
+
+#define MaxNoChannels 4
+#define SampleFifoSize 24      // 15 bytes per sample
+
+struct FifoSample
+{
+  uint32_t timestamp;                 // milliseconds since start
+  int16_t  codes[MaxNoChannels];      // raw ADC codes
+  uint16_t range_mV;                  // range of the ADS1115 for the codes
+  uint8_t  switches;                  // bit k set if the switch of channel k+1 is in position 1:1
+};
+
+class SampleFifo
+{
+public:
+  SampleFifo() {};
+
+  void push(uint32_t timestamp, const int16_t *codes, const int *switches, uint16_t range_mV)
+  {
+    if (m_count == SampleFifoSize)
+    {
+      // the oldest sample is lost
+      m_head = (m_head + 1) % SampleFifoSize;
+      m_count--;
+      m_noOverflows++;
+    }
+    FifoSample *sample = &m_samples[(m_head + m_count) % SampleFifoSize];
+    sample->timestamp = timestamp;
+    sample->range_mV = range_mV;
+    sample->switches = 0;
+    for(uint8_t k = 0; k < MaxNoChannels; k++)
+    {
+      sample->codes[k] = codes[k];
+      if (switches[k] == 1)
+        sample->switches |= (1 << k);
+    }
+    m_count++;
+  }
+
+  // the oldest sample, false if the FIFO is empty
+  bool pop(FifoSample &sample)
+  {
+    if (m_count == 0)
+      return false;
+    sample = m_samples[m_head];
+    m_head = (m_head + 1) % SampleFifoSize;
+    m_count--;
+    return true;
+  }
+
+  uint8_t count() { return m_count; };
+  uint32_t getNoOverflows() { return m_noOverflows; };
+
+private:
+  FifoSample m_samples[SampleFifoSize];
+  uint8_t m_head = 0;
+  uint8_t m_count = 0;
+  uint32_t m_noOverflows = 0;
+};
+
+#endif
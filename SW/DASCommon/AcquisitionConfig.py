@@ -0,0 +1,190 @@
+"""
+AcquisitionConfig.py
+
+configuration of the acquisition read from a control file (.ctrl), validated against
+a schema and reloaded when the file changes
+(suited for Max OSX, Windows, Linux)
+
+The control file is an INI file, every option of the schema has a default, so the
+file only needs to contain the options which differ:
+
+    [acquisition]
+    period = 0.5
+    port = /dev/ttyUSB0
+    baud = 115200
+
+Unknown sections and options, values of the wrong type and values out of range are
+rejected with all problems listed in one ConfigError, the configuration in use is
+then kept. While a file is watched, every change of it is loaded again and
+configChanged hands over the options which have changed. Options with hotReload
+False (e.g. the port) are only used at the start of the application.
+
+Every application passes its schema, commonSchema holds the options both use. The
+values given by the application itself (e.g. on the command line) are overrides,
+they take precedence over the control file with every reload.
+
+"""
+from __future__ import print_function
+import configparser
+import os
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+class ConfigError(ValueError):
+    pass
+
+class ConfigOption(object):
+    def __init__(self, section, key, valueType, default, minimum=None, maximum=None, choices=None,
+                 hotReload=True, description=''):
+        self.section = section
+        self.key = key
+        self.valueType = valueType
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = choices
+        self.hotReload = hotReload
+        self.description = description
+
+    def parse(self, text):
+        """ Value of the text of the control file, raises ValueError if it is not valid
+        """
+        if self.valueType is bool:
+            if text.lower() in ('1', 'yes', 'true', 'on'):
+                return True
+            if text.lower() in ('0', 'no', 'false', 'off'):
+                return False
+            raise ValueError("'{}' is not a boolean".format(text))
+        try:
+            value = self.valueType(text)
+        except ValueError:
+            raise ValueError("'{}' is not of type {}".format(text, self.valueType.__name__))
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError("{} is below the minimum {}".format(value, self.minimum))
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError("{} is above the maximum {}".format(value, self.maximum))
+        if self.choices is not None and value not in self.choices:
+            raise ValueError("{} is not one of {}".format(value, self.choices))
+        return value
+
+# the options of both applications, the applications add their own and override the defaults
+commonSchema = [
+    ConfigOption('acquisition', 'period', float, 0.5, minimum=0.001, maximum=3600.0,
+                 description="acquisition period / s"),
+    ConfigOption('buffer', 'capacity', int, 1000000, minimum=100, maximum=100000000,
+                 description="samples kept in the history of every channel"),
+    ConfigOption('recording', 'enabled', bool, False, description="record the samples"),
+    ConfigOption('recording', 'directory', str, '.', description="directory of the recordings"),
+    ConfigOption('recording', 'prefix', str, 'Recording', description="file name prefix of the recordings"),
+    ConfigOption('display', 'refreshRate', float, 20.0, minimum=0.1, maximum=100.0,
+                 description="maximum plot frames per second"),
+]
+
+class AcquisitionConfig(QObject):
+    """ Values of the options, config.value('acquisition', 'period')
+
+        config = AcquisitionConfig(defaults={('acquisition', 'period'): 2.0})
+        config.load('Config.ctrl')
+        config.setOverride('acquisition', 'period', 1.0)
+        config.configChanged.connect(applySlot)
+        config.watch()
+    """
+    # dict (section, key) -> new value of the options changed by a reload
+    configChanged = pyqtSignal(object)
+    # message of the ConfigError of a reload
+    configError = pyqtSignal(str)
+
+    def __init__(self, schema=commonSchema, defaults=None):
+        QObject.__init__(self)
+        self.options = dict(((option.section, option.key), option) for option in schema)
+        # values of the options not given in the control file
+        self.defaults = dict((name, option.default) for name, option in self.options.items())
+        if defaults is not None:
+            self.defaults.update(defaults)
+        # values set by the application, applied on top of the control file
+        self.overrides = {}
+        self.values = dict(self.defaults)
+        self.fileName = None
+        self.watcher = None
+        # editors write a file in several steps, it is loaded once it has been quiet for 200 ms
+        self.reloadTimer = QTimer(self)
+        self.reloadTimer.setSingleShot(True)
+        self.reloadTimer.setInterval(200)
+        self.reloadTimer.timeout.connect(self.reload)
+
+    def value(self, section, key):
+        return self.values[(section, key)]
+
+    def setOverride(self, section, key, value):
+        # the value is kept with every reload of the control file
+        if (section, key) not in self.options:
+            raise ConfigError("[{}] {}: unknown option".format(section, key))
+        self.overrides[(section, key)] = value
+        self.values[(section, key)] = value
+
+    def parseFile(self, fileName):
+        """ Values of the options given in the file, raises ConfigError
+        """
+        parser = configparser.ConfigParser()
+        # the option names are case sensitive as in the schema
+        parser.optionxform = str
+        try:
+            if not parser.read(fileName):
+                raise ConfigError("control file {} not found".format(fileName))
+        except configparser.Error as e:
+            raise ConfigError("control file {}: {}".format(fileName, e))
+        values = {}
+        problems = []
+        for section in parser.sections():
+            for key, text in parser.items(section):
+                option = self.options.get((section, key))
+                if option is None:
+                    problems.append("[{}] {}: unknown option".format(section, key))
+                    continue
+                try:
+                    values[(section, key)] = option.parse(text.strip())
+                except ValueError as e:
+                    problems.append("[{}] {}: {}".format(section, key, e))
+        if len(problems) > 0:
+            raise ConfigError("control file {}:\n  ".format(fileName) + "\n  ".join(problems))
+        return values
+
+    def load(self, fileName):
+        """ Load the options of the file, returns the changed options, raises ConfigError
+        """
+        values = dict(self.defaults)
+        values.update(self.parseFile(fileName))
+        values.update(self.overrides)
+        changed = dict((name, value) for name, value in values.items() if self.values[name] != value)
+        self.values = values
+        self.fileName = fileName
+        print("configuration loaded from", fileName)
+        return changed
+
+    def watch(self):
+        # the watched file is replaced, not only changed, by many editors, the watcher of
+        # a replaced file is renewed with every reload
+        if self.watcher is None:
+            self.watcher = QFileSystemWatcher(self)
+            self.watcher.fileChanged.connect(lambda path: self.reloadTimer.start())
+        if len(self.watcher.files()) > 0:
+            self.watcher.removePaths(self.watcher.files())
+        if self.fileName is not None and os.path.exists(self.fileName):
+            self.watcher.addPath(self.fileName)
+
+    def reload(self):
+        try:
+            changed = self.load(self.fileName)
+        except ConfigError as e:
+            print(e)
+            self.configError.emit(str(e))
+            changed = {}
+        self.watch()
+        if len(changed) > 0:
+            for name in changed:
+                if not self.options[name].hotReload:
+                    print("[{}] {} takes effect with the next start".format(*name))
+            self.configChanged.emit(changed)
+
+    def __str__(self):
+        return "\n".join("[{}] {} = {}".format(section, key, self.values[(section, key)])
+                         for section, key in sorted(self.values))
@@ -0,0 +1,129 @@
+"""
+MinMaxPyramid.py
+
+ring buffer with a min/max decimation pyramid for plotting long recordings
+(suited for Max OSX, Windows, Linux)
+
+Level k of the pyramid holds the minimum and the maximum of the blocks of factor**k
+samples, the blocks are aligned to the sample number counted from the first sample.
+decimate() picks the finest level which still fits into the requested number of
+points and returns the min/max envelope of the range, so a plot never draws more
+than about two points per pixel and spikes stay visible at any zoom level.
+
+"""
+import numpy as np
+from .RingBuffer import RingBuffer
+
+class MinMaxPyramid(RingBuffer):
+    def __init__(self, capacity, dtype=np.float64, factor=4, minLevelSize=64):
+        self.factor = factor
+        # number of levels above the samples, the top level still holds minLevelSize blocks
+        self.noLevels = 0
+        while capacity // factor**(self.noLevels + 1) >= minLevelSize:
+            self.noLevels = self.noLevels + 1
+        RingBuffer.__init__(self, capacity, dtype)
+
+    def clear(self):
+        RingBuffer.clear(self)
+        # levels[k - 1] = (minima, maxima) of the blocks of level k
+        self.levels = []
+        for k in range(1, self.noLevels + 1):
+            levelCapacity = self.capacity // self.factor**k + 2
+            self.levels.append((RingBuffer(levelCapacity, self.data.dtype), RingBuffer(levelCapacity, self.data.dtype)))
+        # minima and maxima of the incomplete block of each level
+        self.pendingMin = [[] for k in range(self.noLevels)]
+        self.pendingMax = [[] for k in range(self.noLevels)]
+
+    def append(self, value):
+        RingBuffer.append(self, value)
+        blockMin = blockMax = value
+        for k in range(self.noLevels):
+            self.pendingMin[k].append(blockMin)
+            self.pendingMax[k].append(blockMax)
+            if len(self.pendingMin[k]) < self.factor:
+                break
+            blockMin = min(self.pendingMin[k])
+            blockMax = max(self.pendingMax[k])
+            self.levels[k][0].append(blockMin)
+            self.levels[k][1].append(blockMax)
+            self.pendingMin[k] = []
+            self.pendingMax[k] = []
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype).reshape(-1)
+        RingBuffer.extend(self, values)
+        if len(values) >= self.capacity:
+            # the buffer has been cleared and holds only the last capacity values, the
+            # blocks started before the first of them are filled up with its value
+            values = values[-self.capacity:]
+            firstNumber = self.firstSampleNumber()
+            for k in range(self.noLevels):
+                noBefore = (firstNumber // self.factor**k) % self.factor
+                self.pendingMin[k] = [values[0]] * noBefore
+                self.pendingMax[k] = [values[0]] * noBefore
+        self.extendLevels(values)
+
+    def extendLevels(self, values):
+        blockMin = blockMax = values
+        for k in range(self.noLevels):
+            blockMin = np.concatenate((np.asarray(self.pendingMin[k], dtype=self.data.dtype), blockMin))
+            blockMax = np.concatenate((np.asarray(self.pendingMax[k], dtype=self.data.dtype), blockMax))
+            noBlocks = len(blockMin) // self.factor
+            noComplete = noBlocks * self.factor
+            self.pendingMin[k] = blockMin[noComplete:].tolist()
+            self.pendingMax[k] = blockMax[noComplete:].tolist()
+            if noBlocks == 0:
+                break
+            blockMin = blockMin[:noComplete].reshape(noBlocks, self.factor).min(axis=1)
+            blockMax = blockMax[:noComplete].reshape(noBlocks, self.factor).max(axis=1)
+            self.levels[k][0].extend(blockMin)
+            self.levels[k][1].extend(blockMax)
+
+    def firstSampleNumber(self):
+        # sample number of the oldest buffered sample, the first sample ever appended has number 0
+        return self.noAppended - self.noValues
+
+    def endSampleNumber(self):
+        return self.noAppended
+
+    def decimate(self, start, stop, maxPoints):
+        """ Sample numbers and values to draw the samples start..stop-1 with at most about
+            maxPoints points: the samples themselves or the min/max envelope of a pyramid level
+        """
+        start = max(int(start), self.firstSampleNumber())
+        stop = min(int(stop), self.endSampleNumber())
+        if stop <= start:
+            return np.zeros(0), np.zeros(0)
+        samples = self.view()
+        offset = self.firstSampleNumber()
+        if stop - start <= maxPoints or self.noLevels == 0:
+            return np.arange(start, stop), samples[start - offset:stop - offset]
+
+        # finest level with at most maxPoints/2 blocks in the range
+        level = 1
+        while level < self.noLevels and (stop - start) // self.factor**level > maxPoints // 2:
+            level = level + 1
+        blockSize = self.factor**level
+        minima, maxima = self.levels[level - 1]
+        noBlocks = self.noAppended // blockSize
+        oldestBlock = noBlocks - len(minima)
+        firstBlock = max(start // blockSize, oldestBlock)
+        lastBlock = min(noBlocks, -(-stop // blockSize))
+        blockMin = minima.view()[firstBlock - oldestBlock:lastBlock - oldestBlock]
+        blockMax = maxima.view()[firstBlock - oldestBlock:lastBlock - oldestBlock]
+        blockCenter = (np.arange(firstBlock, lastBlock) + 0.5) * blockSize
+
+        # the samples behind the last complete block are one more block
+        tailStart = max(lastBlock * blockSize, start)
+        if tailStart < stop:
+            tail = samples[tailStart - offset:stop - offset]
+            blockMin = np.append(blockMin, np.min(tail))
+            blockMax = np.append(blockMax, np.max(tail))
+            blockCenter = np.append(blockCenter, 0.5 * (tailStart + stop))
+
+        # two points per block: the vertical line from the minimum to the maximum
+        x = np.repeat(blockCenter, 2)
+        y = np.empty(2 * len(blockMin), dtype=self.data.dtype)
+        y[0::2] = blockMin
+        y[1::2] = blockMax
+        return x, y
@@ -0,0 +1,169 @@
+"""
+PeriodicScheduler.py
+
+drift-free periodic scheduling of the measurements on the monotonic clock
+(suited for Max OSX, Windows, Linux)
+
+The k-th tick is scheduled for the absolute deadline start + k*periodSec, so a late
+tick or a slow handler does not shift the following ticks. A tick which comes more
+than one period late is an overrun, the missed deadlines are either skipped or
+caught up depending on the overrun policy.
+
+"""
+from __future__ import print_function
+import math
+import time
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal, pyqtSlot
+
+# overrun policies
+SKIP_MISSED = 'skip'        # drop the missed deadlines, continue with the next deadline in the future
+CATCH_UP = 'catchUp'        # emit one tick for every missed deadline back to back
+
+class TimingStatistics(object):
+    """ Achieved vs. requested tick rate and the lateness (jitter) of the ticks
+    """
+    def __init__(self, periodSec):
+        self.periodSec = periodSec
+        self.reset()
+
+    def reset(self):
+        self.noTicks = 0
+        self.noOverruns = 0
+        self.noSkipped = 0
+        self.firstTickTime = None
+        self.lastTickTime = None
+        # running mean and variance of the lateness (Welford)
+        self.meanLatenessSec = 0.0
+        self.m2LatenessSec = 0.0
+        self.maxLatenessSec = 0.0
+
+    def addTick(self, tickTime, latenessSec):
+        if self.firstTickTime is None:
+            self.firstTickTime = tickTime
+        self.lastTickTime = tickTime
+        self.noTicks = self.noTicks + 1
+        delta = latenessSec - self.meanLatenessSec
+        self.meanLatenessSec = self.meanLatenessSec + delta / self.noTicks
+        self.m2LatenessSec = self.m2LatenessSec + delta * (latenessSec - self.meanLatenessSec)
+        self.maxLatenessSec = max(self.maxLatenessSec, latenessSec)
+
+    def addOverrun(self, noMissed, skipped):
+        self.noOverruns = self.noOverruns + 1
+        if skipped:
+            self.noSkipped = self.noSkipped + noMissed
+
+    def requestedRateHz(self):
+        return 1.0 / self.periodSec
+
+    def achievedRateHz(self):
+        if self.noTicks < 2 or self.lastTickTime <= self.firstTickTime:
+            return 0.0
+        return (self.noTicks - 1) / (self.lastTickTime - self.firstTickTime)
+
+    def jitterSec(self):
+        # standard deviation of the lateness
+        if self.noTicks < 2:
+            return 0.0
+        return math.sqrt(self.m2LatenessSec / (self.noTicks - 1))
+
+    def asDict(self):
+        return {'requestedRateHz': self.requestedRateHz(),
+                'achievedRateHz': self.achievedRateHz(),
+                'ticks': self.noTicks,
+                'overruns': self.noOverruns,
+                'skipped': self.noSkipped,
+                'meanLatenessSec': self.meanLatenessSec,
+                'maxLatenessSec': self.maxLatenessSec,
+                'jitterSec': self.jitterSec()}
+
+    def __str__(self):
+        return ("requested {:.3f} Hz, achieved {:.3f} Hz, ticks = {}, overruns = {}, skipped = {}, "
+                "lateness mean = {:.1f} ms, max = {:.1f} ms, jitter = {:.1f} ms").format(
+            self.requestedRateHz(), self.achievedRateHz(), self.noTicks, self.noOverruns, self.noSkipped,
+            1000.0*self.meanLatenessSec, 1000.0*self.maxLatenessSec, 1000.0*self.jitterSec())
+
+class PeriodicScheduler(QObject):
+    """ Emits tick(scheduledTime, elapsedSec) at the absolute deadlines start + k*periodSec.
+        scheduledTime is the deadline on the time.monotonic() clock, elapsedSec the scheduled
+        time since the previous tick, i.e. a multiple of periodSec if deadlines were skipped.
+        The ticks are emitted in the thread the scheduler was started in.
+    """
+    tick = pyqtSignal(float, float)
+
+    def __init__(self, periodSec, overrunPolicy=SKIP_MISSED, maxCatchUp=10):
+        QObject.__init__(self)
+        if periodSec <= 0.0:
+            raise ValueError("period has to be positive")
+        if overrunPolicy not in (SKIP_MISSED, CATCH_UP):
+            raise ValueError("unknown overrun policy: " + str(overrunPolicy))
+        self.periodSec = periodSec
+        self.overrunPolicy = overrunPolicy
+        self.maxCatchUp = maxCatchUp
+        self.statistics = TimingStatistics(periodSec)
+        self.running = False
+        self.nextDeadline = 0.0
+        self.lastDeadline = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.onTimeout)
+
+    @pyqtSlot()
+    def start(self):
+        self.statistics.reset()
+        self.running = True
+        self.lastDeadline = None
+        self.nextDeadline = time.monotonic() + self.periodSec
+        self.scheduleNextTick()
+
+    @pyqtSlot()
+    def stop(self):
+        self.running = False
+        self.timer.stop()
+
+    @pyqtSlot(float)
+    def setPeriod(self, periodSec):
+        # the new period starts with the next deadline
+        self.periodSec = periodSec
+        self.statistics = TimingStatistics(periodSec)
+        if self.running:
+            self.start()
+
+    def getStatistics(self):
+        return self.statistics.asDict()
+
+    def scheduleNextTick(self):
+        delaySec = self.nextDeadline - time.monotonic()
+        self.timer.start(max(0, int(math.ceil(1000.0*delaySec))))
+
+    @pyqtSlot()
+    def onTimeout(self):
+        if not self.running:
+            return
+        now = time.monotonic()
+        latenessSec = now - self.nextDeadline
+        if latenessSec >= self.periodSec:
+            # overrun: one or more deadlines have passed since this tick was due
+            noMissed = int(latenessSec // self.periodSec)
+            if self.overrunPolicy == CATCH_UP and noMissed <= self.maxCatchUp:
+                self.statistics.addOverrun(noMissed, False)
+                for k in range(noMissed):
+                    self.emitTick(now, now - self.nextDeadline)
+                    self.nextDeadline = self.nextDeadline + self.periodSec
+            else:
+                self.statistics.addOverrun(noMissed, True)
+                self.nextDeadline = self.nextDeadline + noMissed * self.periodSec
+            latenessSec = now - self.nextDeadline
+        self.emitTick(now, latenessSec)
+        self.nextDeadline = self.nextDeadline + self.periodSec
+        if self.running:
+            self.scheduleNextTick()
+
+    def emitTick(self, now, latenessSec):
+        if self.lastDeadline is None:
+            elapsedSec = self.periodSec
+        else:
+            elapsedSec = self.nextDeadline - self.lastDeadline
+        self.lastDeadline = self.nextDeadline
+        self.statistics.addTick(now, latenessSec)
+        self.tick.emit(self.nextDeadline, elapsedSec)
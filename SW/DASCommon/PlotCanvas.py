@@ -0,0 +1,191 @@
+"""
+PlotCanvas.py
+
+matplotlib canvas for the measurement displays with incremental plot updates
+(suited for Max OSX, Windows, Linux)
+
+Every trace is one persistent Line2D artist which is updated with set_ydata. The
+background with axes, labels and grid is rendered once and cached, a new sample only
+restores the background and blits the traces. The axes are rescaled (and the
+background rendered again) only when the data leaves the current limits.
+
+Traces given as MinMaxPyramid are decimated to about two points per pixel of the
+shown range. The mouse wheel zooms, dragging with the left button pans and a double
+click returns to following the newest samples.
+
+PlotRefresher limits the rendering to a fixed refresh rate independent of the
+sample rate, all samples arriving between two frames are drawn together.
+
+"""
+import numpy as np
+import matplotlib
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+matplotlib.use('Qt5Agg')
+from PyQt5.QtCore import QObject, QTimer, pyqtSlot
+
+class MplCanvas(FigureCanvasQTAgg):
+    def __init__(self, parent=None, width=7, height=4, dpi=100, xlabel='', ylabel='', noTraces=1, margin=0.1):
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = fig.add_subplot(111)
+        super(MplCanvas, self).__init__(fig)
+        self.axes.set_xlabel(xlabel)
+        self.axes.set_ylabel(ylabel)
+        self.axes.grid()
+        # relative head room around the data after a rescale
+        self.margin = margin
+        self.lines = [self.axes.plot([], [], animated=True)[0] for k in range(noTraces)]
+        self.traces = ()
+        self.background = None
+        # shown range of sample numbers set by zooming or panning, None follows the newest samples
+        self.zoomRange = None
+        self.panStart = None
+        # the background has to be cached again after every full redraw, e.g. on a resize
+        self.mpl_connect('draw_event', self.onDraw)
+        # mouse wheel zooms, dragging with the left button pans, a double click follows the data again
+        self.mpl_connect('scroll_event', self.onScroll)
+        self.mpl_connect('button_press_event', self.onButtonPress)
+        self.mpl_connect('motion_notify_event', self.onMotion)
+        self.mpl_connect('button_release_event', self.onButtonRelease)
+
+    def onDraw(self, event):
+        self.background = self.copy_from_bbox(self.figure.bbox)
+        self.drawTraces()
+
+    def drawTraces(self):
+        for line in self.lines:
+            self.axes.draw_artist(line)
+
+    def updateData(self, *traces):
+        """ Show the given traces as function of the sample number. A trace is a data array
+            or a MinMaxPyramid, which is drawn with about two points per pixel at most
+        """
+        self.traces = traces
+        self.refresh()
+
+    def refresh(self, redraw=False):
+        rescale = self.rescaleX()
+        xLow, xHigh = self.axes.get_xlim()
+        maxPoints = 2 * max(1, int(self.axes.bbox.width))
+        for line, trace in zip(self.lines, self.traces):
+            if hasattr(trace, 'decimate'):
+                line.set_data(*trace.decimate(np.floor(xLow), np.ceil(xHigh) + 1, maxPoints))
+            else:
+                line.set_data(np.arange(len(trace)), trace)
+        rescale = self.rescaleY(redraw) or rescale
+
+        if rescale or redraw or self.background is None:
+            # full redraw, the draw event caches the new background and draws the traces
+            self.draw()
+        else:
+            self.restore_region(self.background)
+            self.drawTraces()
+            self.blit(self.axes.bbox)
+
+    def dataRange(self):
+        first = None
+        end = None
+        for trace in self.traces:
+            if hasattr(trace, 'decimate'):
+                traceFirst, traceEnd = trace.firstSampleNumber(), trace.endSampleNumber()
+            else:
+                traceFirst, traceEnd = 0, len(trace)
+            first = traceFirst if first is None else min(first, traceFirst)
+            end = traceEnd if end is None else max(end, traceEnd)
+        return first, end
+
+    def rescaleX(self):
+        if self.zoomRange is not None:
+            return False
+        first, end = self.dataRange()
+        if first is None or end <= first:
+            return False
+        xLow, xHigh = self.axes.get_xlim()
+        if end - 1 > xHigh or first < xLow or end - 1 < xLow:
+            # the newest samples are not shown anymore, leave room for the following ones
+            span = max(1.0, end - 1 - first)
+            self.axes.set_xlim(first, first + (1.0 + self.margin) * span)
+            return True
+        return False
+
+    def rescaleY(self, fit=False):
+        shown = [line.get_ydata() for line in self.lines if len(line.get_ydata()) > 0]
+        if len(shown) == 0:
+            return False
+        yMin = min(np.min(data) for data in shown)
+        yMax = max(np.max(data) for data in shown)
+        if not (np.isfinite(yMin) and np.isfinite(yMax)):
+            return False
+        yLow, yHigh = self.axes.get_ylim()
+        if fit or yMin < yLow or yMax > yHigh:
+            headRoom = self.margin * max(yMax - yMin, abs(yMax), 1e-3)
+            self.axes.set_ylim(yMin - headRoom, yMax + headRoom)
+            return True
+        return False
+
+    def setZoomRange(self, xLow, xHigh):
+        self.zoomRange = (xLow, xHigh)
+        self.axes.set_xlim(xLow, xHigh)
+        self.refresh(redraw=True)
+
+    def followData(self):
+        self.zoomRange = None
+        self.axes.set_xlim(0, 1)
+        self.refresh(redraw=True)
+
+    def onScroll(self, event):
+        if event.inaxes is not self.axes or event.xdata is None:
+            return
+        scale = 1.0 / 1.25 if event.button == 'up' else 1.25
+        xLow, xHigh = self.axes.get_xlim()
+        self.setZoomRange(event.xdata - (event.xdata - xLow) * scale, event.xdata + (xHigh - event.xdata) * scale)
+
+    def onButtonPress(self, event):
+        if event.inaxes is not self.axes or event.button != 1:
+            return
+        if event.dblclick:
+            self.followData()
+        else:
+            self.panStart = (event.x, self.axes.get_xlim())
+
+    def onMotion(self, event):
+        if self.panStart is None or event.x is None:
+            return
+        startX, (xLow, xHigh) = self.panStart
+        shift = (event.x - startX) / max(1.0, self.axes.bbox.width) * (xHigh - xLow)
+        self.setZoomRange(xLow - shift, xHigh - shift)
+
+    def onButtonRelease(self, event):
+        self.panStart = None
+
+class PlotRefresher(QObject):
+    """ Calls the render handler at most refreshRateHz times per second and only if
+        new data has been requested to be shown since the last frame
+    """
+    def __init__(self, renderHandler, refreshRateHz=20.0):
+        QObject.__init__(self)
+        self.renderHandler = renderHandler
+        self.refreshPending = False
+        self.noRequests = 0
+        self.noFrames = 0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.onTimeout)
+        self.setRefreshRate(refreshRateHz)
+
+    def setRefreshRate(self, refreshRateHz):
+        self.refreshRateHz = refreshRateHz
+        self.timer.start(max(1, int(round(1000.0 / refreshRateHz))))
+
+    def requestRefresh(self):
+        self.refreshPending = True
+        self.noRequests = self.noRequests + 1
+
+    def stop(self):
+        self.timer.stop()
+
+    @pyqtSlot()
+    def onTimeout(self):
+        if self.refreshPending:
+            self.refreshPending = False
+            self.noFrames = self.noFrames + 1
+            self.renderHandler()
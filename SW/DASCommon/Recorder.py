@@ -0,0 +1,161 @@
+"""
+Recorder.py
+
+recording of the timestamped measurements of all channels to a binary file
+(suited for Max OSX, Windows, Linux)
+
+File layout:
+
+    header      HEADER_SIZE bytes, magic + JSON description (channel names, start time, ...)
+                padded with blanks
+    records     one record per sample: timestamp float64 + one float64 per channel,
+                little endian
+
+The Recorder collects the samples in chunks and hands full chunks to a background
+writer thread through a bounded queue, so the acquisition never waits for the disk.
+If the writer falls behind by more than maxPendingChunks chunks, the new chunks are
+dropped and counted instead. The RecordingReader maps the records of a file with
+np.memmap and reads them at once or in chunks.
+
+"""
+from __future__ import print_function
+import json
+import os
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import numpy as np
+
+MAGIC = b'MySimple4ChannelDAS recording\n'
+HEADER_SIZE = 4096
+FILE_EXTENSION = '.rec'
+
+def recordDtype(noChannels):
+    return np.dtype([('timestamp', '<f8'), ('values', '<f8', (noChannels,))])
+
+class Recorder(object):
+    def __init__(self, fileName, channelNames, chunkSize=1024, maxPendingChunks=64, description=None):
+        self.fileName = fileName
+        self.channelNames = list(channelNames)
+        self.dtype = recordDtype(len(self.channelNames))
+        self.chunkSize = chunkSize
+        self.chunk = np.zeros(chunkSize, dtype=self.dtype)
+        self.chunkFill = 0
+        self.noRecorded = 0
+        self.noDropped = 0
+        self.noWritten = 0
+        self.writeError = None
+        self.pendingChunks = queue.Queue(maxsize=maxPendingChunks)
+
+        header = {'channels': self.channelNames,
+                  'startTime': time.strftime("%Y-%m-%d %H:%M:%S"),
+                  'description': description or ''}
+        headerBytes = MAGIC + json.dumps(header).encode('utf-8') + b'\n'
+        if len(headerBytes) > HEADER_SIZE:
+            raise ValueError("recording header too long")
+        self.file = open(fileName, 'wb')
+        self.file.write(headerBytes.ljust(HEADER_SIZE, b' '))
+        self.file.flush()
+
+        self.writerThread = threading.Thread(target=self.writeChunks)
+        self.writerThread.daemon = True
+        self.writerThread.start()
+        print("recording to ", fileName)
+
+    def record(self, timestamp, values):
+        self.chunk[self.chunkFill] = (timestamp, values)
+        self.chunkFill = self.chunkFill + 1
+        self.noRecorded = self.noRecorded + 1
+        if self.chunkFill == self.chunkSize:
+            self.flush()
+
+    def recordBlock(self, timestamps, values):
+        """ Record a block of samples, values has one row per sample. The block is collected
+            into the chunks like the single samples, only full chunks are handed over.
+        """
+        start = 0
+        while start < len(timestamps):
+            noSamples = min(self.chunkSize - self.chunkFill, len(timestamps) - start)
+            chunkSlice = slice(self.chunkFill, self.chunkFill + noSamples)
+            self.chunk['timestamp'][chunkSlice] = timestamps[start:start + noSamples]
+            self.chunk['values'][chunkSlice] = values[start:start + noSamples]
+            self.chunkFill = self.chunkFill + noSamples
+            self.noRecorded = self.noRecorded + noSamples
+            start = start + noSamples
+            if self.chunkFill == self.chunkSize:
+                self.flush()
+
+    def flush(self):
+        # hand the samples collected so far to the writer thread
+        if self.chunkFill > 0:
+            self.queueChunk(self.chunk[:self.chunkFill].copy())
+            self.chunkFill = 0
+
+    def queueChunk(self, chunk):
+        try:
+            self.pendingChunks.put_nowait(chunk)
+        except queue.Full:
+            self.noDropped = self.noDropped + len(chunk)
+
+    def writeChunks(self):
+        while True:
+            chunk = self.pendingChunks.get()
+            if chunk is None:
+                break
+            try:
+                self.file.write(chunk.tobytes())
+                self.file.flush()
+                self.noWritten = self.noWritten + len(chunk)
+            except (IOError, OSError) as error:
+                self.writeError = error
+                self.noDropped = self.noDropped + len(chunk)
+
+    def close(self):
+        self.flush()
+        # the writer thread stops after the last chunk
+        self.pendingChunks.put(None)
+        self.writerThread.join()
+        self.file.close()
+        print("recording closed: ", self.getStatistics())
+
+    def getStatistics(self):
+        return {'recorded': self.noRecorded,
+                'written': self.noWritten,
+                'dropped': self.noDropped,
+                'pendingChunks': self.pendingChunks.qsize(),
+                'error': str(self.writeError) if self.writeError else ''}
+
+class RecordingReader(object):
+    def __init__(self, fileName):
+        self.fileName = fileName
+        with open(fileName, 'rb') as f:
+            headerBytes = f.read(HEADER_SIZE)
+        if not headerBytes.startswith(MAGIC):
+            raise ValueError(fileName + " is no recording")
+        self.header = json.loads(headerBytes[len(MAGIC):].decode('utf-8').strip())
+        self.channelNames = self.header['channels']
+        self.dtype = recordDtype(len(self.channelNames))
+        # a record which is still being written is ignored
+        self.noRecords = (os.path.getsize(fileName) - HEADER_SIZE) // self.dtype.itemsize
+        if self.noRecords > 0:
+            self.records = np.memmap(fileName, dtype=self.dtype, mode='r', offset=HEADER_SIZE, shape=(self.noRecords,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return self.noRecords
+
+    def timestamps(self):
+        return self.records['timestamp']
+
+    def channel(self, name):
+        return self.records['values'][:, self.channelNames.index(name)]
+
+    def chunks(self, chunkSize=65536):
+        """ Generator over the records in chunks, only one chunk is read into memory at a time
+        """
+        for start in range(0, self.noRecords, chunkSize):
+            yield self.records[start:start + chunkSize]
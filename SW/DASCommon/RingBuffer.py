@@ -0,0 +1,145 @@
+"""
+RingBuffer.py
+
+NumPy ring buffer for the measurement history of a channel
+(suited for Max OSX, Windows, Linux)
+
+Every value is written twice, at its position and at its position + capacity, so the
+history in chronological order is always one contiguous slice of the storage and
+view() returns it without copying. Mean, minimum and maximum over the buffered values
+are kept up to date with every append:
+
+    mean        running sum, recomputed exactly once per wrap-around to drop rounding errors
+    min / max   monotonic queues of (sample number, value), amortized O(1) per sample
+
+"""
+from collections import deque
+import numpy as np
+
+class RingBuffer(object):
+    def __init__(self, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("capacity has to be at least 1")
+        self.capacity = int(capacity)
+        self.data = np.zeros(2*self.capacity, dtype=dtype)
+        self.clear()
+
+    def clear(self):
+        # position of the next value, number of buffered values and of all values ever appended
+        self.writeIndex = 0
+        self.noValues = 0
+        self.noAppended = 0
+        self.sum = 0.0
+        self.minQueue = deque()
+        self.maxQueue = deque()
+
+    def __len__(self):
+        return self.noValues
+
+    def isFull(self):
+        return self.noValues == self.capacity
+
+    def append(self, value):
+        if self.noValues == self.capacity:
+            self.sum = self.sum - self.data[self.writeIndex]
+        else:
+            self.noValues = self.noValues + 1
+        self.data[self.writeIndex] = value
+        self.data[self.writeIndex + self.capacity] = value
+        self.sum = self.sum + value
+        self.noAppended = self.noAppended + 1
+        self.advanceWriteIndex(1)
+
+        # monotonic queues, older values which can never be the extremum again are dropped
+        while len(self.minQueue) > 0 and self.minQueue[-1][1] >= value:
+            self.minQueue.pop()
+        self.minQueue.append((self.noAppended, value))
+        while len(self.maxQueue) > 0 and self.maxQueue[-1][1] <= value:
+            self.maxQueue.pop()
+        self.maxQueue.append((self.noAppended, value))
+        self.expireExtrema()
+
+    def extend(self, values):
+        """ Append a block of values at once
+        """
+        values = np.asarray(values, dtype=self.data.dtype).reshape(-1)
+        noNew = len(values)
+        if noNew == 0:
+            return
+        firstNumber = self.noAppended + 1
+        if noNew >= self.capacity:
+            # only the last capacity values stay in the buffer
+            firstNumber = firstNumber + noNew - self.capacity
+            values = values[-self.capacity:]
+            self.clear()
+            self.noAppended = firstNumber - 1
+            noNew = self.capacity
+
+        # the values overwritten by the block leave the running sum
+        noOverwritten = max(0, self.noValues + noNew - self.capacity)
+        if noOverwritten > 0:
+            self.sum = self.sum - float(np.sum(self.view()[:noOverwritten]))
+
+        # write the block in at most two parts, each part to both halves of the storage
+        firstPart = min(noNew, self.capacity - self.writeIndex)
+        for start, part in ((self.writeIndex, values[:firstPart]), (0, values[firstPart:])):
+            self.data[start:start + len(part)] = part
+            self.data[start + self.capacity:start + self.capacity + len(part)] = part
+        self.noValues = min(self.capacity, self.noValues + noNew)
+        self.noAppended = self.noAppended + noNew
+        self.sum = self.sum + float(np.sum(values))
+        self.advanceWriteIndex(noNew)
+
+        # candidates of the block for the monotonic queues: values which are strictly
+        # smaller (larger) than all later values of the block
+        numbers = np.arange(firstNumber, firstNumber + noNew)
+        laterMin = np.append(np.minimum.accumulate(values[::-1])[::-1][1:], np.inf)
+        laterMax = np.append(np.maximum.accumulate(values[::-1])[::-1][1:], -np.inf)
+        self.mergeQueue(self.minQueue, numbers, values, values < laterMin, np.min(values), True)
+        self.mergeQueue(self.maxQueue, numbers, values, values > laterMax, np.max(values), False)
+        self.expireExtrema()
+
+    def mergeQueue(self, queue, numbers, values, candidates, blockExtremum, isMinQueue):
+        while len(queue) > 0 and (queue[-1][1] >= blockExtremum if isMinQueue else queue[-1][1] <= blockExtremum):
+            queue.pop()
+        queue.extend(zip(numbers[candidates].tolist(), values[candidates].tolist()))
+
+    def advanceWriteIndex(self, noNew):
+        previousIndex = self.writeIndex
+        self.writeIndex = (self.writeIndex + noNew) % self.capacity
+        if self.writeIndex <= previousIndex and self.noValues == self.capacity:
+            # wrapped around: recompute the sum to get rid of the accumulated rounding errors
+            self.sum = float(np.sum(self.data[:self.capacity]))
+
+    def expireExtrema(self):
+        oldestNumber = self.noAppended - self.noValues + 1
+        while self.minQueue[0][0] < oldestNumber:
+            self.minQueue.popleft()
+        while self.maxQueue[0][0] < oldestNumber:
+            self.maxQueue.popleft()
+
+    def view(self):
+        """ The buffered values from the oldest to the newest one, without copying
+        """
+        start = (self.writeIndex - self.noValues) % self.capacity
+        return self.data[start:start + self.noValues]
+
+    def last(self):
+        if self.noValues == 0:
+            raise IndexError("ring buffer is empty")
+        return self.data[self.writeIndex - 1 + self.capacity]
+
+    def mean(self):
+        if self.noValues == 0:
+            return 0.0
+        return self.sum / self.noValues
+
+    def min(self):
+        if self.noValues == 0:
+            return 0.0
+        return self.minQueue[0][1]
+
+    def max(self):
+        if self.noValues == 0:
+            return 0.0
+        return self.maxQueue[0][1]
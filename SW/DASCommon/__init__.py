@@ -0,0 +1,20 @@
+"""
+DASCommon
+
+modules used by both applications, SW/PC and SW/EvalLiPoCellCharging
+(suited for Max OSX, Windows, Linux)
+
+    AcquisitionConfig   control file (.ctrl) validated against a schema, hot reload
+    MinMaxPyramid       decimated min/max levels of the histories for the plots
+    PeriodicScheduler   drift-free periodic ticks on the monotonic clock
+    PlotCanvas          blitted matplotlib canvas and frame rate limited refresh
+    Recorder            binary recording of the samples and its reader
+    RingBuffer          NumPy ring buffer of a measurement history
+
+The applications are started from their own directory, their module UseDASCommon
+makes the package importable:
+
+    import UseDASCommon
+    from DASCommon.Recorder import Recorder
+
+"""
@@ -12,36 +12,29 @@ Last change on 28th May 2021
 
 """
 import numpy as np
-import matplotlib
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-matplotlib.use('Qt5Agg')
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
 from RandomMeasurementsThread import *
-
-class MplCanvas(FigureCanvasQTAgg):
-    def __init__(self, parent=None, width=7, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
+import UseDASCommon
+from DASCommon.PlotCanvas import MplCanvas
+from DASCommon.MinMaxPyramid import MinMaxPyramid
 
 class CellCapacityMeasurementsWindow(QWidget):
-    def __init__(self, titleString):
+    def __init__(self, titleString, historyCapacity=100000):
         QWidget.__init__(self)
         
         # measured values of capacity (actual and mean)
         self.actualCapacity = 0.0
         self.meanCapacity = 0.0
-        self.noValidMeasurements = 0
         
-        # array of measurements
+        # history of measurements
+        self.historyCapacity = historyCapacity
         self.initMeasurementsArray() 
         
         # create the plot widget
         self.createPlotWidget(titleString)
         print("Capacity plot widget created")
-        self.updatePlot(self.measuredCapacityArray)
+        self.updatePlot(self.measuredCapacities)
 
     def createPlotWidget(self,  channelString):
         self.capacityPlotGroupBox = QGroupBox(self.tr(''))
@@ -52,11 +45,8 @@ class CellCapacityMeasurementsWindow(QWidget):
         titleFont.setPointSize(25)
         self.capacityPlotGroupBox.setFont(titleFont)
         
-        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100)
-        self.plotCanvas.axes.plot(self.measuredCapacityArray)
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('Cell Capacity / Ah')
-        self.plotCanvas.axes.grid()
+        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100,
+                                     xlabel='discrete time instance', ylabel='Cell Capacity / Ah')
         self.plotCanvas.setFixedSize(700, 370)
         
         # create the layout and add the plot widget
@@ -110,31 +100,22 @@ class CellCapacityMeasurementsWindow(QWidget):
         f.close()
         return stylesheet    
 
-    def updatePlot(self,  data):
+    def updatePlot(self,  measurements):
+        # measurements is the MinMaxPyramid with the history to show
         print("update capacity plot")
-        self.measuredCapacityArray = data
-        self.plotCanvas.axes.clear()
-        self.plotCanvas.axes.plot(self.measuredCapacityArray)
-        self.plotCanvas.axes.grid()
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('Cell Capacity / Ah')
-        # update the plot
-        self.plotCanvas.draw()
+        self.measuredCapacities = measurements
+        # update the plot, the labels are kept by the canvas
+        self.plotCanvas.updateData(self.measuredCapacities)
         
     def updateMeanCapacity(self):
         # calculate the mean Capacity value
-        self.meanCapacity = np.mean(self.measuredCapacityArray[0:self.noValidMeasurements])
+        self.meanCapacity = self.measuredCapacities.mean()
         # update the mean Capacity edit
         self.meanCapacityEdit.setText("{:2.4f}".format(self.meanCapacity))        
         
     def updateMeasurementsArray(self, CapacityValue):
-        self.measuredCapacityArray[self.arrayIndex] = CapacityValue
-        self.arrayIndex = self.arrayIndex + 1
-        if (self.arrayIndex > self.maxArraySize) :
-            self.arrayIndex = 0
+        self.measuredCapacities.append(CapacityValue)
     
     def initMeasurementsArray(self):
-        self.maxArraySize = 100
-        self.measuredCapacityArray = 0.1*np.ones(self.maxArraySize+1)
-        self.arrayIndex = 0
-        self.noValidMeasurements = 0
+        # the last historyCapacity values in chronological order
+        self.measuredCapacities = MinMaxPyramid(self.historyCapacity)
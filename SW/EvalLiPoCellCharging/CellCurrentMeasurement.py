@@ -12,36 +12,29 @@ Last change on 28th May 2021
 
 """
 import numpy as np
-import matplotlib
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-matplotlib.use('Qt5Agg')
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
 from RandomMeasurementsThread import *
-
-class MplCanvas(FigureCanvasQTAgg):
-    def __init__(self, parent=None, width=7, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
+import UseDASCommon
+from DASCommon.PlotCanvas import MplCanvas
+from DASCommon.MinMaxPyramid import MinMaxPyramid
 
 class CellCurrentMeasurementsWindow(QWidget):
-    def __init__(self, titleString):
+    def __init__(self, titleString, historyCapacity=100000):
         QWidget.__init__(self)
         
         # measured values of current (actual and mean)
         self.actualCurrent = 0.0
         self.meanCurrent = 0.0
-        self.noValidMeasurements = 0
         
-        # array of measurements
+        # history of measurements
+        self.historyCapacity = historyCapacity
         self.initMeasurementsArray() 
         
         # create the plot widget
         self.createPlotWidget(titleString)
         print("Current plot widget created")
-        self.updatePlot(self.measuredCurrentArray)
+        self.updatePlot(self.measuredCurrents)
                 
 
     def createPlotWidget(self,  titleString):
@@ -53,11 +46,8 @@ class CellCurrentMeasurementsWindow(QWidget):
         titleFont.setPointSize(25)
         self.currentPlotGroupBox.setFont(titleFont)
         
-        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100)
-        self.plotCanvas.axes.plot(self.measuredCurrentArray)
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('Cell Current / A')
-        self.plotCanvas.axes.grid()
+        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100,
+                                     xlabel='discrete time instance', ylabel='Cell Current / A')
         self.plotCanvas.setFixedSize(700, 370)
         
         # create the layout and add the plot widget
@@ -111,31 +101,22 @@ class CellCurrentMeasurementsWindow(QWidget):
         f.close()
         return stylesheet    
 
-    def updatePlot(self,  data):
+    def updatePlot(self,  measurements):
+        # measurements is the MinMaxPyramid with the history to show
         print("update current plot")
-        self.measuredCurrentArray = data
-        self.plotCanvas.axes.clear()
-        self.plotCanvas.axes.plot(self.measuredCurrentArray)
-        self.plotCanvas.axes.grid()
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('Cell Current / A')
-        # update the plot
-        self.plotCanvas.draw()
+        self.measuredCurrents = measurements
+        # update the plot, the labels are kept by the canvas
+        self.plotCanvas.updateData(self.measuredCurrents)
         
     def updateMeanCurrent(self):
         # calculate the mean Current value
-        self.meanCurrent = np.mean(self.measuredCurrentArray[0:self.noValidMeasurements])
+        self.meanCurrent = self.measuredCurrents.mean()
         # update the mean Current edit
         self.meanCurrentEdit.setText("{:2.3f}".format(self.meanCurrent))        
         
     def updateMeasurementsArray(self, CurrentValue):
-        self.measuredCurrentArray[self.arrayIndex] = CurrentValue
-        self.arrayIndex = self.arrayIndex + 1
-        if (self.arrayIndex > self.maxArraySize) :
-            self.arrayIndex = 0
+        self.measuredCurrents.append(CurrentValue)
     
     def initMeasurementsArray(self):
-        self.maxArraySize = 100
-        self.measuredCurrentArray = 0.9*np.ones(self.maxArraySize+1)
-        self.arrayIndex = 0
-        self.noValidMeasurements = 0
+        # the last historyCapacity values in chronological order
+        self.measuredCurrents = MinMaxPyramid(self.historyCapacity)
@@ -12,36 +12,29 @@ Last change on 28th May 2021
 
 """
 import numpy as np
-import matplotlib
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-matplotlib.use('Qt5Agg')
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
 from RandomMeasurementsThread import *
-
-class MplCanvas(FigureCanvasQTAgg):
-    def __init__(self, parent=None, width=7, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
+import UseDASCommon
+from DASCommon.PlotCanvas import MplCanvas
+from DASCommon.MinMaxPyramid import MinMaxPyramid
 
 class CellEnergyMeasurementsWindow(QWidget):
-    def __init__(self, titleString):
+    def __init__(self, titleString, historyCapacity=100000):
         QWidget.__init__(self)
         
         # measured values of energy (actual and mean)
         self.actualEnergy = 0.0
         self.meanEnergy = 0.0
-        self.noValidMeasurements = 0
         
-        # array of measurements
+        # history of measurements
+        self.historyCapacity = historyCapacity
         self.initMeasurementsArray() 
         
         # create the plot widget
         self.createPlotWidget(titleString)
         print("Energy plot widget created")
-        self.updatePlot(self.measuredEnergyArray)       
+        self.updatePlot(self.measuredEnergies)       
 
     def createPlotWidget(self,  titleString):
         self.energyPlotGroupBox = QGroupBox(self.tr(''))
@@ -52,11 +45,8 @@ class CellEnergyMeasurementsWindow(QWidget):
         titleFont.setPointSize(25)
         self.energyPlotGroupBox.setFont(titleFont)
         
-        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100)
-        self.plotCanvas.axes.plot(self.measuredEnergyArray)
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('Cell Energy / Wh')
-        self.plotCanvas.axes.grid()
+        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100,
+                                     xlabel='discrete time instance', ylabel='Cell Energy / Wh')
         self.plotCanvas.setFixedSize(700, 370)
         
         # create the layout and add the plot widget
@@ -110,31 +100,22 @@ class CellEnergyMeasurementsWindow(QWidget):
         f.close()
         return stylesheet    
 
-    def updatePlot(self,  data):
+    def updatePlot(self,  measurements):
+        # measurements is the MinMaxPyramid with the history to show
         print("update energy plot")
-        self.measuredEnergyArray = data
-        self.plotCanvas.axes.clear()
-        self.plotCanvas.axes.plot(self.measuredEnergyArray)
-        self.plotCanvas.axes.grid()
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('Cell Energy / Wh')
-        # update the plot
-        self.plotCanvas.draw()
+        self.measuredEnergies = measurements
+        # update the plot, the labels are kept by the canvas
+        self.plotCanvas.updateData(self.measuredEnergies)
         
     def updateMeanEnergy(self):
         # calculate the mean Energy value
-        self.meanEnergy = np.mean(self.measuredEnergyArray[0:self.noValidMeasurements])
+        self.meanEnergy = self.measuredEnergies.mean()
         # update the mean Energy edit
         self.meanEnergyEdit.setText("{:2.4f}".format(self.meanEnergy))        
         
     def updateMeasurementsArray(self, EnergyValue):
-        self.measuredEnergyArray[self.arrayIndex] = EnergyValue
-        self.arrayIndex = self.arrayIndex + 1
-        if (self.arrayIndex > self.maxArraySize) :
-            self.arrayIndex = 0
+        self.measuredEnergies.append(EnergyValue)
     
     def initMeasurementsArray(self):
-        self.maxArraySize = 100
-        self.measuredEnergyArray = 0.1*np.ones(self.maxArraySize+1)
-        self.arrayIndex = 0
-        self.noValidMeasurements = 0
+        # the last historyCapacity values in chronological order
+        self.measuredEnergies = MinMaxPyramid(self.historyCapacity)
@@ -12,36 +12,29 @@ Last change on 20th May 2021
 
 """
 import numpy as np
-import matplotlib
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-matplotlib.use('Qt5Agg')
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
 from RandomMeasurementsThread import *
-
-class MplCanvas(FigureCanvasQTAgg):
-    def __init__(self, parent=None, width=7, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
+import UseDASCommon
+from DASCommon.PlotCanvas import MplCanvas
+from DASCommon.MinMaxPyramid import MinMaxPyramid
 
 class CellVoltageMeasurementsWindow(QWidget):
-    def __init__(self, titleString):
+    def __init__(self, titleString, historyCapacity=100000):
         QWidget.__init__(self)
         
         # measured values of voltage (actual and mean)
         self.actualVoltage = 0.0
         self.meanVoltage = 0.0
-        self.noValidMeasurements = 0
         
-        # array of measurements
+        # history of measurements
+        self.historyCapacity = historyCapacity
         self.initMeasurementsArray() 
         
         # create the plot widget
         self.createPlotWidget(titleString)
         print("Voltage plot widget created")
-        self.updatePlot(self.measuredVoltageArray)
+        self.updatePlot(self.measuredVoltages)
 
     def createPlotWidget(self,  titleString):
         self.voltagePlotGroupBox = QGroupBox(self.tr(''))
@@ -52,11 +45,8 @@ class CellVoltageMeasurementsWindow(QWidget):
         titleFont.setPointSize(25)
         self.voltagePlotGroupBox.setFont(titleFont)
         
-        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100)
-        self.plotCanvas.axes.plot(self.measuredVoltageArray)
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('Cell Voltage / V')
-        self.plotCanvas.axes.grid()
+        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100,
+                                     xlabel='discrete time instance', ylabel='Cell Voltage / V')
         self.plotCanvas.setFixedSize(700, 370)
         
         # create the layout and add the plot widget
@@ -110,31 +100,22 @@ class CellVoltageMeasurementsWindow(QWidget):
         f.close()
         return stylesheet    
 
-    def updatePlot(self,  data):
+    def updatePlot(self,  measurements):
+        # measurements is the MinMaxPyramid with the history to show
         print("update voltage plot")
-        self.measuredVoltageArray = data
-        self.plotCanvas.axes.clear()
-        self.plotCanvas.axes.plot(self.measuredVoltageArray)
-        self.plotCanvas.axes.grid()
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('Cell Voltage / V')
-        # update the plot
-        self.plotCanvas.draw()
+        self.measuredVoltages = measurements
+        # update the plot, the labels are kept by the canvas
+        self.plotCanvas.updateData(self.measuredVoltages)
         
     def updateMeanVoltage(self):
         # calculate the mean Voltage value
-        self.meanVoltage = np.mean(self.measuredVoltageArray[0:self.noValidMeasurements])
+        self.meanVoltage = self.measuredVoltages.mean()
         # update the mean Voltage edit
         self.meanVoltageEdit.setText("{:2.2f}".format(self.meanVoltage))        
         
     def updateMeasurementsArray(self, VoltageValue):
-        self.measuredVoltageArray[self.arrayIndex] = VoltageValue
-        self.arrayIndex = self.arrayIndex + 1
-        if (self.arrayIndex > self.maxArraySize) :
-            self.arrayIndex = 0
+        self.measuredVoltages.append(VoltageValue)
     
     def initMeasurementsArray(self):
-        self.maxArraySize = 100
-        self.measuredVoltageArray = 4.0*np.ones(self.maxArraySize+1)
-        self.arrayIndex = 0
-        self.noValidMeasurements = 0
+        # the last historyCapacity values in chronological order
+        self.measuredVoltages = MinMaxPyramid(self.historyCapacity)
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+Project MySimple4ChannelDAS
+
+Charge and energy of the LiPo cell integrated over the real sample times
+(suited for Max OSX, Windows, Linux)
+
+Capacity / Ah and energy / Wh are the integrals of the current and of the power
+(voltage * current) over time, both are integrated with the trapezoidal rule between
+the timestamps of the samples, so late or skipped measurements are weighted with the
+time which has really passed:
+
+    capacity[k] = capacity[k-1] + (current[k-1] + current[k]) / 2 * (t[k] - t[k-1]) / 3600
+    energy[k]   = energy[k-1]   + (power[k-1]   + power[k])   / 2 * (t[k] - t[k-1]) / 3600
+
+ChargeIntegrator adds one sample in O(1) during the measurements, integrateCharge()
+does the same for whole arrays (e.g. a recording) at once. While the measurements
+are off the integration is paused: pause() keeps capacity and energy, the first
+sample after it starts a new interval, so the time without measurements adds nothing.
+
+Started as script it recomputes capacity and energy of a recording or checks the
+integration:
+
+Usage:
+  python3 ./ChargeIntegrator.py LiPoCharging_20261018_120000.rec
+  python3 ./ChargeIntegrator.py --check
+
+"""
+from __future__ import print_function
+import sys
+import argparse
+import numpy as np
+import UseDASCommon
+from DASCommon.Recorder import RecordingReader
+
+def integrateCharge(timestamps, voltages, currents, initialCapacityAh=0.0, initialEnergyWh=0.0):
+    """ Capacity / Ah and energy / Wh at every sample of the arrays, the first sample
+        has the initial values. Intervals with decreasing timestamps add nothing.
+    """
+    currents = np.asarray(currents, dtype=np.float64)
+    return integratePower(timestamps, currents, np.asarray(voltages, dtype=np.float64) * currents,
+                          initialCapacityAh, initialEnergyWh)
+
+def integratePower(timestamps, currents, powers, initialCapacityAh=0.0, initialEnergyWh=0.0):
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    capacities = np.full(len(timestamps), float(initialCapacityAh))
+    energies = np.full(len(timestamps), float(initialEnergyWh))
+    if len(timestamps) > 1:
+        intervalsHours = np.maximum(np.diff(timestamps), 0.0) / 3600.0
+        capacities[1:] += np.cumsum(0.5 * (currents[1:] + currents[:-1]) * intervalsHours)
+        energies[1:] += np.cumsum(0.5 * (powers[1:] + powers[:-1]) * intervalsHours)
+    return capacities, energies
+
+class ChargeIntegrator(object):
+    """ Capacity and energy accumulated sample by sample
+
+        integrator = ChargeIntegrator()
+        capacityAh, energyWh = integrator.addSample(timestamp, voltage, current)
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.capacityAh = 0.0
+        self.energyWh = 0.0
+        self.lastTimestamp = None
+        self.lastCurrent = 0.0
+        self.lastPower = 0.0
+        self.noSamples = 0
+
+    def pause(self):
+        # capacity and energy are kept, the next sample is not connected to the last one
+        self.lastTimestamp = None
+
+    def addSample(self, timestamp, voltage, current):
+        power = voltage * current
+        if self.lastTimestamp is not None and timestamp > self.lastTimestamp:
+            intervalHours = (timestamp - self.lastTimestamp) / 3600.0
+            self.capacityAh = self.capacityAh + 0.5 * (self.lastCurrent + current) * intervalHours
+            self.energyWh = self.energyWh + 0.5 * (self.lastPower + power) * intervalHours
+        self.lastTimestamp = timestamp
+        self.lastCurrent = current
+        self.lastPower = power
+        self.noSamples = self.noSamples + 1
+        return self.capacityAh, self.energyWh
+
+    def addBlock(self, timestamps, voltages, currents):
+        """ Add the samples of the arrays at once, returns capacity and energy at every sample
+        """
+        if len(timestamps) == 0:
+            return np.zeros(0), np.zeros(0)
+        currents = np.asarray(currents, dtype=np.float64)
+        powers = np.asarray(voltages, dtype=np.float64) * currents
+        if self.lastTimestamp is None:
+            capacities, energies = integratePower(timestamps, currents, powers, self.capacityAh, self.energyWh)
+        else:
+            # the last sample added before is the start of the first interval
+            capacities, energies = integratePower(np.concatenate(([self.lastTimestamp], timestamps)),
+                                                  np.concatenate(([self.lastCurrent], currents)),
+                                                  np.concatenate(([self.lastPower], powers)),
+                                                  self.capacityAh, self.energyWh)
+            capacities = capacities[1:]
+            energies = energies[1:]
+        self.capacityAh = float(capacities[-1])
+        self.energyWh = float(energies[-1])
+        self.lastTimestamp = float(timestamps[-1])
+        self.lastCurrent = float(currents[-1])
+        self.lastPower = float(powers[-1])
+        self.noSamples = self.noSamples + len(timestamps)
+        return capacities, energies
+
+def checkIntegration():
+    """ Compare the integration with the exact values of a constant charge, True if all checks pass
+    """
+    passed = True
+    def check(label, value, expected):
+        ok = abs(value - expected) < 1e-9
+        print("{:40s} {:.9f} (expected {:.9f}) {}".format(label, value, expected, "ok" if ok else "FAILED"))
+        return ok
+
+    # 2 A at 4 V for one hour: 2 Ah, 8 Wh
+    timestamps = np.linspace(0.0, 3600.0, 361)
+    integrator = ChargeIntegrator()
+    for t in timestamps:
+        capacityAh, energyWh = integrator.addSample(t, 4.0, 2.0)
+    passed = check("capacity / Ah", capacityAh, 2.0) and passed
+    passed = check("energy / Wh", energyWh, 8.0) and passed
+    capacities, energies = integrateCharge(timestamps, np.full(361, 4.0), np.full(361, 2.0))
+    passed = check("capacity of the arrays / Ah", capacities[-1], 2.0) and passed
+
+    # a pause of one hour adds nothing, neither sample by sample nor in blocks
+    integrator.pause()
+    for t in timestamps + 7200.0:
+        capacityAh, energyWh = integrator.addSample(t, 4.0, 2.0)
+    passed = check("capacity after a pause / Ah", capacityAh, 4.0) and passed
+    passed = check("energy after a pause / Wh", energyWh, 16.0) and passed
+    integrator.pause()
+    capacities, energies = integrator.addBlock(timestamps + 14400.0, np.full(361, 4.0), np.full(361, 2.0))
+    passed = check("capacity of a block after a pause / Ah", capacities[-1], 6.0) and passed
+    print("charge integration check:", "passed" if passed else "FAILED")
+    return passed
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Capacity and energy of a LiPo charging recording")
+    parser.add_argument('fileName', nargs='?', help="recording of EvalLiPoCellCharging.py (.rec)")
+    parser.add_argument('--check', action='store_true', help="check the integration with a constant charge")
+    args = parser.parse_args(argv)
+    if args.check:
+        return 0 if checkIntegration() else 1
+    if args.fileName is None:
+        parser.error("a recording or --check is required")
+
+    recording = RecordingReader(args.fileName)
+    capacities, energies = integrateCharge(recording.timestamps(), recording.channel('voltage'),
+                                           recording.channel('current'))
+    print("{}: {} samples over {:.1f} s".format(args.fileName, len(recording),
+                                              recording.timestamps()[-1] - recording.timestamps()[0] if len(recording) > 0 else 0.0))
+    if len(recording) > 0:
+        print("capacity: {:.6f} Ah (recorded {:.6f} Ah)".format(capacities[-1], recording.channel('capacity')[-1]))
+        print("energy:   {:.6f} Wh (recorded {:.6f} Wh)".format(energies[-1], recording.channel('energy')[-1]))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
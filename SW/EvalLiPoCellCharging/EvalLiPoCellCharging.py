@@ -16,7 +16,8 @@ Last change on 28st May 2021
 from __future__ import print_function
 import sys
 # import ntpath
-# import os
+import os
+import time
 import numpy as np
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
@@ -25,6 +26,12 @@ from CellVoltageMeasurement import CellVoltageMeasurementsWindow
 from CellCurrentMeasurement import CellCurrentMeasurementsWindow
 from CellCapacityMeasurement import CellCapacityMeasurementsWindow
 from CellEnergyMeasurement import CellEnergyMeasurementsWindow
+import UseDASCommon
+from DASCommon.PlotCanvas import PlotRefresher
+from DASCommon.MinMaxPyramid import MinMaxPyramid
+from DASCommon.Recorder import Recorder, RecordingReader
+from ChargeIntegrator import ChargeIntegrator
+from DASCommon.AcquisitionConfig import AcquisitionConfig, ConfigError
 
 #try:
 #    from PyQt5.QtCore import QString#
@@ -33,9 +40,21 @@ from CellEnergyMeasurement import CellEnergyMeasurementsWindow
 QString = type("")
 
 class MainWindow(QMainWindow):
-    def __init__(self, *rest):
+    def __init__(self, configFile='Config.ctrl', *rest):
         QMainWindow.__init__(self)
 
+        # the configuration of the measurements, 100000 samples are more than 55 hours at a period of 2 s
+        self.config = AcquisitionConfig(defaults={('acquisition', 'period'): 2.0,
+                                                  ('buffer', 'capacity'): 100000,
+                                                  ('recording', 'prefix'): 'LiPoCharging'})
+        if os.path.exists(configFile):
+            try:
+                self.config.load(configFile)
+            except ConfigError as e:
+                print(e)
+                print("using the default configuration")
+        print("configuration:\n" + str(self.config))
+
         # set the command message interface
         self.msgIF = MsgInterface()
         
@@ -80,18 +99,59 @@ class MainWindow(QMainWindow):
         # set window title
         self.setWindowTitle(self.tr("LiPo Cell Measurements"))
 
-        # arrays of measurements
-        self.initVoltageMeasurementsArray()
-        self.initCurrentMeasurementsArray()
-        self.initCapacityMeasurementsArray()
-        self.initEnergyMeasurementsArray()
-        self.chargingTime = 0.0
+        # history of the measurements
+        self.historyCapacity = self.config.value('buffer', 'capacity')
+        self.initMeasurementsHistory()
+        # capacity and energy integrated over the timestamps of the measurements
+        self.chargeIntegrator = ChargeIntegrator()
         
+        # the measurements are recorded to a file if the control file enables it
+        self.recordingChannels = ['voltage', 'current', 'capacity', 'energy']
+        self.recorder = None
+        self.openRecorder()
+
+        # the plots are redrawn with at most refreshRateHz frames per second
+        self.refreshRateHz = self.config.value('display', 'refreshRate')
+        self.plotRefresher = PlotRefresher(self.updatePlots, self.refreshRateHz)
+
         # Start the measurement thread
-        self.periodSec = 2.0
+        self.periodSec = self.config.value('acquisition', 'period')
         measurementSlot = self.handleMeasurements;
-        measurementsThreadObj = RandomMeasurementsThread(measurementSlot,self.periodSec)
-        measurementsThreadObj.start()
+        self.measurementsThreadObj = RandomMeasurementsThread(measurementSlot,self.periodSec)
+        self.measurementsThreadObj.start()
+
+        # changes of the control file are applied while the measurements continue
+        if self.config.fileName is not None:
+            self.openFileNameLabel.setText(os.path.basename(self.config.fileName))
+        self.config.configChanged.connect(self.applyConfig)
+        self.config.configError.connect(lambda message: self.statusLabel.setText("invalid control file"))
+        self.config.watch()
+
+    def openRecorder(self):
+        # a new recording is started with every change of the recording options
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if not self.config.value('recording', 'enabled'):
+            return
+        fileName = os.path.join(self.config.value('recording', 'directory'),
+                                time.strftime(self.config.value('recording', 'prefix') + "_%Y%m%d_%H%M%S.rec"))
+        self.recorder = Recorder(fileName, self.recordingChannels,
+                                 description="cell voltage / V, current / A, capacity / Ah, energy / Wh")
+
+    def applyConfig(self, changed):
+        # the options which cannot be changed while measuring are used with the next start
+        if ('acquisition', 'period') in changed:
+            self.periodSec = changed[('acquisition', 'period')]
+            self.measurementsThreadObj.periodRequested.emit(self.periodSec)
+        if ('buffer', 'capacity') in changed:
+            self.setHistoryCapacity(changed[('buffer', 'capacity')])
+        if 'recording' in set(section for section, key in changed):
+            self.openRecorder()
+        if ('display', 'refreshRate') in changed:
+            self.refreshRateHz = changed[('display', 'refreshRate')]
+            self.plotRefresher.setRefreshRate(self.refreshRateHz)
+        self.statusLabel.setText("configuration reloaded")
         
     def createManufacturerLabel(self):
         self.manufacturerGroupbox = QGroupBox(self.tr("Made by"))
@@ -141,16 +201,23 @@ class MainWindow(QMainWindow):
         self.openFileNameButton.setFixedSize(200, 30)
         self.openFileNameButton.setStyleSheet("QPushButton { background-color: yellow }")
 
+        # the push button to replay a recording
+        self.replayButton = QPushButton(self.tr("Replay Recording"))
+        self.replayButton.setFixedSize(200, 30)
+        self.replayButton.setStyleSheet("QPushButton { background-color: yellow }")
+
         # define the widget
         layout = QVBoxLayout()
         layout.addWidget(self.openFileNameButton)
         layout.addWidget(self.openFileNameLabel)
+        layout.addWidget(self.replayButton)
 
         # assign the layout to the group box
         self.configFileGroupBox.setLayout(layout)
 
         # define the connection between labels and functions
         self.openFileNameButton.clicked.connect(self.setOpenFileName)
+        self.replayButton.clicked.connect(self.selectRecordingToReplay)
 
     def createOnOffControlMeasurements(self):
         self.onOffCtrlGroupboxMeasurements = QGroupBox(self.tr("Measurements Control"))
@@ -228,12 +295,49 @@ class MainWindow(QMainWindow):
                 self.tr("Control File (*.ctrl)"))
         print("filename =", fileName)
         if (len(fileName[0]) > 0):
-            self.openFileNameLabel.setText(ntpath.basename(fileName[0]))
-            self.CtrlFile = str(ntpath.basename(fileName[0]))
+            try:
+                changed = self.config.load(fileName[0])
+            except ConfigError as e:
+                print(e)
+                self.statusLabel.setText("invalid control file")
+                return
+            self.openFileNameLabel.setText(os.path.basename(fileName[0]))
+            self.CtrlFile = fileName[0]
             self.CtrlFileGiven = True
+            # the selected file is watched from now on
+            self.config.watch()
+            if len(changed) > 0:
+                self.applyConfig(changed)
         else:
             self.CtrlFileGiven = False
         
+    def selectRecordingToReplay(self):
+        fileName = QFileDialog.getOpenFileName(self,
+                self.tr("Select Recording"),
+                "",
+                self.tr("Recording (*.rec)"))
+        if (len(fileName[0]) > 0):
+            self.replayRecording(fileName[0])
+
+    def replayRecording(self, fileName):
+        # stop the measurements and show the recorded history instead
+        if self.OnOffControlValueMeasurements == 1:
+            self.OnOffGenMeasurements()
+        self.chargeIntegrator.pause()
+        recording = RecordingReader(fileName)
+        self.initMeasurementsHistory()
+        self.measuredVoltages.extend(recording.channel('voltage'))
+        self.measuredCurrents.extend(recording.channel('current'))
+        self.measuredCapacities.extend(recording.channel('capacity'))
+        self.measuredEnergies.extend(recording.channel('energy'))
+        if len(recording) > 0:
+            self.voltageMeasurementDisplay.actualVoltageEdit.setText("{:2.2f}".format(self.measuredVoltages.last()))
+            self.currentMeasurementDisplay.actualCurrentEdit.setText("{:2.3f}".format(self.measuredCurrents.last()))
+            self.capacityMeasurementDisplay.actualCapacityEdit.setText("{:2.4f}".format(self.measuredCapacities.last()))
+            self.energyMeasurementDisplay.actualEnergyEdit.setText("{:2.4f}".format(self.measuredEnergies.last()))
+        self.statusLabel.setText("replay of " + os.path.basename(fileName))
+        self.plotRefresher.requestRefresh()
+
     def getStyleSheet(self, path):
         f = QFile(path)
         f.open(QFile.ReadOnly | QFile.Text)
@@ -241,61 +345,32 @@ class MainWindow(QMainWindow):
         f.close()
         return stylesheet
 
-    def initVoltageMeasurementsArray(self):
-        self.maxVoltageArraySize = 100
-        self.measuredVoltageArray = 4.0*np.ones(self.maxVoltageArraySize+1)
-        self.voltageArrayIndex = 0
-        self.noValidVoltageMeasurements = 0
-
-    def updateVoltageMeasurementsArray(self, measuredVoltageValue):
-        self.measuredVoltageArray[self.voltageArrayIndex] = measuredVoltageValue
-        self.voltageArrayIndex = self.voltageArrayIndex + 1
-        if (self.voltageArrayIndex > self.maxVoltageArraySize) :
-            self.voltageArrayIndex = 0
-    
-    def initCurrentMeasurementsArray(self):
-        self.maxCurrentArraySize = 100
-        self.measuredCurrentArray = 0.9*np.ones(self.maxCurrentArraySize+1)
-        self.currentArrayIndex = 0
-        self.noValidCurrentMeasurements = 0
-
-    def updateCurrentMeasurementsArray(self, measuredCurrentValue):
-        self.measuredCurrentArray[self.currentArrayIndex] = measuredCurrentValue
-        self.currentArrayIndex = self.currentArrayIndex + 1
-        if (self.currentArrayIndex > self.maxCurrentArraySize) :
-            self.currentArrayIndex = 0
-            
-    def initCapacityMeasurementsArray(self):
-        self.maxCapacityArraySize = 100
-        self.measuredCapacityArray = 0.9*np.ones(self.maxCapacityArraySize+1)
-        self.capacityArrayIndex = 0
-        self.noValidCapacityMeasurements = 0
-        
-    def updateCapacityMeasurementsArray(self, measuredCapacityValue):
-        self.measuredCapacityArray[self.capacityArrayIndex] = measuredCapacityValue
-        self.capacityArrayIndex = self.capacityArrayIndex + 1
-        if (self.capacityArrayIndex > self.maxCapacityArraySize) :
-            self.capacityArrayIndex = 0
-
-    def initEnergyMeasurementsArray(self):
-        self.maxEnergyArraySize = 100
-        self.measuredEnergyArray = 0.9*np.ones(self.maxEnergyArraySize+1)
-        self.energyArrayIndex = 0
-        self.noValidEnergyMeasurements = 0
-
-    def updateEnergyMeasurementsArray(self, measuredEnergyValue):
-        self.measuredEnergyArray[self.energyArrayIndex] = measuredEnergyValue
-        self.energyArrayIndex = self.energyArrayIndex + 1
-        if (self.energyArrayIndex > self.maxEnergyArraySize) :
-            self.energyArrayIndex = 0
+    def initMeasurementsHistory(self):
+        # the last historyCapacity values of each quantity in chronological order
+        self.measuredVoltages = MinMaxPyramid(self.historyCapacity)
+        self.measuredCurrents = MinMaxPyramid(self.historyCapacity)
+        self.measuredCapacities = MinMaxPyramid(self.historyCapacity)
+        self.measuredEnergies = MinMaxPyramid(self.historyCapacity)
+
+    def setHistoryCapacity(self, historyCapacity):
+        # the newest values are kept
+        histories = [self.measuredVoltages.view(), self.measuredCurrents.view(),
+                     self.measuredCapacities.view(), self.measuredEnergies.view()]
+        self.historyCapacity = historyCapacity
+        self.initMeasurementsHistory()
+        for history, values in zip([self.measuredVoltages, self.measuredCurrents,
+                                    self.measuredCapacities, self.measuredEnergies], histories):
+            history.extend(values[-historyCapacity:])
+        self.plotRefresher.requestRefresh()
 
     def updatePlots(self):
-        self.voltageMeasurementDisplay.updatePlot(self.measuredVoltageArray)
-        self.currentMeasurementDisplay.updatePlot(self.measuredCurrentArray)
-        self.capacityMeasurementDisplay.updatePlot(self.measuredCapacityArray)
-        self.energyMeasurementDisplay.updatePlot(self.measuredEnergyArray)
+        self.voltageMeasurementDisplay.updatePlot(self.measuredVoltages)
+        self.currentMeasurementDisplay.updatePlot(self.measuredCurrents)
+        self.capacityMeasurementDisplay.updatePlot(self.measuredCapacities)
+        self.energyMeasurementDisplay.updatePlot(self.measuredEnergies)
         
-    def handleMeasurements(self):
+    def handleMeasurements(self, scheduledTime, elapsedSec):
+        # scheduledTime is the monotonic time of the measurements, capacity and energy are integrated over it
         if (self.OnOffControlValueMeasurements == 1):
             # request voltage measurements from the voltage sensor and update the display
             try:
@@ -304,47 +379,40 @@ class MainWindow(QMainWindow):
                 print("measured voltage =", measuredVoltage)
                 # valid measurement received   --> update data array
                 self.actualVoltage = measuredVoltage
-                self.noValidVoltageMeasurements = self.noValidVoltageMeasurements + 1
-                if (self.noValidVoltageMeasurements > self.maxVoltageArraySize):
-                    self.noValidVoltageMeasurements = self.maxVoltageArraySize
                 self.voltageMeasurementDisplay.actualVoltageEdit.setText("{:2.2f}".format(measuredVoltage))
-                self.updateVoltageMeasurementsArray(measuredVoltage)
+                self.measuredVoltages.append(measuredVoltage)
 
                 # process the current measurement
                 measuredCurrent = self.msgIF.GetMeasuredCurrentValue()
                 print("measured current =", measuredCurrent)
                 # valid measurement received   --> update data array
                 self.actualCurrent = measuredCurrent
-                self.noValidCurrentMeasurements = self.noValidCurrentMeasurements + 1
-                if (self.noValidCurrentMeasurements > self.maxCurrentArraySize):
-                    self.noValidCurrentMeasurements = self.maxCurrentArraySize
                 self.currentMeasurementDisplay.actualCurrentEdit.setText("{:2.3f}".format(measuredCurrent))
-                self.updateCurrentMeasurementsArray(measuredCurrent)
+                self.measuredCurrents.append(measuredCurrent)
                 
-                # calculate the actual capacity  value
-                self.chargingTime = self.chargingTime + self.periodSec
-                self.actualCapacity = measuredCurrent * self.chargingTime / 3600.0
-                self.noValidCapacityMeasurements = self.noValidCapacityMeasurements + 1
-                if (self.noValidCapacityMeasurements > self.maxCapacityArraySize):
-                    self.noValidCapacityMeasurements = self.maxCapacityArraySize
+                # integrate the actual capacity and energy values up to this measurement
+                self.actualCapacity, self.actualEnergy = self.chargeIntegrator.addSample(scheduledTime, measuredVoltage,
+                                                                                         measuredCurrent)
                 self.capacityMeasurementDisplay.actualCapacityEdit.setText("{:2.4f}".format(self.actualCapacity))
-                self.updateCapacityMeasurementsArray(self.actualCapacity)
+                self.measuredCapacities.append(self.actualCapacity)
                 
-                # calculate the actual energy value
-                self.actualEnergy = measuredCurrent * measuredVoltage * self.chargingTime / 3600.0
-                self.noValidEnergyMeasurements = self.noValidEnergyMeasurements + 1
-                if (self.noValidEnergyMeasurements > self.maxEnergyArraySize):
-                    self.noValidEnergyMeasurements = self.maxEnergyArraySize
+                # display the actual energy value
                 self.energyMeasurementDisplay.actualEnergyEdit.setText("{:2.4f}".format(self.actualEnergy))
-                self.updateEnergyMeasurementsArray(self.actualEnergy)
+                self.measuredEnergies.append(self.actualEnergy)
+
+                # record the measured and calculated values
+                if self.recorder is not None:
+                    self.recorder.record(scheduledTime, [measuredVoltage, measuredCurrent, self.actualCapacity, self.actualEnergy])
                 
-                # update all plots
-                self.updatePlots()
+                # update all plots with the next frame
+                self.plotRefresher.requestRefresh()
 
             except TypeError:
                 print("failed to get correct measurements")
 
     def OnOffGenMeasurements(self):
+        # capacity and energy are only integrated while the measurements are on
+        self.chargeIntegrator.pause()
         if self.OnOffControlValueMeasurements == 1:
             self.OnOffControlValueMeasurements = 0
             self.onOffControlLabelMeasurements.setText(self.tr("Measurements are <b>OFF</b>"))
@@ -361,7 +429,14 @@ class MainWindow(QMainWindow):
         self.OnOffControlValueMeasurements = 1
         self.onOffControlLabelMeasurements.setText(self.tr("Measurements are <b>ON</b>"))
         self.msgIF.ResetMeasurements()
-        self.initMeasurementsArray()
+        self.initMeasurementsHistory()
+        self.chargeIntegrator.reset()
+
+    def closeEvent(self, event):
+        self.plotRefresher.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+        QMainWindow.closeEvent(self, event)
  
 if __name__ == '__main__':
     a = QApplication(sys.argv)
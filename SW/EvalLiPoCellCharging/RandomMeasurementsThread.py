@@ -17,25 +17,33 @@ from __future__ import print_function
 import random
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
+import UseDASCommon
+from DASCommon.PeriodicScheduler import PeriodicScheduler
    
 class RandomMeasurementsThread(QThread):
+    # new measurement period / s, delivered to the timer in the thread
+    periodRequested = pyqtSignal(float)
+
     def __init__(self, measurementHandler,periodSec):
         QThread.__init__(self)
         self.measurementHandler=measurementHandler
         self.periodSec = periodSec
 
     def run(self):
-        activateMeasurementTimer(self.measurementHandler,self.periodSec)
+        timer = activateMeasurementTimer(self.measurementHandler,self.periodSec)
+        self.periodRequested.connect(timer.setPeriod)
         self.exec_()
 
 timers = []
 
 def activateMeasurementTimer(measurementHandler,periodSec):
     print("Measurement thread started")
-    timer = QTimer()
-    timer.timeout.connect(measurementHandler)
-    timer.start(1000*periodSec)
+    # drift-free ticks every periodSec on the monotonic clock
+    timer = PeriodicScheduler(periodSec)
+    timer.tick.connect(measurementHandler)
+    timer.start()
     timers.append(timer)
+    return timer
 
 class MsgInterface(object):
     def __init__(self):
@@ -60,3 +68,12 @@ class MsgInterface(object):
         # print("GetMeasuredValues")
         measuredValue = 2.5+ 0.1*random.random()
         return measuredValue;
+
+    def TurnOnMeasurements(self):
+        self.running = True
+
+    def TurnOffMeasurements(self):
+        self.running = False
+
+    def ResetMeasurements(self):
+        pass
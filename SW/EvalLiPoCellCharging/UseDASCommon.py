@@ -0,0 +1,16 @@
+"""
+UseDASCommon.py
+
+makes the package DASCommon (SW/DASCommon) with the modules shared by both
+applications importable, imported before them:
+
+    import UseDASCommon
+    from DASCommon.Recorder import Recorder
+
+"""
+import os
+import sys
+
+sharedDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if sharedDirectory not in sys.path:
+    sys.path.append(sharedDirectory)
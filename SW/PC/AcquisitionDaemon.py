@@ -0,0 +1,362 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+Project MySimple4ChannelDAS
+
+Headless acquisition service: owns the MsgInterface, records the samples to disk and
+publishes the live samples to clients over a TCP socket on localhost
+(suited for Max OSX, Windows, Linux)
+
+The acquisition keeps running while GUIs connect, stall or restart. A GUI becomes a
+thin client by using DaemonClient instead of MeasurementsWorker, both hand over the
+samples by the same samplesReady signal.
+
+The daemon is set up by the same control file as the GUI (Config.ctrl): the ADS1115
+is configured before the measurements start, the samples are calibrated with the
+calibration file before they are recorded and published, so the clients receive the
+voltages at the inputs of the channels. The samples are recorded as set by the
+[recording] section, --record turns the recording on. Changes of the control file are
+applied while the acquisition continues.
+
+Protocol, one JSON object per line:
+
+    daemon -> client    {"samples": [[timestamp, voltage1..voltage4, switch1..switch4], ...]}
+                        {"status": "..."}
+    client -> daemon    {"command": "on" | "off" | "reset"}
+
+Usage:
+  python3 ./AcquisitionDaemon.py --config Config.ctrl --port /dev/ttyUSB0 --record
+  python3 ./Eval4ChanVoltageMeasFromArduino.py --daemon
+
+"""
+from __future__ import print_function
+import sys
+import argparse
+import json
+import signal
+import os
+import configparser
+import time
+import numpy as np
+from PyQt5.QtCore import QObject, QThread, QTimer, QCoreApplication, QMetaObject, Qt, pyqtSignal, pyqtSlot
+from PyQt5.QtNetwork import QTcpServer, QTcpSocket, QHostAddress
+from MeasurementsThread import MsgInterface, MeasurementsWorker, StreamedSample, measurementsSchema
+from Calibration import Calibration
+import UseDASCommon
+from DASCommon.Recorder import Recorder
+from DASCommon.AcquisitionConfig import AcquisitionConfig, ConfigError
+
+DEFAULT_TCP_PORT = 5760
+NO_CHANNELS = 4
+# a client which does not read its samples loses the new ones beyond this backlog
+MAX_CLIENT_BACKLOG_BYTES = 4*1024*1024
+
+def encodeSamples(samples):
+    rows = [[sample.timestamp] + list(sample.voltages) + list(sample.switchStates) for sample in samples]
+    return (json.dumps({'samples': rows}) + '\n').encode('ascii')
+
+def decodeSamples(rows):
+    return [StreamedSample(row[0], row[1:1 + NO_CHANNELS], row[1 + NO_CHANNELS:1 + 2*NO_CHANNELS]) for row in rows]
+
+class AcquisitionDaemon(QObject):
+    # commands to the measurements worker, delivered in the worker thread
+    measurementsOnRequested = pyqtSignal(bool)
+    resetRequested = pyqtSignal()
+    periodRequested = pyqtSignal(float)
+    adcConfigRequested = pyqtSignal(bool, int, int)
+
+    def __init__(self, msgIF, config, recordingFileName=None, tcpPort=DEFAULT_TCP_PORT):
+        """ config: AcquisitionConfig of the measurementsSchema
+        """
+        QObject.__init__(self)
+        self.config = config
+        self.noChannels = config.value('acquisition', 'channels')
+        self.clients = []
+        self.droppedSamples = {}
+        self.noSamples = 0
+
+        # mode, data rate and range of the ADS1115 before the measurements are turned on
+        msgIF.SetAdcConfig(*self.adcConfigValues())
+
+        # gain, offset, divider ratio and polynomial correction of the channels
+        self.loadCalibration()
+
+        # recorded as set by the control file, always to recordingFileName if given
+        self.recordingFileName = recordingFileName
+        self.recorder = None
+        self.openRecorder()
+
+        # only local clients are accepted
+        self.server = QTcpServer(self)
+        self.server.newConnection.connect(self.acceptClient)
+        if not self.server.listen(QHostAddress.LocalHost, tcpPort):
+            raise IOError("could not listen on port {}: {}".format(tcpPort, self.server.errorString()))
+        print("acquisition daemon listening on localhost port", tcpPort)
+
+        self.measurementsWorker = MeasurementsWorker(msgIF, config.value('acquisition', 'period'),
+                                                     streaming=config.value('acquisition', 'streaming'),
+                                                     fifo=config.value('acquisition', 'fifo'))
+        self.measurementsWorker.samplesReady.connect(self.publishSamples)
+        self.measurementsOnRequested.connect(self.measurementsWorker.setMeasurementsOn)
+        self.resetRequested.connect(self.measurementsWorker.resetMeasurements)
+        self.periodRequested.connect(self.measurementsWorker.setPeriod)
+        self.adcConfigRequested.connect(self.measurementsWorker.setAdcConfig)
+        self.measurementsWorker.startInThread()
+
+        # changes of the control file are applied while the acquisition continues
+        self.config.configChanged.connect(self.applyConfig)
+        self.config.watch()
+
+    def adcConfigValues(self):
+        return (self.config.value('adc', 'continuous'), self.config.value('adc', 'dataRate'),
+                self.config.value('adc', 'range'))
+
+    def loadCalibration(self):
+        # an invalid calibration file keeps the previous calibration, at the start the default one
+        calibrationFile = self.config.value('scaling', 'calibration')
+        try:
+            if os.path.exists(calibrationFile):
+                calibration = Calibration.fromFile(calibrationFile)
+            else:
+                calibration = Calibration()
+        except (IOError, OSError, ValueError, configparser.Error) as error:
+            print("error: calibration file", calibrationFile, "not loaded:", error)
+            if getattr(self, 'calibration', None) is None:
+                self.calibration = Calibration()
+            return False
+        self.calibration = calibration
+        print("calibration:\n" + str(self.calibration))
+        return True
+
+    def openRecorder(self):
+        # a new recording is started with every change of the recording options
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.recordingFileName is not None:
+            fileName = self.recordingFileName
+        elif not self.config.value('recording', 'enabled'):
+            return
+        else:
+            fileName = os.path.join(self.config.value('recording', 'directory'),
+                                    time.strftime(self.config.value('recording', 'prefix') + "_%Y%m%d_%H%M%S.rec"))
+        channelNumbers = [str(k + 1) for k in range(self.noChannels)]
+        channelNames = ['voltage' + n for n in channelNumbers] + ['switch' + n for n in channelNumbers]
+        self.recorder = Recorder(fileName, channelNames,
+                                 description="{}-channel voltages / V and switch states".format(self.noChannels))
+
+    def applyConfig(self, changed):
+        # the options which cannot be changed while measuring are used with the next start
+        sections = set(section for section, key in changed)
+        if ('acquisition', 'period') in changed:
+            self.periodRequested.emit(changed[('acquisition', 'period')])
+        if 'adc' in sections:
+            self.adcConfigRequested.emit(*self.adcConfigValues())
+        if 'scaling' in sections:
+            self.loadCalibration()
+        if 'recording' in sections and self.recordingFileName is None:
+            self.openRecorder()
+
+    @pyqtSlot()
+    def acceptClient(self):
+        while self.server.hasPendingConnections():
+            client = self.server.nextPendingConnection()
+            client.readyRead.connect(lambda client=client: self.readCommands(client))
+            client.disconnected.connect(lambda client=client: self.removeClient(client))
+            self.clients.append(client)
+            self.droppedSamples[client] = 0
+            self.sendStatus(client, "connected")
+            print("client connected, {} clients".format(len(self.clients)))
+
+    def removeClient(self, client):
+        if client in self.clients:
+            self.clients.remove(client)
+            print("client disconnected, {} samples dropped, {} clients".format(
+                self.droppedSamples.pop(client, 0), len(self.clients)))
+            client.deleteLater()
+
+    def readCommands(self, client):
+        while client.canReadLine():
+            line = bytes(client.readLine()).decode('ascii', 'replace').strip()
+            try:
+                command = json.loads(line).get('command')
+            except (ValueError, AttributeError):
+                self.sendStatus(client, "invalid message: " + line)
+                continue
+            if command == 'on':
+                self.measurementsOnRequested.emit(True)
+            elif command == 'off':
+                self.measurementsOnRequested.emit(False)
+            elif command == 'reset':
+                self.resetRequested.emit()
+            else:
+                self.sendStatus(client, "unknown command: " + str(command))
+                continue
+            self.sendStatus(client, "command " + command)
+
+    def sendStatus(self, client, status):
+        client.write((json.dumps({'status': status}) + '\n').encode('ascii'))
+
+    @pyqtSlot(object)
+    def publishSamples(self, samples):
+        self.noSamples = self.noSamples + len(samples)
+        # the voltages at the inputs of the channels, calibrated and scaled with the divider ratios
+        timestamps = np.array([sample.timestamp for sample in samples])
+        measuredVoltages = np.array([sample.voltages for sample in samples], dtype=np.float64).T
+        switchStates = np.array([sample.switchStates for sample in samples]).T
+        inputVoltages = self.calibration.apply(measuredVoltages, switchStates)
+        if self.recorder is not None:
+            self.recorder.recordBlock(timestamps, np.vstack((inputVoltages[:self.noChannels],
+                                                             switchStates[:self.noChannels])).T)
+        message = encodeSamples([StreamedSample(sample.timestamp, voltages, sample.switchStates)
+                                 for sample, voltages in zip(samples, inputVoltages.T.tolist())])
+        for client in self.clients:
+            if client.bytesToWrite() > MAX_CLIENT_BACKLOG_BYTES:
+                self.droppedSamples[client] = self.droppedSamples[client] + len(samples)
+            else:
+                client.write(message)
+
+    def stop(self):
+        self.measurementsWorker.stopThread()
+        # publish the last samples handed over by the worker
+        QCoreApplication.processEvents()
+        for client in list(self.clients):
+            client.flush()
+            client.disconnectFromHost()
+        self.server.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        print("acquisition daemon stopped after {} samples".format(self.noSamples))
+
+class DaemonClient(QObject):
+    """ Thin client of the acquisition daemon with the interface of MeasurementsWorker.
+        The socket is read in its own thread, the samples are handed over as batches
+        by the queued samplesReady signal.
+    """
+    # list of StreamedSample
+    samplesReady = pyqtSignal(object)
+
+    def __init__(self, tcpPort=DEFAULT_TCP_PORT, reconnectSec=1.0):
+        QObject.__init__(self)
+        self.tcpPort = tcpPort
+        self.reconnectSec = reconnectSec
+        self.socket = None
+        self.reconnectTimer = None
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.start)
+
+    def startInThread(self):
+        self.thread.start()
+
+    def stopThread(self):
+        QMetaObject.invokeMethod(self, "stop", Qt.BlockingQueuedConnection)
+        self.thread.quit()
+        self.thread.wait()
+
+    @pyqtSlot()
+    def start(self):
+        self.socket = QTcpSocket(self)
+        self.socket.readyRead.connect(self.readSamples)
+        self.socket.disconnected.connect(self.scheduleReconnect)
+        self.socket.errorOccurred.connect(self.scheduleReconnect)
+        # the daemon may start later or restart, try to connect again until it is back
+        self.reconnectTimer = QTimer(self)
+        self.reconnectTimer.setSingleShot(True)
+        self.reconnectTimer.timeout.connect(self.connectToDaemon)
+        self.connectToDaemon()
+
+    @pyqtSlot()
+    def stop(self):
+        self.reconnectTimer.stop()
+        self.socket.disconnected.disconnect(self.scheduleReconnect)
+        self.socket.errorOccurred.disconnect(self.scheduleReconnect)
+        self.socket.disconnectFromHost()
+
+    @pyqtSlot()
+    def connectToDaemon(self):
+        if self.socket.state() == QTcpSocket.UnconnectedState:
+            self.socket.connectToHost(QHostAddress(QHostAddress.LocalHost), self.tcpPort)
+
+    @pyqtSlot()
+    def scheduleReconnect(self, *args):
+        if not self.reconnectTimer.isActive():
+            self.reconnectTimer.start(int(1000*self.reconnectSec))
+
+    @pyqtSlot()
+    def readSamples(self):
+        samples = []
+        while self.socket.canReadLine():
+            try:
+                message = json.loads(bytes(self.socket.readLine()).decode('ascii'))
+            except ValueError:
+                print("invalid message from the acquisition daemon")
+                continue
+            if 'samples' in message:
+                samples.extend(decodeSamples(message['samples']))
+            elif 'status' in message:
+                print("acquisition daemon:", message['status'])
+        if len(samples) > 0:
+            self.samplesReady.emit(samples)
+
+    @pyqtSlot(bool)
+    def setMeasurementsOn(self, on):
+        self.sendCommand('on' if on else 'off')
+
+    @pyqtSlot()
+    def resetMeasurements(self):
+        self.sendCommand('reset')
+
+    def sendCommand(self, command):
+        if self.socket.state() == QTcpSocket.ConnectedState:
+            self.socket.write((json.dumps({'command': command}) + '\n').encode('ascii'))
+        else:
+            print("acquisition daemon not connected, command dropped:", command)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Headless acquisition daemon of the MySimple4ChannelDAS")
+    parser.add_argument('--config', default='Config.ctrl', help="control file of the acquisition")
+    parser.add_argument('--port', help="serial port of the Arduino, overrides the control file")
+    parser.add_argument('--baud', type=int, help="highest baud rate to negotiate, overrides the control file")
+    parser.add_argument('--period', type=float, help="acquisition period / s, overrides the control file")
+    parser.add_argument('--polling', action='store_true', help="poll the samples instead of streaming")
+    parser.add_argument('--calibration', help="calibration file, overrides the control file")
+    parser.add_argument('--tcp-port', type=int, default=DEFAULT_TCP_PORT, help="TCP port on localhost")
+    parser.add_argument('--record', nargs='?', const='',
+                        help="record, to this file if given, overrides the control file")
+    args = parser.parse_args(argv)
+
+    application = QCoreApplication(sys.argv[:1])
+    # the given arguments take precedence over the control file
+    config = AcquisitionConfig(measurementsSchema)
+    if os.path.exists(args.config):
+        try:
+            config.load(args.config)
+        except ConfigError as e:
+            print(e)
+            print("using the default configuration")
+    overrides = [('port', args.port), ('baud', args.baud), ('period', args.period),
+                 ('streaming', False if args.polling else None)]
+    for key, value in overrides:
+        if value is not None:
+            config.setOverride('acquisition', key, value)
+    if args.calibration is not None:
+        config.setOverride('scaling', 'calibration', args.calibration)
+    if args.record is not None:
+        config.setOverride('recording', 'enabled', True)
+    print("configuration:\n" + str(config))
+
+    msgIF = MsgInterface(config.value('acquisition', 'port'), maxBaud=config.value('acquisition', 'baud'))
+    daemon = AcquisitionDaemon(msgIF, config, recordingFileName=args.record or None, tcpPort=args.tcp_port)
+    # stop cleanly on Ctrl-C or kill, the timer lets Python handle the signals
+    signal.signal(signal.SIGINT, lambda *args: application.quit())
+    signal.signal(signal.SIGTERM, lambda *args: application.quit())
+    signalTimer = QTimer()
+    signalTimer.timeout.connect(lambda: None)
+    signalTimer.start(200)
+    application.exec_()
+    daemon.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+Project MySimple4ChannelDAS
+
+Offline analysis of recordings made by Recorder, runs without Qt
+(suited for Max OSX, Windows, Linux)
+
+The recording is mapped with np.memmap and processed chunk by chunk, so recordings
+larger than the memory can be analysed. For every channel it computes mean, RMS,
+standard deviation, min/max with their timestamps, a histogram and the integral over
+time (trapezoidal rule, e.g. the charge in As and Ah of a current channel).
+
+Usage:
+  python3 ./AnalyseRecording.py Eval4Chan_20261018_120000.rec
+  python3 ./AnalyseRecording.py LiPoCharging_20261018_120000.rec --bins 20 --histograms --json result.json
+
+"""
+from __future__ import print_function
+import sys
+import argparse
+import json
+import math
+import numpy as np
+import UseDASCommon
+from DASCommon.Recorder import RecordingReader
+
+class ChannelStatistics(object):
+    """ Statistics of one channel accumulated over the chunks of a recording
+    """
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.sum = 0.0
+        self.sumSquares = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.minTime = 0.0
+        self.maxTime = 0.0
+        # integral over time, the last sample of a chunk is the start of the next interval
+        self.integral = 0.0
+        self.lastTime = None
+        self.lastValue = None
+        self.histogramEdges = None
+        self.histogramCounts = None
+
+    def addChunk(self, timestamps, values):
+        if len(values) == 0:
+            return
+        self.count = self.count + len(values)
+        self.sum = self.sum + float(np.sum(values))
+        self.sumSquares = self.sumSquares + float(np.dot(values, values))
+        k = int(np.argmin(values))
+        if values[k] < self.min:
+            self.min = float(values[k])
+            self.minTime = float(timestamps[k])
+        k = int(np.argmax(values))
+        if values[k] > self.max:
+            self.max = float(values[k])
+            self.maxTime = float(timestamps[k])
+        if self.lastTime is not None:
+            timestamps = np.concatenate(([self.lastTime], timestamps))
+            values = np.concatenate(([self.lastValue], values))
+        self.integral = self.integral + float(np.sum(0.5 * (values[1:] + values[:-1]) * np.diff(timestamps)))
+        self.lastTime = float(timestamps[-1])
+        self.lastValue = float(values[-1])
+
+    def initHistogram(self, noBins, valueRange=None):
+        if valueRange is None:
+            valueRange = (self.min, self.max) if self.count > 0 else (0.0, 1.0)
+        if valueRange[1] <= valueRange[0]:
+            valueRange = (valueRange[0] - 0.5, valueRange[0] + 0.5)
+        self.histogramEdges = np.linspace(valueRange[0], valueRange[1], noBins + 1)
+        self.histogramCounts = np.zeros(noBins, dtype=np.int64)
+
+    def addHistogramChunk(self, values):
+        counts, edges = np.histogram(values, bins=self.histogramEdges)
+        self.histogramCounts = self.histogramCounts + counts
+
+    def mean(self):
+        return self.sum / self.count if self.count > 0 else 0.0
+
+    def rms(self):
+        return math.sqrt(self.sumSquares / self.count) if self.count > 0 else 0.0
+
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(0.0, (self.sumSquares - self.sum * self.sum / self.count) / (self.count - 1)))
+
+    def asDict(self):
+        result = {'count': self.count,
+                  'mean': self.mean(),
+                  'rms': self.rms(),
+                  'std': self.std(),
+                  'min': self.min,
+                  'minTime': self.minTime,
+                  'max': self.max,
+                  'maxTime': self.maxTime,
+                  'integral': self.integral,
+                  'integralPerHour': self.integral / 3600.0}
+        if self.histogramCounts is not None:
+            result['histogramEdges'] = self.histogramEdges.tolist()
+            result['histogramCounts'] = self.histogramCounts.tolist()
+        return result
+
+def analyseRecording(fileName, channelNames=None, noBins=50, chunkSize=1000000, histogramRange=None):
+    """ Analyse the given channels (all by default) of a recording in two passes over the chunks,
+        the second pass fills the histograms with the value range found in the first one
+    """
+    recording = RecordingReader(fileName)
+    if channelNames is None:
+        channelNames = recording.channelNames
+    indices = [recording.channelNames.index(name) for name in channelNames]
+    statistics = [ChannelStatistics(name) for name in channelNames]
+
+    for chunk in recording.chunks(chunkSize):
+        timestamps = np.asarray(chunk['timestamp'])
+        for index, channelStatistics in zip(indices, statistics):
+            channelStatistics.addChunk(timestamps, np.asarray(chunk['values'][:, index]))
+
+    if noBins > 0:
+        for channelStatistics in statistics:
+            channelStatistics.initHistogram(noBins, histogramRange)
+        for chunk in recording.chunks(chunkSize):
+            for index, channelStatistics in zip(indices, statistics):
+                channelStatistics.addHistogramChunk(np.asarray(chunk['values'][:, index]))
+
+    timestamps = recording.timestamps()
+    duration = float(timestamps[-1] - timestamps[0]) if len(recording) > 1 else 0.0
+    return {'file': fileName,
+            'header': recording.header,
+            'samples': len(recording),
+            'durationSec': duration,
+            'channels': dict((s.name, s.asDict()) for s in statistics)}
+
+def printResult(result, showHistograms=False):
+    print("recording:", result['file'])
+    print("started:  ", result['header'].get('startTime', ''), " ", result['header'].get('description', ''))
+    print("samples:  ", result['samples'], "  duration: {:.1f} s".format(result['durationSec']))
+    print("{:>12} {:>12} {:>12} {:>12} {:>12} {:>12} {:>14} {:>14}".format(
+        'channel', 'mean', 'rms', 'std', 'min', 'max', 'integral*s', 'integral*h'))
+    for name, channel in result['channels'].items():
+        print("{:>12} {:12.6g} {:12.6g} {:12.6g} {:12.6g} {:12.6g} {:14.6g} {:14.6g}".format(
+            name, channel['mean'], channel['rms'], channel['std'], channel['min'], channel['max'],
+            channel['integral'], channel['integralPerHour']))
+    if showHistograms:
+        for name, channel in result['channels'].items():
+            if 'histogramCounts' not in channel:
+                continue
+            print("histogram of", name)
+            counts = channel['histogramCounts']
+            edges = channel['histogramEdges']
+            maxCount = max(max(counts), 1)
+            for k, count in enumerate(counts):
+                print("  {:12.6g} .. {:12.6g} {:10d} {}".format(edges[k], edges[k + 1], count, '#' * int(40 * count / maxCount)))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Analyse a recording of the MySimple4ChannelDAS")
+    parser.add_argument('fileName', help="recording (*.rec)")
+    parser.add_argument('--channels', nargs='+', help="channels to analyse, all by default")
+    parser.add_argument('--bins', type=int, default=50, help="number of histogram bins, 0 for no histograms")
+    parser.add_argument('--range', type=float, nargs=2, metavar=('LOW', 'HIGH'), help="histogram value range")
+    parser.add_argument('--chunk-size', type=int, default=1000000, help="samples per chunk")
+    parser.add_argument('--histograms', action='store_true', help="print the histograms")
+    parser.add_argument('--json', help="write the result to this JSON file")
+    args = parser.parse_args(argv)
+
+    result = analyseRecording(args.fileName, args.channels, args.bins, args.chunk_size, args.range)
+    printResult(result, args.histograms)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
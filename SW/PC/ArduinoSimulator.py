@@ -0,0 +1,458 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+Stand-in for the Arduino board of the 4-channel DAS on a pseudo terminal
+(suited for Linux and Max OSX)
+
+The simulator answers the CmdMessenger commands of the FourChannelVoltageMeasurements
+sketch, so MsgInterface can be used without the hardware:
+
+    sim = ArduinoSimulator()
+    sim.start()
+    msgIF = MsgInterface(sim.port_name)
+
+For benchmarks and regression tests of the serial path it is configurable:
+
+    samplePeriodSec     period of the samples in single shot mode, in continuous mode the
+                        period follows the data rate of the ADS1115 like on the Arduino
+                        (8 conversions per sample, 2 per channel). Every sample is kept in
+                        a FIFO of fifoSize samples for sendSampleBlock and is streamed
+                        while the streaming is on
+    waveforms           one Waveform per channel (constant, sine, square, triangle,
+                        sawtooth with offset, amplitude, frequency and gaussian noise),
+                        None keeps the constant measuredVoltages of the channel
+    switchStatus        positions of the 4 channel switches
+    latencySec          delay of every frame sent to the PC
+    throttleBaud        frames leave at most with the negotiated baud rate (10 bits per
+                        byte) like on the real link, a pty has no baud rate of its own.
+                        A streamed sample is dropped, like on the Arduino, when more
+                        than txBufferSize bytes are still waiting to be sent
+
+    sim = ArduinoSimulator(samplePeriodSec=0.01, latencySec=0.002, throttleBaud=True,
+                           waveforms=[Waveform('sine', offset=2.5, amplitude=1.0, frequencyHz=0.5)] * 4)
+
+Commands with unknown ids or arguments of the wrong size are answered with the error
+of an unknown command like on the Arduino and counted in getStatistics().
+
+Usage:
+  python3 ./ArduinoSimulator.py --rate 100 --waveform sine:offset=2.5,amplitude=1,frequency=0.5,noise=0.01
+                                --switches 1 0 1 0 --latency 2 --throttle
+  python3 ./ArduinoSimulator.py --continuous --dataRate 860 --range 4096
+
+"""
+from __future__ import print_function
+import sys
+import argparse
+import math
+import os
+import pty
+import random
+import tty
+import select
+import struct
+import threading
+import time
+from collections import deque
+from SampleFrames import encodeSampleFrame
+
+# the following command sequence has to correspond to the enum in CmdMessengerPC.h
+commandNames = ['commError',
+                'comment',
+                'sendAcknowledge',
+                'areYouReady',
+                'error',
+                'askUsIfReady',
+                'youAreReady',
+                'sendMeasuredVoltage1',
+                'sendMeasuredVoltage2',
+                'sendMeasuredVoltage3',
+                'sendMeasuredVoltage4',
+                'sendSwitchStatus1',
+                'sendSwitchStatus2',
+                'sendSwitchStatus3',
+                'sendSwitchStatus4',
+                'turnOnMeasurements',
+                'turnOffMeasurements',
+                'resetMeasurements',
+                'floatValue',
+                'int16Value',
+                'sendAllChannels',
+                'allChannelsValues',
+                'streamedSample',
+                'getAdcConfig',
+                'setAdcConfig',
+                'adcConfigValues',
+                'sendSampleBlock',
+                'fifoSample',
+                'sampleBlock',
+                'baudRateAccepted']
+
+# data rates / SPS and ranges / mV of the ADS1115 accepted by setAdcConfig
+adcDataRates = [8, 16, 32, 64, 128, 250, 475, 860]
+adcRanges = [6144, 4096, 2048, 1024, 512, 256]
+
+FIELD_SEPARATOR = b','
+COMMAND_SEPARATOR = b';'
+ESCAPE_SEPARATOR = b'/'
+
+def escapeBinArg(value):
+    """ Escape the separators in a binary argument like CmdMessenger::sendCmdBinArg
+    """
+    escaped = bytearray()
+    for byte in value:
+        if byte in b',;/\0':
+            escaped += ESCAPE_SEPARATOR
+        escaped.append(byte)
+    return bytes(escaped)
+
+def splitFields(command):
+    """ Split a received command at the unescaped field separators and remove the escapes
+    """
+    fields = [bytearray()]
+    escaped = False
+    for byte in command:
+        if escaped:
+            fields[-1].append(byte)
+            escaped = False
+        elif byte == ESCAPE_SEPARATOR[0]:
+            escaped = True
+        elif byte == FIELD_SEPARATOR[0]:
+            fields.append(bytearray())
+        else:
+            fields[-1].append(byte)
+    return [bytes(field) for field in fields]
+
+class Waveform(object):
+    """ Signal of one simulated channel in V as function of the time since the simulator start
+    """
+    shapes = ('constant', 'sine', 'square', 'triangle', 'sawtooth')
+
+    def __init__(self, shape='constant', offset=0.0, amplitude=0.0, frequencyHz=1.0, noise=0.0, phase=0.0):
+        if shape not in self.shapes:
+            raise ValueError("unknown waveform " + shape)
+        self.shape = shape
+        self.offset = offset
+        self.amplitude = amplitude
+        self.frequencyHz = frequencyHz
+        self.noise = noise
+        self.phase = phase
+
+    @classmethod
+    def fromString(cls, spec):
+        """ Waveform from 'shape:key=value,...', e.g. 'sine:offset=2.5,amplitude=1,frequency=0.5,noise=0.01'
+        """
+        shape, _, arguments = spec.partition(':')
+        kwargs = {}
+        for argument in arguments.split(',') if arguments else []:
+            key, _, value = argument.partition('=')
+            key = {'frequency': 'frequencyHz'}.get(key.strip(), key.strip())
+            kwargs[key] = float(value)
+        return cls(shape.strip(), **kwargs)
+
+    def value(self, t):
+        cycle = (t * self.frequencyHz + self.phase) % 1.0
+        if self.shape == 'sine':
+            value = math.sin(2.0 * math.pi * cycle)
+        elif self.shape == 'square':
+            value = 1.0 if cycle < 0.5 else -1.0
+        elif self.shape == 'triangle':
+            value = 4.0 * cycle - 1.0 if cycle < 0.5 else 3.0 - 4.0 * cycle
+        elif self.shape == 'sawtooth':
+            value = 2.0 * cycle - 1.0
+        else:
+            value = 0.0
+        value = self.offset + self.amplitude * value
+        if self.noise > 0.0:
+            value = value + random.gauss(0.0, self.noise)
+        return value
+
+class ArduinoSimulator(object):
+    def __init__(self, samplePeriodSec=0.1, waveforms=None, switchStatus=None, latencySec=0.0, throttleBaud=False,
+                 txBufferSize=64, fifoSize=24):
+        self.cmdId = dict((name, index) for index, name in enumerate(commandNames))
+        self.measuredVoltages = [1.0, 2.0, 3.0, 4.0]
+        self.waveforms = list(waveforms) if waveforms is not None else [None] * 4
+        self.switchStatus = list(switchStatus) if switchStatus is not None else [1, 0, 1, 0]
+        # streaming of the samples started by turnOnMeasurements with argument 1 or 2 (binary frames)
+        self.samplePeriodSec = samplePeriodSec
+        self.streamingOn = False
+        self.binaryFrames = False
+        self.sampleSequence = 0
+        self.fullScaleVolt = 6.144
+        self.nextSampleTime = 0.0
+        # configuration of the ADS1115 set by setAdcConfig
+        self.adcContinuous = False
+        self.adcDataRate = 128
+        self.adcRange = 6144
+        self.noAdcOverflows = 0
+        # the samples buffered for sendSampleBlock, the oldest is lost when it is full
+        self.sampleFifo = deque(maxlen=fifoSize)
+        self.noFifoOverflows = 0
+        self.startTime = time.monotonic()
+        # baud rates the simulated firmware accepts, highest first
+        self.supportedBaudRates = [115200, 57600, 38400, 19200, 9600]
+        self.baud = 9600
+        # the link to the PC: latency, baud rate throttling and the frames on their way
+        self.latencySec = latencySec
+        self.throttleBaud = throttleBaud
+        self.txBufferSize = txBufferSize
+        self.outgoing = deque()
+        self.outgoingBytes = 0
+        self.linkBusyUntil = 0.0
+        self.noSamples = 0
+        self.noDroppedSamples = 0
+        self.noCommands = 0
+        self.noMalformedCommands = 0
+        self.running = False
+        self.thread = None
+
+        # open the pseudo terminal pair, the slave side plays the USB serial port
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+
+    def start(self):
+        self.running = True
+        self.nextSampleTime = time.monotonic() + self.samplePeriod()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def setSwitchStatus(self, channelIndex, status):
+        # channelIndex 1..4, status 1 for the position 1:1
+        self.switchStatus[channelIndex - 1] = status
+
+    def setAdcConfig(self, continuous, dataRateSPS, rangeMV):
+        # returns False and keeps the configuration if it is not supported
+        if dataRateSPS not in adcDataRates or rangeMV not in adcRanges:
+            return False
+        self.adcContinuous = continuous
+        self.adcDataRate = dataRateSPS
+        self.adcRange = rangeMV
+        self.fullScaleVolt = rangeMV / 1000.0
+        return True
+
+    def samplePeriod(self):
+        if self.adcContinuous:
+            # the first conversion after switching the multiplexer is discarded
+            return 2.0 * 4 / self.adcDataRate
+        return self.samplePeriodSec
+
+    def currentVoltages(self):
+        t = time.monotonic() - self.startTime
+        voltages = []
+        for k in range(4):
+            voltage = self.waveforms[k].value(t) if self.waveforms[k] is not None else self.measuredVoltages[k]
+            # the ADS1115 saturates at its full scale
+            voltages.append(max(-self.fullScaleVolt, min(self.fullScaleVolt, voltage)))
+        return voltages
+
+    def getStatistics(self):
+        return {'samples': self.noSamples,
+                'droppedSamples': self.noDroppedSamples,
+                'fifoOverflows': self.noFifoOverflows,
+                'commands': self.noCommands,
+                'malformedCommands': self.noMalformedCommands,
+                'baud': self.baud,
+                'outgoingBytes': self.outgoingBytes}
+
+    def run(self):
+        received = b''
+        while self.running:
+            now = time.monotonic()
+            timeout = 0.05
+            timeout = min(timeout, self.nextSampleTime - now)
+            if len(self.outgoing) > 0:
+                timeout = min(timeout, self.outgoing[0][0] - now)
+            readable, _, _ = select.select([self.master_fd], [], [], max(0.0, timeout))
+            if time.monotonic() >= self.nextSampleTime:
+                self.takeSample()
+                self.nextSampleTime = self.nextSampleTime + self.samplePeriod()
+            self.writeOutgoing()
+            if not readable:
+                continue
+            try:
+                received += os.read(self.master_fd, 1024)
+            except OSError:
+                break
+            # process all complete commands
+            while COMMAND_SEPARATOR in received:
+                command, received = received.split(COMMAND_SEPARATOR, 1)
+                self.processCommand(command)
+            self.writeOutgoing()
+
+    def processCommand(self, command):
+        self.noCommands = self.noCommands + 1
+        try:
+            self.executeCommand(splitFields(command.lstrip()))
+        except (ValueError, IndexError, struct.error):
+            # unknown command or arguments of the wrong size, answered like an unknown command
+            self.noMalformedCommands = self.noMalformedCommands + 1
+            self.sendCmd('error', [b'to PC: Unknown command'])
+
+    def executeCommand(self, fields):
+        name = commandNames[int(fields[0])]
+        if name == 'areYouReady':
+            if len(fields) > 1:
+                # baud rate negotiation: answer with the highest common baud rate
+                requestedBaud = struct.unpack('<L', fields[1])[0]
+                acceptedBaud = 9600
+                for baud in self.supportedBaudRates:
+                    if baud <= requestedBaud:
+                        acceptedBaud = baud
+                        break
+                self.sendCmd('baudRateAccepted', [struct.pack('<L', acceptedBaud)])
+                self.baud = acceptedBaud
+            else:
+                self.sendCmd('sendAcknowledge', [b'to PC: Arduino ready'])
+        elif name.startswith('sendMeasuredVoltage'):
+            channelIndex = int(name[-1]) - 1
+            self.sendCmd('floatValue', [struct.pack('<f', self.currentVoltages()[channelIndex])])
+        elif name.startswith('sendSwitchStatus'):
+            channelIndex = int(name[-1]) - 1
+            self.sendCmd('int16Value', [struct.pack('<h', self.switchStatus[channelIndex])])
+        elif name == 'sendAllChannels':
+            args = [struct.pack('<f', voltage) for voltage in self.currentVoltages()]
+            args += [struct.pack('<h', status) for status in self.switchStatus]
+            self.sendCmd('allChannelsValues', args)
+        elif name == 'turnOnMeasurements':
+            streamingMode = struct.unpack('<h', fields[1])[0] if len(fields) > 1 else 0
+            if streamingMode in (1, 2):
+                self.streamingOn = True
+                self.binaryFrames = streamingMode == 2
+                self.nextSampleTime = time.monotonic() + self.samplePeriod()
+                if self.binaryFrames:
+                    self.sendCmd('sendAcknowledge', [b'to PC: turn on measurements binary streaming'])
+                else:
+                    self.sendCmd('sendAcknowledge', [b'to PC: turn on measurements streaming'])
+            else:
+                self.sendCmd('sendAcknowledge', [b'to PC: turn on measurements'])
+        elif name == 'turnOffMeasurements':
+            self.streamingOn = False
+            self.sendCmd('sendAcknowledge', [b'to PC: turn off measurements'])
+        elif name == 'resetMeasurements':
+            self.sendCmd('sendAcknowledge', [b'to PC: reset measurements'])
+        elif name == 'getAdcConfig':
+            self.sendAdcConfig()
+        elif name == 'setAdcConfig':
+            if len(fields) > 3:
+                mode, dataRate, adcRange = [struct.unpack('<h', field)[0] for field in fields[1:4]]
+                if mode in (0, 1):
+                    self.setAdcConfig(mode == 1, dataRate, adcRange)
+            # the reply contains the configuration in use in any case
+            self.sendAdcConfig()
+        elif name == 'sendSampleBlock':
+            maxSamples = struct.unpack('<h', fields[1])[0] if len(fields) > 1 else 0
+            if maxSamples <= 0 or maxSamples > self.sampleFifo.maxlen:
+                maxSamples = self.sampleFifo.maxlen
+            noSamples = 0
+            while noSamples < maxSamples and len(self.sampleFifo) > 0:
+                timestampMs, voltages, switchStatus = self.sampleFifo.popleft()
+                args = [struct.pack('<L', timestampMs)]
+                args += [struct.pack('<f', voltage) for voltage in voltages]
+                args += [struct.pack('<h', status) for status in switchStatus]
+                self.sendCmd('fifoSample', args)
+                noSamples = noSamples + 1
+            self.sendCmd('sampleBlock', [struct.pack('<h', noSamples), struct.pack('<h', len(self.sampleFifo)),
+                                         struct.pack('<L', self.noFifoOverflows)])
+        else:
+            self.sendCmd('error', [b'to PC: Unknown command'])
+
+    def takeSample(self):
+        # the measurements task of the Arduino: buffer every sample and stream it if on
+        timestampMs = int(1000.0*(time.monotonic() - self.startTime)) & 0xffffffff
+        voltages = self.currentVoltages()
+        if len(self.sampleFifo) == self.sampleFifo.maxlen:
+            self.noFifoOverflows = self.noFifoOverflows + 1
+        self.sampleFifo.append((timestampMs, voltages, list(self.switchStatus)))
+        # like g_sampleCounter the sequence of the binary frames counts every sample taken
+        self.sampleSequence = self.sampleSequence + 1
+        if self.streamingOn:
+            self.sendStreamedSample(timestampMs, voltages)
+
+    def sendStreamedSample(self, timestampMs, voltages):
+        if self.throttleBaud and self.outgoingBytes > self.txBufferSize:
+            # the link is too slow for the sample rate, the sample is lost
+            self.noDroppedSamples = self.noDroppedSamples + 1
+            return
+        self.noSamples = self.noSamples + 1
+        if self.binaryFrames:
+            codes = [max(-32768, min(32767, int(round(voltage / self.fullScaleVolt * 32768.0))))
+                     for voltage in voltages]
+            switchMask = sum(1 << k for k, status in enumerate(self.switchStatus) if status == 1)
+            self.sendBytes(encodeSampleFrame(self.sampleSequence, timestampMs, codes, switchMask))
+            return
+        args = [struct.pack('<L', timestampMs)]
+        args += [struct.pack('<f', voltage) for voltage in voltages]
+        args += [struct.pack('<h', status) for status in self.switchStatus]
+        self.sendCmd('streamedSample', args)
+
+    def sendAdcConfig(self):
+        self.sendCmd('adcConfigValues', [struct.pack('<h', 1 if self.adcContinuous else 0),
+                                         struct.pack('<h', self.adcDataRate),
+                                         struct.pack('<h', self.adcRange),
+                                         struct.pack('<L', self.noAdcOverflows)])
+
+    def sendCmd(self, name, args):
+        fields = [str(self.cmdId[name]).encode('ascii')]
+        fields += [escapeBinArg(arg) for arg in args]
+        self.sendBytes(FIELD_SEPARATOR.join(fields) + COMMAND_SEPARATOR)
+
+    def sendBytes(self, data):
+        if self.latencySec <= 0.0 and not self.throttleBaud:
+            os.write(self.master_fd, data)
+            return
+        # the frame arrives after the latency, behind the frames still on the link
+        dueTime = time.monotonic() + self.latencySec
+        if self.throttleBaud:
+            dueTime = max(dueTime, self.linkBusyUntil) + len(data) * 10.0 / self.baud
+            self.linkBusyUntil = dueTime
+        self.outgoing.append((dueTime, data))
+        self.outgoingBytes = self.outgoingBytes + len(data)
+
+    def writeOutgoing(self):
+        now = time.monotonic()
+        while len(self.outgoing) > 0 and self.outgoing[0][0] <= now:
+            dueTime, data = self.outgoing.popleft()
+            self.outgoingBytes = self.outgoingBytes - len(data)
+            os.write(self.master_fd, data)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Arduino simulator of the MySimple4ChannelDAS on a pseudo terminal")
+    parser.add_argument('--rate', type=float, default=10.0, help="streamed samples per second in single shot mode")
+    parser.add_argument('--waveform', nargs='+', default=[],
+                        help="waveform of the channels 1..4 (one for all or one per channel), "
+                             "e.g. sine:offset=2.5,amplitude=1,frequency=0.5,noise=0.01")
+    parser.add_argument('--switches', type=int, nargs=4, default=[1, 0, 1, 0], help="switch states of the channels 1..4")
+    parser.add_argument('--latency', type=float, default=0.0, help="latency of the frames sent to the PC / ms")
+    parser.add_argument('--throttle', action='store_true', help="limit the frames to the negotiated baud rate")
+    parser.add_argument('--continuous', action='store_true', help="start the ADS1115 in continuous mode")
+    parser.add_argument('--dataRate', type=int, default=128, choices=adcDataRates, help="data rate of the ADS1115 / SPS")
+    parser.add_argument('--range', type=int, default=6144, choices=adcRanges, help="range of the ADS1115 / mV")
+    args = parser.parse_args(argv)
+
+    waveforms = [Waveform.fromString(spec) for spec in args.waveform]
+    if len(waveforms) == 1:
+        waveforms = waveforms * 4
+    simulator = ArduinoSimulator(samplePeriodSec=1.0/args.rate, waveforms=waveforms + [None] * (4 - len(waveforms)),
+                                 switchStatus=args.switches, latencySec=args.latency/1000.0, throttleBaud=args.throttle)
+    simulator.setAdcConfig(args.continuous, args.dataRate, args.range)
+    simulator.start()
+    print('Arduino simulator listening on', simulator.port_name)
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        print(simulator.getStatistics())
+        simulator.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,374 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+Project MySimple4ChannelDAS
+
+asyncio transport for the CmdMessenger commands of the Arduino
+(suited for Linux and Max OSX)
+
+Counterpart of MsgInterface without blocking reads: the serial port is opened
+non-blocking and read by the event loop (loop.add_reader), every command returns a
+future which is resolved by its response frame. Up to maxInFlight commands are sent
+without waiting for the responses before them, the firmware answers in order, so a
+response belongs to the oldest outstanding command waiting for a frame of its name.
+Outstanding commands skipped by a later response have lost their response and fail.
+
+    msgIF = AsyncMsgInterface(portName)
+    await msgIF.open()
+    voltages = await asyncio.gather(*[msgIF.GetMeasuredVoltage(k) for k in range(1, 5)])
+
+For the Qt GUI the event loop runs in its own thread, QtAsyncioBridge hands the
+results back to the GUI thread by a queued signal:
+
+    bridge = QtAsyncioBridge()
+    bridge.start()
+    bridge.submit(msgIF.GetAllChannels(), guiSlot)
+
+Started as script, the transport is checked against the ArduinoSimulator on a pty pair:
+  python3 ./AsyncMsgInterface.py
+
+"""
+from __future__ import print_function
+import sys
+import argparse
+import asyncio
+import threading
+import time
+from collections import deque
+import serial
+import PyCmdMessenger
+from PyQt5.QtCore import QObject, QCoreApplication, QTimer, pyqtSignal, pyqtSlot
+from MeasurementsThread import cmdMessengerCommands, CommandLatencyStatistics, StreamedSample, defaultBaudRate
+
+FIELD_SEPARATOR = b','
+COMMAND_SEPARATOR = b';'
+ESCAPE_SEPARATOR = b'/'
+
+class CommandError(Exception):
+    """ The Arduino answered a command with an error or its response was lost
+    """
+    pass
+
+def splitFrames(received):
+    """ Split the received bytes at the command separators which are not escaped.
+        Returns the complete frames with their separator and the rest.
+    """
+    frames = []
+    start = 0
+    position = received.find(COMMAND_SEPARATOR)
+    while position >= 0:
+        # the separator is escaped by an odd number of escape characters in front of it
+        noEscapes = 0
+        while position - noEscapes - 1 >= start and received[position - noEscapes - 1] == ESCAPE_SEPARATOR[0]:
+            noEscapes = noEscapes + 1
+        if noEscapes % 2 == 0:
+            frames.append(bytes(received[start:position + 1]))
+            start = position + 1
+        position = received.find(COMMAND_SEPARATOR, position + 1)
+    return frames, received[start:]
+
+class FrameBoard(PyCmdMessenger.ArduinoBoard):
+    """ ArduinoBoard on a non-blocking serial port, CmdMessenger decodes one complete
+        frame at a time from the frame handed over by the event loop
+    """
+    def __init__(self, *args, **kwargs):
+        self.frame = b''
+        self.framePosition = 0
+        self.bytesReceived = 0
+        self.bytesSent = 0
+        PyCmdMessenger.ArduinoBoard.__init__(self, *args, **kwargs)
+
+    def open(self):
+        # no settle time here, AsyncMsgInterface.open waits without blocking the loop
+        if not self._is_connected:
+            self.comm = serial.Serial(self.device, self.baud_rate, timeout=0)
+            self._is_connected = True
+
+    def read(self):
+        byte = self.frame[self.framePosition:self.framePosition + 1]
+        self.framePosition = self.framePosition + len(byte)
+        return byte
+
+    def write(self, msg):
+        self.comm.write(msg)
+        self.bytesSent = self.bytesSent + len(msg)
+
+    def setFrame(self, frame):
+        self.frame = frame
+        self.framePosition = 0
+
+class PendingCommand(object):
+    def __init__(self, command, responseName, future):
+        self.command = command
+        self.responseName = responseName
+        self.future = future
+        self.sendTime = time.perf_counter()
+
+class AsyncMsgInterface(object):
+    def __init__(self, portName='/dev/ttyUSB0', responseTimeout=1.0, baud=defaultBaudRate, maxInFlight=8, settleSec=2.0):
+        self.port_name = portName
+        self.baud = baud
+        # maximum time to wait for the response to a command in seconds
+        self.responseTimeout = responseTimeout
+        self.maxInFlight = maxInFlight
+        self.settleSec = settleSec
+        self.latencyStatistics = {}
+        self.streaming = False
+        self.streamedSamples = deque()
+        self.pendingCommands = deque()
+        self.received = b''
+        self.loop = None
+        self.window = None
+        self.arduino = None
+        self.messenger = None
+
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        self.window = asyncio.Semaphore(self.maxInFlight)
+        try:
+            self.arduino = FrameBoard(self.port_name, baud_rate=self.baud, timeout=0)
+        except serial.SerialException:
+            raise SystemExit('Could not open serial port.')
+        print('Serial port', self.port_name, ' sucessfully opened.\n')
+        self.messenger = PyCmdMessenger.CmdMessenger(self.arduino, cmdMessengerCommands)
+        # the Arduino may reset when the port is opened
+        await asyncio.sleep(self.settleSec)
+        self.arduino.comm.reset_input_buffer()
+        self.loop.add_reader(self.arduino.comm.fileno(), self.readFrames)
+
+    def close(self):
+        if self.arduino is None:
+            return
+        self.loop.remove_reader(self.arduino.comm.fileno())
+        for pending in self.pendingCommands:
+            if not pending.future.done():
+                pending.future.cancel()
+        self.pendingCommands.clear()
+        self.arduino.comm.close()
+        self.arduino = None
+
+    def readFrames(self):
+        data = self.arduino.comm.read(self.arduino.comm.in_waiting or 1)
+        self.arduino.bytesReceived = self.arduino.bytesReceived + len(data)
+        frames, self.received = splitFrames(self.received + data)
+        for frame in frames:
+            self.arduino.setFrame(frame)
+            try:
+                ReceiveMsg = self.messenger.receive()
+            except (EOFError, ValueError) as error:
+                print("dropped invalid frame: ", error)
+                continue
+            if ReceiveMsg is not None:
+                self.dispatchFrame(ReceiveMsg)
+
+    def dispatchFrame(self, ReceiveMsg):
+        name = ReceiveMsg[0]
+        if name == 'streamedSample':
+            values = ReceiveMsg[1]
+            self.streamedSamples.append(StreamedSample(values[0]/1000.0, values[1:5], values[5:9]))
+            return
+        if name == 'error':
+            # the Arduino did not understand the oldest outstanding command
+            if len(self.pendingCommands) > 0:
+                self.failCommand(self.pendingCommands.popleft(), CommandError(str(ReceiveMsg[1])))
+            return
+        for k, pending in enumerate(self.pendingCommands):
+            if pending.responseName == name:
+                # the responses of the commands before it got lost on the way
+                for k in range(k):
+                    self.failCommand(self.pendingCommands.popleft(), CommandError("response lost"))
+                self.pendingCommands.popleft()
+                self.getLatencyStatistics(pending.command).addLatency(time.perf_counter() - pending.sendTime)
+                if not pending.future.done():
+                    pending.future.set_result(ReceiveMsg)
+                return
+        print("dropped unexpected response: ", ReceiveMsg)
+
+    def failCommand(self, pending, error):
+        self.getLatencyStatistics(pending.command).addTimeout()
+        if not pending.future.done():
+            pending.future.set_exception(error)
+
+    async def SendAndReceive(self, command, responseName, *args, **kwargs):
+        """ Send a command and wait for its response frame, up to maxInFlight commands wait at the same time.
+            Raises asyncio.TimeoutError after the response timeout.
+        """
+        async with self.window:
+            pending = PendingCommand(command, responseName, self.loop.create_future())
+            self.pendingCommands.append(pending)
+            self.messenger.send(command, *args, **kwargs)
+            try:
+                return await asyncio.wait_for(pending.future, self.responseTimeout)
+            except asyncio.TimeoutError:
+                if pending in self.pendingCommands:
+                    self.pendingCommands.remove(pending)
+                    self.getLatencyStatistics(command).addTimeout()
+                raise
+
+    async def GetMeasuredVoltage(self, channelIndex):
+        ReceiveMsg = await self.SendAndReceive('sendMeasuredVoltage{}'.format(channelIndex), 'floatValue')
+        return ReceiveMsg[1][0]
+
+    async def GetSwitchStatus(self, channelIndex):
+        ReceiveMsg = await self.SendAndReceive('sendSwitchStatus{}'.format(channelIndex), 'int16Value')
+        return ReceiveMsg[1][0]
+
+    async def GetAllChannels(self):
+        # returns ([voltage1..voltage4], [switch1..switch4])
+        ReceiveMsg = await self.SendAndReceive('sendAllChannels', 'allChannelsValues')
+        return ReceiveMsg[1][0:4], ReceiveMsg[1][4:8]
+
+    async def TurnOnMeasurements(self, streaming=False):
+        if streaming:
+            # the Arduino pushes every new sample as streamedSample frame
+            ReceiveMsg = await self.SendAndReceive('turnOnMeasurements', 'sendAcknowledge', 1, arg_formats='i')
+            self.streaming = True
+        else:
+            ReceiveMsg = await self.SendAndReceive('turnOnMeasurements', 'sendAcknowledge')
+        print("turn on the measurements: ", ReceiveMsg)
+
+    async def TurnOffMeasurements(self):
+        ReceiveMsg = await self.SendAndReceive('turnOffMeasurements', 'sendAcknowledge')
+        self.streaming = False
+        print("turn off the measurements: ", ReceiveMsg)
+
+    async def ResetMeasurements(self):
+        ReceiveMsg = await self.SendAndReceive('resetMeasurements', 'sendAcknowledge')
+        print("reset the measurements: ", ReceiveMsg)
+
+    def StreamedSamples(self):
+        """ Generator over the streamed samples received so far, never waits for new samples
+        """
+        while len(self.streamedSamples) > 0:
+            yield self.streamedSamples.popleft()
+
+    def getLatencyStatistics(self, command):
+        if command not in self.latencyStatistics:
+            self.latencyStatistics[command] = CommandLatencyStatistics()
+        return self.latencyStatistics[command]
+
+    def printLatencyStatistics(self):
+        for command in sorted(self.latencyStatistics):
+            print(command, ": ", self.latencyStatistics[command])
+
+class QtAsyncioBridge(QObject):
+    """ Runs an asyncio event loop in its own thread next to the Qt event loop.
+        Coroutines are submitted from the Qt side, their results are delivered to the
+        callback in the thread of the bridge (the GUI thread) by a queued signal.
+    """
+    resultReady = pyqtSignal(object, object)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.runLoop)
+        self.thread.daemon = True
+        self.resultReady.connect(self.deliverResult)
+
+    def runLoop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def submit(self, coroutine, callback=None):
+        """ Run the coroutine in the asyncio thread, returns a concurrent.futures.Future
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        if callback is not None:
+            future.add_done_callback(lambda future: self.resultReady.emit(callback, future))
+        return future
+
+    @pyqtSlot(object, object)
+    def deliverResult(self, callback, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print("asyncio command failed: ", repr(future.exception()))
+            return
+        callback(future.result())
+
+async def checkTransport(msgIF, expectedVoltages, expectedSwitchStates, noRequests):
+    failures = 0
+    await msgIF.open()
+
+    startTime = time.perf_counter()
+    for k in range(noRequests):
+        await msgIF.GetMeasuredVoltage(k % 4 + 1)
+    sequentialSec = time.perf_counter() - startTime
+
+    # all requests outstanding at once, limited by the in-flight window
+    startTime = time.perf_counter()
+    voltages = await asyncio.gather(*[msgIF.GetMeasuredVoltage(k % 4 + 1) for k in range(noRequests)])
+    pipelinedSec = time.perf_counter() - startTime
+    print("{} requests: sequential {:.1f} requests/s, pipelined {:.1f} requests/s".format(
+        noRequests, noRequests / sequentialSec, noRequests / pipelinedSec))
+    if any(abs(voltage - expectedVoltages[k % 4]) > 1e-6 for k, voltage in enumerate(voltages)):
+        print("FAILED: pipelined voltages do not match their requests")
+        failures = failures + 1
+
+    # mixed commands, every response has to reach its own request
+    switch1, voltage2, (voltages, switchStates), switch2, reset = await asyncio.gather(
+        msgIF.GetSwitchStatus(1), msgIF.GetMeasuredVoltage(2), msgIF.GetAllChannels(),
+        msgIF.GetSwitchStatus(2), msgIF.ResetMeasurements())
+    if switch1 != expectedSwitchStates[0] or switch2 != expectedSwitchStates[1] or \
+            abs(voltage2 - expectedVoltages[1]) > 1e-6 or switchStates != list(expectedSwitchStates):
+        print("FAILED: mixed responses do not match their requests")
+        failures = failures + 1
+
+    await msgIF.TurnOnMeasurements(streaming=True)
+    # requests are answered in between the streamed samples
+    await asyncio.gather(*[msgIF.GetAllChannels() for k in range(20)])
+    await asyncio.sleep(0.5)
+    await msgIF.TurnOffMeasurements()
+    noStreamed = len(list(msgIF.StreamedSamples()))
+    print("streamed samples received: ", noStreamed)
+    if noStreamed == 0:
+        print("FAILED: no streamed samples")
+        failures = failures + 1
+    msgIF.close()
+    return failures
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Check the asyncio transport against the Arduino simulator")
+    parser.add_argument('--requests', type=int, default=400, help="number of requests per check")
+    parser.add_argument('--window', type=int, default=8, help="maximum number of outstanding commands")
+    args = parser.parse_args(argv)
+
+    from ArduinoSimulator import ArduinoSimulator
+    simulator = ArduinoSimulator()
+    simulator.samplePeriodSec = 0.01
+    simulator.start()
+    msgIF = AsyncMsgInterface(simulator.port_name, maxInFlight=args.window, settleSec=0.1)
+    failures = asyncio.run(checkTransport(msgIF, simulator.measuredVoltages, simulator.switchStatus, args.requests))
+
+    # the same interface used from the Qt event loop
+    application = QCoreApplication(sys.argv[:1])
+    bridge = QtAsyncioBridge()
+    bridge.start()
+    results = []
+    bridge.submit(msgIF.open()).result()
+    bridge.submit(msgIF.GetAllChannels(), lambda result: results.append((threading.current_thread().name, result)))
+    QTimer.singleShot(1000, application.quit)
+    application.exec_()
+    bridge.loop.call_soon_threadsafe(msgIF.close)
+    bridge.stop()
+    if len(results) != 1 or results[0][0] != threading.current_thread().name:
+        print("FAILED: result not delivered to the Qt thread: ", results)
+        failures = failures + 1
+    else:
+        print("Qt thread received: ", results[0][1])
+
+    msgIF.printLatencyStatistics()
+    simulator.stop()
+    print("asyncio transport check:", "passed" if failures == 0 else "{} checks FAILED".format(failures))
+    return 0 if failures == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
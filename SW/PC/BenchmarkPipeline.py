@@ -0,0 +1,252 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+Project MySimple4ChannelDAS
+
+End-to-end benchmark of the acquisition pipeline against the Arduino simulator
+(suited for Linux and Max OSX)
+
+The simulator runs in its own process on a pseudo terminal, the 4-channel GUI runs
+on the offscreen Qt platform and is driven exactly as with the hardware. The stages
+of the pipeline are timed by wrapping their entry points:
+
+    serial      reading the samples from the port in the measurements worker
+                (MsgInterface.StreamedSamples without the decoding)
+    decode      turning the received bytes into samples (CmdMessenger frames are
+                read byte by byte while they are decoded, so for them decode holds
+                most of the serial I/O as well, binary frames separate both)
+    buffer      handling a batch in the GUI thread: scaling, ring buffers, recording
+    render      drawing one frame of the four plots
+
+Reported are the samples/s arriving in the GUI, the latency percentiles of every
+stage, the CPU time and the memory of the GUI process. The samples/s are counted over
+the timestamps of the samples, so the samples taken before the measured duration
+but handed to the GUI within it do not count. While streaming, the FIFO of the
+simulator is not read and overflows without losing samples, its overflows are
+reported apart from the lost samples. The result is written as JSON
+and can be compared with the result of another commit.
+
+Usage:
+  QT_QPA_PLATFORM=offscreen python3 ./BenchmarkPipeline.py --rate 200 --duration 10 --json result.json
+  QT_QPA_PLATFORM=offscreen python3 ./BenchmarkPipeline.py --rate 200 --binary --compare result.json
+
+"""
+from __future__ import print_function
+import sys
+import argparse
+import ast
+import json
+import os
+import resource
+import signal
+import subprocess
+import time
+import numpy as np
+
+class StageTimer(object):
+    """ Durations of the calls of one stage of the pipeline
+    """
+    def __init__(self, name):
+        self.name = name
+        self.durations = []
+        # time spent in nested stages during the current call, subtracted from it
+        self.nestedSec = 0.0
+
+    def wrap(self, function, excluded=None):
+        def timedFunction(*args, **kwargs):
+            if excluded is not None:
+                excluded.nestedSec = 0.0
+            startTime = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                durationSec = time.perf_counter() - startTime
+                if excluded is not None:
+                    durationSec = durationSec - excluded.nestedSec
+                self.durations.append(durationSec)
+                self.nestedSec = self.nestedSec + durationSec
+        return timedFunction
+
+    def asDict(self):
+        if len(self.durations) == 0:
+            return {'count': 0}
+        durations = 1000.0 * np.array(self.durations)
+        return {'count': len(durations),
+                'meanMs': float(np.mean(durations)),
+                'p50Ms': float(np.percentile(durations, 50)),
+                'p90Ms': float(np.percentile(durations, 90)),
+                'p99Ms': float(np.percentile(durations, 99)),
+                'maxMs': float(np.max(durations)),
+                'totalSec': float(np.sum(durations)) / 1000.0}
+
+def startSimulator(args):
+    command = [sys.executable, '-u', 'ArduinoSimulator.py', '--rate', str(args.rate), '--latency', str(args.latency)]
+    command += ['--waveform', 'sine:offset=2.5,amplitude=1,frequency=0.5,noise=0.01']
+    if args.throttle:
+        command.append('--throttle')
+    simulator = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+    line = simulator.stdout.readline()
+    if 'listening on' not in line:
+        raise SystemExit('simulator did not start: ' + line)
+    return simulator, line.split()[-1]
+
+def stopSimulator(simulator):
+    # the simulator prints its statistics when it is interrupted
+    simulator.send_signal(signal.SIGINT)
+    output = simulator.communicate()[0].strip().splitlines()
+    try:
+        return ast.literal_eval(output[-1])
+    except (IndexError, ValueError, SyntaxError):
+        return {}
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def runBenchmark(args):
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QTimer
+    import Eval4ChanVoltageMeasFromArduino
+
+    simulator, portName = startSimulator(args)
+    application = QApplication(sys.argv[:1])
+    # the per sample diagnostics of the GUI go to /dev/null, the terminal would dominate the timing
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    # nothing is recorded, the benchmark leaves no files behind
+    window = Eval4ChanVoltageMeasFromArduino.MainWindow(portName=portName, binaryFrames=args.binary,
+                                                        overrides={('recording', 'enabled'): False})
+    window.show()
+
+    stages = dict((name, StageTimer(name)) for name in ('serial', 'decode', 'buffer', 'render'))
+    msgIF = window.msgIF
+    msgIF.messenger.receive = stages['decode'].wrap(msgIF.messenger.receive)
+    msgIF.frameDecoder.decode = stages['decode'].wrap(msgIF.frameDecoder.decode)
+    streamedSamples = msgIF.StreamedSamples
+    msgIF.StreamedSamples = stages['serial'].wrap(lambda: iter(list(streamedSamples())), excluded=stages['decode'])
+    window.measurementsWorker.samplesReady.disconnect(window.handleMeasurements)
+    window.measurementsWorker.samplesReady.connect(stages['buffer'].wrap(window.handleMeasurements))
+    window.plotRefresher.renderHandler = stages['render'].wrap(window.plotRefresher.renderHandler)
+
+    noSamples = []
+    timestamps = []
+    def countSamples(samples):
+        noSamples.append(len(samples))
+        timestamps.extend(sample.timestamp for sample in samples)
+    window.measurementsWorker.samplesReady.connect(countSamples)
+    measuringStart = {}
+    def startMeasuring():
+        # the first second is not measured, the baud rate negotiation and the first frames are done by then
+        for timer in stages.values():
+            timer.durations = []
+        del noSamples[:]
+        del timestamps[:]
+        measuringStart['time'] = time.perf_counter()
+        measuringStart['usage'] = resource.getrusage(resource.RUSAGE_SELF)
+    QTimer.singleShot(1000, startMeasuring)
+    QTimer.singleShot(int(1000*(1.0 + args.duration)), application.quit)
+    application.exec_()
+
+    elapsedSec = time.perf_counter() - measuringStart['time']
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpuSec = (usage.ru_utime - measuringStart['usage'].ru_utime) + (usage.ru_stime - measuringStart['usage'].ru_stime)
+    window.close()
+    sys.stdout.close()
+    sys.stdout = stdout
+    simulatorStatistics = stopSimulator(simulator)
+    # the samples/s from the first sample received after the start, on the clock of the
+    # samples, the first batch also holds samples taken before the start
+    if len(timestamps) > 1 and max(timestamps) > min(timestamps):
+        samplesPerSec = (len(timestamps) - 1) / (max(timestamps) - min(timestamps))
+    else:
+        samplesPerSec = 0.0
+    # streamed samples are lost when the link is too slow, read from the FIFO when it overflows
+    streaming = window.streamingMode
+    fifoOverflows = simulatorStatistics.pop('fifoOverflows', 0)
+    lostSamples = simulatorStatistics.get('droppedSamples', 0) if streaming else fifoOverflows
+
+    # ru_maxrss is in kB on Linux and in bytes on Max OSX
+    maxRssMB = usage.ru_maxrss / (1024.0*1024.0 if sys.platform == 'darwin' else 1024.0)
+    return {'label': args.label,
+            'commit': gitCommit(),
+            'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'config': {'rateHz': args.rate, 'durationSec': args.duration, 'binaryFrames': args.binary,
+                       'latencyMs': args.latency, 'throttle': args.throttle, 'streaming': streaming},
+            'samples': int(sum(noSamples)),
+            'samplesPerSec': samplesPerSec,
+            'lostSamples': lostSamples,
+            'fifoOverflows': fifoOverflows,
+            'batches': len(noSamples),
+            'frames': len(stages['render'].durations),
+            'stages': dict((name, timer.asDict()) for name, timer in stages.items()),
+            'cpu': {'cpuSec': cpuSec, 'cpuPercent': 100.0 * cpuSec / elapsedSec},
+            'memory': {'maxRssMB': maxRssMB},
+            'pipeline': msgIF.GetPipelineStatistics(),
+            'frameStatistics': msgIF.GetFrameStatistics(),
+            'simulator': simulatorStatistics}
+
+def printResult(result, reference=None):
+    def compare(value, referenceValue):
+        if referenceValue is None or referenceValue == 0:
+            return ""
+        return "  ({:+.1f} %)".format(100.0 * (value - referenceValue) / referenceValue)
+
+    print("benchmark {} at {} ({})".format(result['label'], result['commit'], result['time']))
+    print("config:      ", result['config'])
+    print("samples/s:    {:.1f}{}".format(result['samplesPerSec'],
+                                          compare(result['samplesPerSec'], reference and reference['samplesPerSec'])))
+    print("samples:      {} in {} batches, {} frames drawn".format(result['samples'], result['batches'], result['frames']))
+    if result['config'].get('streaming'):
+        print("lost:         {} streamed samples, {} FIFO overflows (not read while streaming)".format(
+            result['lostSamples'], result['fifoOverflows']))
+    else:
+        print("lost:         {} samples overwritten in the FIFO".format(result['lostSamples']))
+    print("{:>8} {:>8} {:>10} {:>10} {:>10} {:>10}".format('stage', 'count', 'p50/ms', 'p90/ms', 'p99/ms', 'max/ms'))
+    for name in ('serial', 'decode', 'buffer', 'render'):
+        stage = result['stages'][name]
+        if stage['count'] == 0:
+            print("{:>8} {:>8}".format(name, 0))
+            continue
+        referenceStage = reference['stages'].get(name, {}) if reference else {}
+        print("{:>8} {:>8} {:10.3f} {:10.3f} {:10.3f} {:10.3f}{}".format(
+            name, stage['count'], stage['p50Ms'], stage['p90Ms'], stage['p99Ms'], stage['maxMs'],
+            compare(stage['p99Ms'], referenceStage.get('p99Ms'))))
+    print("cpu:          {:.1f} %{}".format(result['cpu']['cpuPercent'],
+                                            compare(result['cpu']['cpuPercent'], reference and reference['cpu']['cpuPercent'])))
+    print("memory:       {:.1f} MB max. RSS".format(result['memory']['maxRssMB']))
+    print("simulator:   ", result['simulator'])
+    print("pipeline:    ", result['pipeline'])
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark of the acquisition pipeline of the MySimple4ChannelDAS")
+    parser.add_argument('--rate', type=float, default=100.0, help="samples per second of the simulator")
+    parser.add_argument('--duration', type=float, default=10.0, help="measured duration / s")
+    parser.add_argument('--binary', action='store_true', help="stream binary sample frames")
+    parser.add_argument('--latency', type=float, default=0.0, help="link latency of the simulator / ms")
+    parser.add_argument('--throttle', action='store_true', help="limit the simulator to the negotiated baud rate")
+    parser.add_argument('--label', default='', help="label stored with the result")
+    parser.add_argument('--json', help="write the result to this JSON file")
+    parser.add_argument('--compare', help="JSON result of an earlier run to compare with")
+    args = parser.parse_args(argv)
+    jsonFileName = os.path.abspath(args.json) if args.json else None
+    compareFileName = os.path.abspath(args.compare) if args.compare else None
+
+    # the GUI loads its style sheets relative to its directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    result = runBenchmark(args)
+    reference = None
+    if compareFileName:
+        with open(compareFileName) as f:
+            reference = json.load(f)
+    printResult(result, reference)
+    if jsonFileName:
+        with open(jsonFileName, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+Project MySimple4ChannelDAS
+
+Per-channel calibration of the measured voltages, applied to whole sample blocks
+(suited for Max OSX, Windows, Linux)
+
+The voltage at the input of a channel is computed from the voltage measured by the
+ADS1115 in three steps, each one NumPy operation over the block (channels x samples):
+
+    polynomial  correction of the non-linearity, c0 + c1*u + c2*u^2 + ...
+                (identity c0 = 0, c1 = 1 if none is given)
+    gain/offset u * gain + offset
+    divider     multiplied with the divider ratio of the channel if its switch is
+                open (switch state 0, e.g. 1:10), a closed switch (1) is 1:1
+
+The calibration is read from an INI file with one section per channel:
+
+    [channel1]
+    gain = 1.002
+    offset = -0.0015
+    divider = 10.0
+    polynomial = 0.0, 1.0, 0.0003
+
+Missing sections and keys keep their defaults (gain 1, offset 0, divider 10, no
+polynomial). Started as script it prints the calibration of a file.
+
+Usage:
+  python3 ./Calibration.py Calibration.cal
+
+"""
+from __future__ import print_function
+import sys
+import argparse
+import configparser
+import numpy as np
+
+class Calibration(object):
+    def __init__(self, noChannels=4, gains=None, offsets=None, dividerRatios=None, polynomials=None):
+        self.noChannels = noChannels
+        self.gains = np.ones(noChannels) if gains is None else np.asarray(gains, dtype=np.float64)
+        self.offsets = np.zeros(noChannels) if offsets is None else np.asarray(offsets, dtype=np.float64)
+        self.dividerRatios = np.full(noChannels, 10.0) if dividerRatios is None else np.asarray(dividerRatios, dtype=np.float64)
+        self.setPolynomials(polynomials)
+
+    def setPolynomials(self, polynomials):
+        """ polynomials: per channel the coefficients c0, c1, ... or None for no correction
+        """
+        if polynomials is None:
+            polynomials = [None] * self.noChannels
+        polynomials = [[0.0, 1.0] if p is None or len(p) == 0 else list(p) for p in polynomials]
+        # one coefficient matrix (channels x degree + 1), the shorter polynomials padded with zeros
+        degree = max(len(p) for p in polynomials) - 1
+        self.coefficients = np.zeros((self.noChannels, degree + 1))
+        for k, p in enumerate(polynomials):
+            self.coefficients[k, :len(p)] = p
+        self.identityPolynomial = degree == 1 and np.all(self.coefficients[:, 0] == 0.0) and \
+            np.all(self.coefficients[:, 1] == 1.0)
+
+    @classmethod
+    def fromFile(cls, fileName, noChannels=4):
+        parser = configparser.ConfigParser()
+        if not parser.read(fileName):
+            raise IOError("calibration file " + fileName + " not found")
+        calibration = cls(noChannels)
+        polynomials = [None] * noChannels
+        for k in range(noChannels):
+            section = 'channel' + str(k + 1)
+            if not parser.has_section(section):
+                continue
+            calibration.gains[k] = parser.getfloat(section, 'gain', fallback=1.0)
+            calibration.offsets[k] = parser.getfloat(section, 'offset', fallback=0.0)
+            calibration.dividerRatios[k] = parser.getfloat(section, 'divider', fallback=10.0)
+            polynomial = parser.get(section, 'polynomial', fallback='').strip()
+            if polynomial:
+                polynomials[k] = [float(c) for c in polynomial.split(',')]
+        calibration.setPolynomials(polynomials)
+        return calibration
+
+    def save(self, fileName):
+        parser = configparser.ConfigParser()
+        for k in range(self.noChannels):
+            parser['channel' + str(k + 1)] = {
+                'gain': repr(float(self.gains[k])),
+                'offset': repr(float(self.offsets[k])),
+                'divider': repr(float(self.dividerRatios[k])),
+                'polynomial': ", ".join(repr(float(c)) for c in self.coefficients[k])}
+        with open(fileName, 'w') as f:
+            parser.write(f)
+
+    def scaleFactors(self, switchStates):
+        """ Divider ratio of every sample, switchStates as the voltages (channels x samples)
+        """
+        return np.where(np.asarray(switchStates) == 1, 1.0, self.dividerRatios[:, None])
+
+    def dividerTexts(self, switchStates):
+        """ '1:1' / '1:10' of the switch states of one sample
+        """
+        return ["1:{:g}".format(ratio) for ratio in self.scaleFactors(np.reshape(switchStates, (-1, 1)))[:, 0]]
+
+    def apply(self, voltages, switchStates):
+        """ Input voltages of the block, voltages and switchStates with one row per channel
+        """
+        voltages = np.asarray(voltages, dtype=np.float64)
+        if not self.identityPolynomial:
+            # Horner's scheme, one multiply-add over the block per coefficient
+            corrected = np.repeat(self.coefficients[:, -1:], voltages.shape[1], axis=1)
+            for k in range(self.coefficients.shape[1] - 2, -1, -1):
+                corrected = corrected * voltages + self.coefficients[:, k:k + 1]
+            voltages = corrected
+        return (voltages * self.gains[:, None] + self.offsets[:, None]) * self.scaleFactors(switchStates)
+
+    def __str__(self):
+        lines = []
+        for k in range(self.noChannels):
+            lines.append("channel{}: gain = {:g}, offset = {:g} V, divider = 1:{:g}, polynomial = {}".format(
+                k + 1, self.gains[k], self.offsets[k], self.dividerRatios[k], [float(c) for c in self.coefficients[k]]))
+        return "\n".join(lines)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Calibration of the channels of the MySimple4ChannelDAS")
+    parser.add_argument('fileName', help="calibration file (INI, one section per channel)")
+    args = parser.parse_args(argv)
+    print(Calibration.fromFile(args.fileName))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
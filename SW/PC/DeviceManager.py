@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+Project MySimple4ChannelDAS
+
+Acquisition from several Arduino/ADS1115 boards in one process
+(suited for Max OSX, Windows, Linux)
+
+The DeviceManager discovers the serial ports with MsgInterface.list_usb_ports (or takes
+the given port names) and opens one MsgInterface per board. Every board is read by its
+own MeasurementsWorker in its own thread, so a slow or stalled board never delays the
+others. The batches of all boards are merged onto the common timebase of the PC
+monotonic clock:
+
+    clock offset    every board counts its own time since its start, the offset to the
+                    PC clock is the minimum of (receive time - sample timestamp) over the
+                    last offsetWindowSec, the minimum is the sample with the least transfer
+                    delay and the window follows the drift of the board clock
+    merge           the samples are handed over in timestamp order up to the newest time
+                    all active boards have reported, a board which has not reported for
+                    maxDelaySec is not waited for
+
+Usage:
+  python3 ./DeviceManager.py                        all ports found by list_usb_ports
+  python3 ./DeviceManager.py --ports /dev/ttyUSB0 /dev/ttyUSB1 --record
+
+"""
+from __future__ import print_function
+import sys
+import argparse
+import heapq
+import signal
+import time
+from collections import deque, namedtuple
+from PyQt5.QtCore import QObject, QTimer, QCoreApplication, pyqtSignal, pyqtSlot
+from MeasurementsThread import MsgInterface, MeasurementsWorker, defaultBaudRate
+import UseDASCommon
+from DASCommon.Recorder import Recorder
+
+# sample of one board, timestamp in seconds of the PC monotonic clock
+DeviceSample = namedtuple('DeviceSample', ['timestamp', 'device', 'voltages', 'switchStates'])
+
+class ClockOffsetEstimator(object):
+    """ Offset from the clock of a board to the PC monotonic clock, the minimum of the
+        offset candidates of the last windowSec kept in a monotonic queue
+    """
+    def __init__(self, windowSec=30.0):
+        self.windowSec = windowSec
+        self.candidates = deque()
+
+    def addCandidate(self, receiveTime, deviceTimestamp):
+        candidate = receiveTime - deviceTimestamp
+        while len(self.candidates) > 0 and self.candidates[-1][1] >= candidate:
+            self.candidates.pop()
+        self.candidates.append((receiveTime, candidate))
+        while self.candidates[0][0] < receiveTime - self.windowSec:
+            self.candidates.popleft()
+
+    def offset(self):
+        if len(self.candidates) == 0:
+            return 0.0
+        return self.candidates[0][1]
+
+class Device(object):
+    """ One board: its MsgInterface, the worker reading it and the samples waiting for the merge
+    """
+    def __init__(self, index, portName, msgIF, worker, offsetWindowSec):
+        self.index = index
+        self.portName = portName
+        self.msgIF = msgIF
+        self.worker = worker
+        self.clock = ClockOffsetEstimator(offsetWindowSec)
+        self.pending = deque()
+        self.lastTimestamp = None
+        self.lastReceiveTime = None
+        self.noSamples = 0
+
+class DeviceManager(QObject):
+    """ Several boards behind the interface of MeasurementsWorker, samplesReady hands over
+        the merged samples of all boards as list of DeviceSample in timestamp order.
+
+        manager = DeviceManager(periodSec=0.5, streaming=True)
+        manager.samplesReady.connect(guiSlot)
+        manager.startInThread()
+    """
+    # list of DeviceSample
+    samplesReady = pyqtSignal(object)
+    # commands to the workers, delivered in the worker threads
+    measurementsOnRequested = pyqtSignal(bool)
+    resetRequested = pyqtSignal()
+
+    def __init__(self, periodSec, portNames=None, streaming=False, binaryFrames=False, maxBaud=115200,
+                 maxDelaySec=None, offsetWindowSec=30.0, portPattern='ttyUSB'):
+        QObject.__init__(self)
+        # a board is waited for up to two acquisition periods
+        self.maxDelaySec = maxDelaySec if maxDelaySec is not None else max(1.0, 2*periodSec)
+        self.startTime = None
+        if portNames is None:
+            portNames = [port.device for port in MsgInterface.list_usb_ports(portPattern)]
+        self.devices = []
+        for portName in portNames:
+            try:
+                msgIF = MsgInterface(portName, maxBaud=maxBaud if maxBaud > defaultBaudRate else None)
+            except SystemExit:
+                # MsgInterface gives up on a port it cannot open, the other boards are still used
+                print("device on", portName, "not available")
+                continue
+            worker = MeasurementsWorker(msgIF, periodSec, streaming=streaming, binaryFrames=binaryFrames)
+            device = Device(len(self.devices), portName, msgIF, worker, offsetWindowSec)
+            worker.samplesReady.connect(lambda samples, device=device: self.mergeSamples(device, samples))
+            self.measurementsOnRequested.connect(worker.setMeasurementsOn)
+            self.resetRequested.connect(worker.resetMeasurements)
+            self.devices.append(device)
+        print("device manager: {} devices on {}".format(len(self.devices), [d.portName for d in self.devices]))
+
+        # hands over the samples of the other boards if one board stops to report
+        self.flushTimer = QTimer(self)
+        self.flushTimer.timeout.connect(self.releaseSamples)
+
+    def startInThread(self):
+        self.startTime = time.monotonic()
+        for device in self.devices:
+            device.worker.startInThread()
+        self.flushTimer.start(int(1000*self.maxDelaySec))
+
+    def stopThread(self):
+        self.flushTimer.stop()
+        for device in self.devices:
+            device.worker.stopThread()
+        # merge the last batches handed over by the workers and release all of them
+        QCoreApplication.processEvents()
+        self.releaseSamples(flushAll=True)
+
+    @pyqtSlot(bool)
+    def setMeasurementsOn(self, on):
+        self.measurementsOnRequested.emit(on)
+
+    @pyqtSlot()
+    def resetMeasurements(self):
+        self.resetRequested.emit()
+
+    def mergeSamples(self, device, samples):
+        receiveTime = time.monotonic()
+        # the newest sample of the batch has waited the shortest time
+        device.clock.addCandidate(receiveTime, samples[-1].timestamp)
+        offset = device.clock.offset()
+        for sample in samples:
+            timestamp = sample.timestamp + offset
+            # an offset update must not reorder the samples of a board
+            if device.lastTimestamp is not None and timestamp < device.lastTimestamp:
+                timestamp = device.lastTimestamp
+            device.pending.append(DeviceSample(timestamp, device.index, sample.voltages, sample.switchStates))
+            device.lastTimestamp = timestamp
+        device.lastReceiveTime = receiveTime
+        device.noSamples = device.noSamples + len(samples)
+        self.releaseSamples()
+
+    @pyqtSlot()
+    def releaseSamples(self, flushAll=False):
+        now = time.monotonic()
+        # newest time all boards which are still reporting have reached, samples older
+        # than maxDelaySec are released anyway
+        reportedTimes = []
+        for device in self.devices:
+            if device.lastReceiveTime is None:
+                # the first batch of a board is waited for up to maxDelaySec after the start
+                if now - self.startTime < self.maxDelaySec:
+                    reportedTimes.append(float('-inf'))
+            elif now - device.lastReceiveTime < self.maxDelaySec:
+                reportedTimes.append(device.lastTimestamp)
+        releaseTime = now - self.maxDelaySec
+        if len(reportedTimes) > 0:
+            releaseTime = max(releaseTime, min(reportedTimes))
+        if flushAll:
+            releaseTime = float('inf')
+        released = []
+        for device in self.devices:
+            samples = []
+            while len(device.pending) > 0 and device.pending[0].timestamp <= releaseTime:
+                samples.append(device.pending.popleft())
+            if len(samples) > 0:
+                released.append(samples)
+        if len(released) > 0:
+            self.samplesReady.emit(list(heapq.merge(*released, key=lambda sample: sample.timestamp)))
+
+    def getStatistics(self):
+        return [{'port': device.portName,
+                 'samples': device.noSamples,
+                 'pending': len(device.pending),
+                 'clockOffsetSec': device.clock.offset()} for device in self.devices]
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Acquisition from several boards of the MySimple4ChannelDAS")
+    parser.add_argument('--ports', nargs='+', help="serial ports of the boards, all USB ports by default")
+    parser.add_argument('--pattern', default='ttyUSB', help="pattern of the USB ports to discover (e.g. cu on Max OSX)")
+    parser.add_argument('--baud', type=int, default=115200, help="highest baud rate to negotiate")
+    parser.add_argument('--period', type=float, default=0.5, help="acquisition period / s")
+    parser.add_argument('--polling', action='store_true', help="poll the samples instead of streaming")
+    parser.add_argument('--record', nargs='?', const=time.strftime("Devices_%Y%m%d_%H%M%S.rec"),
+                        help="record to this file (default Devices_<date>_<time>.rec)")
+    args = parser.parse_args(argv)
+
+    application = QCoreApplication(sys.argv[:1])
+    manager = DeviceManager(args.period, args.ports, streaming=not args.polling, maxBaud=args.baud,
+                            portPattern=args.pattern)
+    if len(manager.devices) == 0:
+        print("no device found")
+        return 1
+
+    recorder = None
+    if args.record is not None:
+        channelNames = ['device'] + ['voltage' + str(k + 1) for k in range(4)] + ['switch' + str(k + 1) for k in range(4)]
+        recorder = Recorder(args.record, channelNames,
+                            description="merged samples of the boards " + ", ".join(d.portName for d in manager.devices))
+    def handleSamples(samples):
+        if recorder is not None:
+            for sample in samples:
+                recorder.record(sample.timestamp, [sample.device] + list(sample.voltages) + list(sample.switchStates))
+    manager.samplesReady.connect(handleSamples)
+
+    # print the state of the boards once per second
+    statusTimer = QTimer()
+    statusTimer.timeout.connect(lambda: print(manager.getStatistics()))
+    statusTimer.start(1000)
+    signal.signal(signal.SIGINT, lambda *args: application.quit())
+    signal.signal(signal.SIGTERM, lambda *args: application.quit())
+
+    manager.startInThread()
+    application.exec_()
+    manager.stopThread()
+    if recorder is not None:
+        recorder.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -16,12 +16,21 @@ Last change on 21st May 2021
 from __future__ import print_function
 import sys
 # import ntpath
-# import os
-# import time
+import os
+import configparser
+import time
+import numpy as np
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
 from MeasurementsThread import *
 from VoltageMeasurement import VoltageMeasurementsWindow
+import UseDASCommon
+from DASCommon.PlotCanvas import PlotRefresher
+from DASCommon.Recorder import Recorder, RecordingReader
+from AcquisitionDaemon import DaemonClient
+from Instrumentation import instrumentation
+from Calibration import Calibration
+from DASCommon.AcquisitionConfig import AcquisitionConfig, ConfigError
 
 try:
     from PyQt5.QtCore import QString
@@ -30,17 +39,71 @@ except ImportError:
     QString = type("")
 
 class MainWindow(QMainWindow):
-    def __init__(self, *rest):
+    # commands to the measurements worker, delivered in the worker thread
+    measurementsOnRequested = pyqtSignal(bool)
+    resetRequested = pyqtSignal()
+    periodRequested = pyqtSignal(float)
+    adcConfigRequested = pyqtSignal(bool, int, int)
+
+    def __init__(self, useDaemon=False, portName=None, binaryFrames=False, calibrationFile=None,
+                 configFile='Config.ctrl', *rest, overrides=None):
         QMainWindow.__init__(self)
 
-        # set the command message interface
-        self.msgIF = MsgInterface()
+        # the configuration of the acquisition, the given arguments and the overrides
+        # {(section, key): value} take precedence over the control file
+        self.config = AcquisitionConfig(measurementsSchema, defaults={('recording', 'prefix'): 'Eval4Chan'})
+        if os.path.exists(configFile):
+            try:
+                self.config.load(configFile)
+            except ConfigError as e:
+                print(e)
+                print("using the default configuration")
+        if portName is not None:
+            self.config.setOverride('acquisition', 'port', portName)
+        if calibrationFile is not None:
+            self.config.setOverride('scaling', 'calibration', calibrationFile)
+        for (section, key), value in (overrides or {}).items():
+            self.config.setOverride(section, key, value)
+        print("configuration:\n" + str(self.config))
+        self.noChannels = self.config.value('acquisition', 'channels')
+
+        # set the command message interface, as client of the acquisition daemon the daemon owns it
+        self.useDaemon = useDaemon
+        if not self.useDaemon:
+            self.msgIF = MsgInterface(self.config.value('acquisition', 'port'), maxBaud=self.config.value('acquisition', 'baud'))
+            # mode, data rate and range of the ADS1115 before the measurements are turned on
+            self.msgIF.SetAdcConfig(*self.adcConfigValues())
+
+        # in streaming mode the Arduino pushes every sample, otherwise the samples are polled
+        self.streamingMode = self.config.value('acquisition', 'streaming')
+        periodSec = self.config.value('acquisition', 'period')
+
+        # gain, offset, divider ratio and polynomial correction of the channels
+        self.loadCalibration()
 
-        # Start the measurement thread
-        periodSec = 5.0
-        measurementSlot = self.handleMeasurements;
-        measurementsThreadObj = MeasurementsThread(measurementSlot,periodSec)
-        measurementsThreadObj.start()
+        # the processed samples are recorded to a file if the control file enables it
+        self.recorder = None
+        self.openRecorder()
+
+        # the plots are redrawn with at most refreshRateHz frames per second
+        self.refreshRateHz = self.config.value('display', 'refreshRate')
+        self.plotRefresher = PlotRefresher(self.updatePlots, self.refreshRateHz)
+
+        # Start the measurements worker, from now on it owns the command message interface
+        if self.useDaemon:
+            self.measurementsWorker = DaemonClient()
+        else:
+            self.measurementsWorker = MeasurementsWorker(self.msgIF, periodSec, streaming=self.streamingMode,
+                                                         binaryFrames=binaryFrames,
+                                                         fifo=self.config.value('acquisition', 'fifo'))
+        self.measurementsWorker.samplesReady.connect(self.handleMeasurements)
+        self.measurementsOnRequested.connect(self.measurementsWorker.setMeasurementsOn)
+        self.resetRequested.connect(self.measurementsWorker.resetMeasurements)
+        if not self.useDaemon:
+            # the period of the daemon is set by its command line
+            self.periodRequested.connect(self.measurementsWorker.setPeriod)
+            self.adcConfigRequested.connect(self.measurementsWorker.setAdcConfig)
+        self.measurementsWorker.startInThread()
 
         # create frame
         frame = QFrame()
@@ -48,15 +111,20 @@ class MainWindow(QMainWindow):
         frameLayout = QGridLayout(frame)
 
         # create four voltage displays
-        self.voltageMeasurementDisplay1 = VoltageMeasurementsWindow("Channel1: ")
-        self.voltageMeasurementDisplay2 = VoltageMeasurementsWindow("Channel2: ")
-        self.voltageMeasurementDisplay3 = VoltageMeasurementsWindow("Channel3: ")
-        self.voltageMeasurementDisplay4 = VoltageMeasurementsWindow("Channel4: ")
+        historyCapacity = self.config.value('buffer', 'capacity')
+        self.voltageMeasurementDisplay1 = VoltageMeasurementsWindow("Channel1: ", historyCapacity)
+        self.voltageMeasurementDisplay2 = VoltageMeasurementsWindow("Channel2: ", historyCapacity)
+        self.voltageMeasurementDisplay3 = VoltageMeasurementsWindow("Channel3: ", historyCapacity)
+        self.voltageMeasurementDisplay4 = VoltageMeasurementsWindow("Channel4: ", historyCapacity)
+        self.voltageMeasurementDisplays = [self.voltageMeasurementDisplay1, self.voltageMeasurementDisplay2,
+                                           self.voltageMeasurementDisplay3, self.voltageMeasurementDisplay4]
         
         # the on/off control
         # on / off control values for the measurements
         self.OnOffControlValueMeasurements = 1
         self.createOnOffControlMeasurements()
+        # the displays show a replayed recording until the measurements are turned on again
+        self.showingRecording = False
 
         # the file selection and evaluation group
         self.createConfigFileGroupBox()
@@ -76,12 +144,81 @@ class MainWindow(QMainWindow):
         frameLayout.addWidget(self.configFileGroupBox,2,1)
         frameLayout.addWidget(self.statusGroupBox,2,2,1,3)
         frameLayout.addWidget(self.manufacturerGroupbox,2,5)
+        # only the configured channels are shown
+        for display in self.voltageMeasurementDisplays[self.noChannels:]:
+            display.voltagePlotGroupBox.setVisible(False)
         
         # set the central widget
         self.setCentralWidget(frame)
 
         # set window title
         self.setWindowTitle(self.tr("4-Channel Voltage Measurements"))
+
+        # changes of the control file are applied while the measurements continue
+        if self.config.fileName is not None:
+            self.openFileNameLabel.setText(os.path.basename(self.config.fileName))
+        self.config.configChanged.connect(self.applyConfig)
+        self.config.configError.connect(lambda message: self.statusLabel.setText("invalid control file"))
+        self.config.watch()
+
+    def adcConfigValues(self):
+        return (self.config.value('adc', 'continuous'), self.config.value('adc', 'dataRate'),
+                self.config.value('adc', 'range'))
+
+    def loadCalibration(self):
+        # an invalid calibration file keeps the previous calibration, at the start the default one
+        calibrationFile = self.config.value('scaling', 'calibration')
+        try:
+            if os.path.exists(calibrationFile):
+                calibration = Calibration.fromFile(calibrationFile)
+            else:
+                calibration = Calibration()
+        except (IOError, OSError, ValueError, configparser.Error) as error:
+            print("error: calibration file", calibrationFile, "not loaded:", error)
+            if getattr(self, 'calibration', None) is None:
+                self.calibration = Calibration()
+            return False
+        self.calibration = calibration
+        print("calibration:\n" + str(self.calibration))
+        return True
+
+    def openRecorder(self):
+        # a new recording is started with every change of the recording options
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        # as thin client the samples are recorded by the acquisition daemon
+        if self.useDaemon or not self.config.value('recording', 'enabled'):
+            return
+        channelNumbers = [str(k + 1) for k in range(self.noChannels)]
+        self.recordingChannels = ['voltage' + n for n in channelNumbers] + ['switch' + n for n in channelNumbers]
+        fileName = os.path.join(self.config.value('recording', 'directory'),
+                                time.strftime(self.config.value('recording', 'prefix') + "_%Y%m%d_%H%M%S.rec"))
+        self.recorder = Recorder(fileName, self.recordingChannels,
+                                 description="{}-channel voltages / V and switch states".format(self.noChannels))
+
+    def applyConfig(self, changed):
+        # the options which cannot be changed while measuring are used with the next start
+        sections = set(section for section, key in changed)
+        if ('acquisition', 'period') in changed:
+            self.periodRequested.emit(changed[('acquisition', 'period')])
+        if 'adc' in sections:
+            self.adcConfigRequested.emit(*self.adcConfigValues())
+        if ('buffer', 'capacity') in changed:
+            for display in self.voltageMeasurementDisplays:
+                display.setHistoryCapacity(changed[('buffer', 'capacity')])
+        calibrationLoaded = True
+        if 'scaling' in sections:
+            calibrationLoaded = self.loadCalibration()
+        if 'recording' in sections:
+            self.openRecorder()
+        if ('display', 'refreshRate') in changed:
+            self.refreshRateHz = changed[('display', 'refreshRate')]
+            self.plotRefresher.setRefreshRate(self.refreshRateHz)
+        if calibrationLoaded:
+            self.statusLabel.setText("configuration reloaded")
+        else:
+            self.statusLabel.setText("invalid calibration file")
         
     def createManufacturerLabel(self):
         self.manufacturerGroupbox = QGroupBox(self.tr("Made by"))
@@ -131,16 +268,23 @@ class MainWindow(QMainWindow):
         self.openFileNameButton.setFixedSize(200, 30)
         self.openFileNameButton.setStyleSheet("QPushButton { background-color: yellow }")
 
+        # the push button to replay a recording
+        self.replayButton = QPushButton(self.tr("Replay Recording"))
+        self.replayButton.setFixedSize(200, 30)
+        self.replayButton.setStyleSheet("QPushButton { background-color: yellow }")
+
         # define the widget
         layout = QVBoxLayout()
         layout.addWidget(self.openFileNameButton)
         layout.addWidget(self.openFileNameLabel)
+        layout.addWidget(self.replayButton)
 
         # assign the layout to the group box
         self.configFileGroupBox.setLayout(layout)
 
         # define the connection between labels and functions
         self.openFileNameButton.clicked.connect(self.setOpenFileName)
+        self.replayButton.clicked.connect(self.selectRecordingToReplay)
 
     def createOnOffControlMeasurements(self):
         self.onOffCtrlGroupboxMeasurements = QGroupBox(self.tr("Measurements Control"))
@@ -202,14 +346,82 @@ class MainWindow(QMainWindow):
         self.statusLabel.setFixedSize(400, 40)
         self.statusLabel.setText("running")
         self.statusLabel.setFont(labelFont)
-        
+
+        # the performance readout, updated once per second while the timing is enabled
+        performanceFont = QFont()
+        performanceFont.setFamily("Courier")
+        performanceFont.setPointSize(9)
+        self.performanceLabel = QLabel()
+        self.performanceLabel.setFrameStyle(frameStyle)
+        self.performanceLabel.setFixedSize(560, 80)
+        self.performanceLabel.setFont(performanceFont)
+        self.performanceLabel.setText("timing disabled")
+        self.lastPerformanceSummary = None
+
+        # the timing on/off control and the export of the trace
+        self.timingCheckBox = QCheckBox(self.tr("Timing"))
+        self.timingCheckBox.setChecked(instrumentation.enabled)
+        self.timingCheckBox.toggled.connect(self.enableTiming)
+        self.exportTraceButton = QPushButton(self.tr("Export Trace"))
+        self.exportTraceButton.clicked.connect(self.exportTrace)
+        self.performanceTimer = QTimer(self)
+        self.performanceTimer.timeout.connect(self.updatePerformanceReadout)
+        self.performanceTimer.start(1000)
+
         # define the widget
-        layout = QHBoxLayout()
-        layout.addWidget(self.statusLabel)
+        layout = QGridLayout()
+        layout.addWidget(self.statusLabel, 0, 0)
+        layout.addWidget(self.timingCheckBox, 0, 1)
+        layout.addWidget(self.exportTraceButton, 0, 2)
+        layout.addWidget(self.performanceLabel, 1, 0, 1, 3)
 
         # assign the layout to the group box
         self.statusGroupBox.setLayout(layout) 
 
+    def enableTiming(self, enabled):
+        instrumentation.enable(enabled)
+        self.lastPerformanceSummary = None
+        if not enabled:
+            self.performanceLabel.setText("timing disabled")
+
+    def updatePerformanceReadout(self):
+        if not instrumentation.enabled:
+            return
+        summary = instrumentation.getSummary()
+        if self.lastPerformanceSummary is None:
+            self.lastPerformanceSummary = summary
+            return
+        # rates over the last update interval
+        lastSummary = self.lastPerformanceSummary
+        self.lastPerformanceSummary = summary
+        elapsedSec = summary['elapsedSec'] - lastSummary['elapsedSec']
+        def rate(name):
+            return (summary['counters'].get(name, 0) - lastSummary['counters'].get(name, 0)) / elapsedSec
+
+        # dropped samples: lost binary frames, failed requests, samples lost by the FIFO of the Arduino
+        # and samples the recorder could not write
+        dropped = self.recorder.getStatistics()['dropped'] if self.recorder is not None else 0
+        if not self.useDaemon:
+            pipeline = self.msgIF.GetPipelineStatistics()
+            dropped = dropped + self.msgIF.GetFrameStatistics()['lostSamples'] + pipeline['timeouts'] + pipeline['lost'] + \
+                self.msgIF.noFifoOverflows
+        lines = ["acquisition {:7.1f} samples/s   dropped {:6d}   render {:5.1f} FPS".format(
+            rate('samples'), dropped, rate('frames'))]
+        stages = summary['stages']
+        for name in ('serial.request', 'serial.stream', 'acquire', 'handleMeasurements', 'updatePlots', 'updatePlot'):
+            if name in stages:
+                lines.append("{:<20} mean {:7.2f} ms  p99 {:7.2f} ms  max {:7.2f} ms".format(
+                    name, stages[name]['meanMs'], stages[name]['p99Ms'], stages[name]['maxMs']))
+        self.performanceLabel.setText("\n".join(lines))
+
+    def exportTrace(self):
+        fileName = QFileDialog.getSaveFileName(self,
+                self.tr("Export Trace"),
+                time.strftime("Eval4Chan_%Y%m%d_%H%M%S.trace.json"),
+                self.tr("Trace (*.json)"))
+        if (len(fileName[0]) > 0):
+            instrumentation.exportTrace(fileName[0])
+
     def setOpenFileName(self):
         # selectedFilter = QString()
         fileName = QFileDialog.getOpenFileName(self,
@@ -218,12 +430,50 @@ class MainWindow(QMainWindow):
                 self.tr("Control File (*.ctrl)"))
         print("filename =", fileName)
         if (len(fileName[0]) > 0):
-            self.openFileNameLabel.setText(ntpath.basename(fileName[0]))
-            self.CtrlFile = str(ntpath.basename(fileName[0]))
+            try:
+                changed = self.config.load(fileName[0])
+            except ConfigError as e:
+                print(e)
+                self.statusLabel.setText("invalid control file")
+                return
+            self.openFileNameLabel.setText(os.path.basename(fileName[0]))
+            self.CtrlFile = fileName[0]
             self.CtrlFileGiven = True
+            # the selected file is watched from now on
+            self.config.watch()
+            if len(changed) > 0:
+                self.applyConfig(changed)
         else:
             self.CtrlFileGiven = False
         
+    def selectRecordingToReplay(self):
+        fileName = QFileDialog.getOpenFileName(self,
+                self.tr("Select Recording"),
+                "",
+                self.tr("Recording (*.rec)"))
+        if (len(fileName[0]) > 0):
+            self.replayRecording(fileName[0])
+
+    def replayRecording(self, fileName):
+        # stop the measurements and show the recorded history instead
+        if self.OnOffControlValueMeasurements == 1:
+            self.OnOffGenMeasurements()
+        recording = RecordingReader(fileName)
+        self.showingRecording = True
+        for k, display in enumerate(self.voltageMeasurementDisplays):
+            # a recording of less than 4 channels leaves the displays of the others empty
+            display.initMeasurementsArray()
+            display.actualVoltageEdit.setText("")
+            channelName = 'voltage' + str(k + 1)
+            if channelName not in recording.channelNames:
+                continue
+            voltages = recording.channel(channelName)
+            display.measuredVoltages.extend(voltages)
+            if len(voltages) > 0:
+                display.actualVoltageEdit.setText("{:2.3f}".format(voltages[-1]))
+        self.statusLabel.setText("replay of " + os.path.basename(fileName))
+        self.plotRefresher.requestRefresh()
+
     def getStyleSheet(self, path):
         f = QFile(path)
         f.open(QFile.ReadOnly | QFile.Text)
@@ -231,109 +481,87 @@ class MainWindow(QMainWindow):
         f.close()
         return stylesheet 
 
-    def handleMeasurements(self):
+    def handleMeasurements(self, samples):
         # print("handleMeasurements")
-        if (self.OnOffControlValueMeasurements == 1):
-            # request switch status from the switch handler and update the display
-            try:
-                statusSwitch1 = self.msgIF.GetSwitchStatus(1)
-                print("statusSwitch1 = ", statusSwitch1)
-                if statusSwitch1 == 1:
-                    statusSwitch1Text = '1:1'
-                    scaleFactor1 = 1.0
-                else:
-                    statusSwitch1Text = '1:10'
-                    scaleFactor1 = 10.0
-                self.voltageMeasurementDisplay1.actualSwitchStatusEdit.setText("{:}".format(statusSwitch1Text))
-                
-                statusSwitch2 = self.msgIF.GetSwitchStatus(2)
-                print("statusSwitch2 = ", statusSwitch2)
-                if statusSwitch2 == 1:
-                    statusSwitch2Text = '1:1'
-                    scaleFactor2 = 1.0
-                else:
-                    statusSwitch2Text = '1:10'
-                    scaleFactor2 = 10.0
-                self.voltageMeasurementDisplay2.actualSwitchStatusEdit.setText("{:}".format(statusSwitch2Text))
-                
-                statusSwitch3 = self.msgIF.GetSwitchStatus(3)
-                print("statusSwitch3 = ", statusSwitch3)
-                if statusSwitch3 == 1:
-                    statusSwitch3Text = '1:1'
-                    scaleFactor3 = 1.0
-                else:
-                    statusSwitch3Text = '1:10'
-                    scaleFactor3 = 10.0
-                self.voltageMeasurementDisplay3.actualSwitchStatusEdit.setText("{:}".format(statusSwitch3Text))
-                
-                statusSwitch4 = self.msgIF.GetSwitchStatus(4)
-                print("statusSwitch4 = ", statusSwitch4)
-                if statusSwitch4 == 1:
-                    statusSwitch4Text = '1:1'
-                    scaleFactor4 = 1.0
-                else:
-                    statusSwitch4Text = '1:10'
-                    scaleFactor4 = 10.0
-                self.voltageMeasurementDisplay4.actualSwitchStatusEdit.setText("{:}".format(statusSwitch4Text))
-             
-            except TypeError:
-                print("failed to get correct measurements")
-        
-        if (self.OnOffControlValueMeasurements == 1):
-            # request voltage measurements from the voltage sensor and update the display
-            try:
-                # channel 1
-                measuredVoltage1 = self.msgIF.GetMeasuredVoltage(1) * scaleFactor1
-                print("measuredVoltage1 = ", measuredVoltage1)
-                self.voltageMeasurementDisplay1.actualVoltageEdit.setText("{:2.3f}".format(measuredVoltage1))
-                self.voltageMeasurementDisplay1.updateMeasurementsArray(measuredVoltage1)
-                self.voltageMeasurementDisplay1.updatePlot("Channel1: ")
-                               
-                # channel 2
-                measuredVoltage2 = self.msgIF.GetMeasuredVoltage(2) * scaleFactor2
-                print("measuredVoltage2 =", measuredVoltage2)
-                self.voltageMeasurementDisplay2.actualVoltageEdit.setText("{:2.3f}".format(measuredVoltage2))
-                self.voltageMeasurementDisplay2.updateMeasurementsArray(measuredVoltage2)
-                self.voltageMeasurementDisplay2.updatePlot("Channel2: ")
-
-                # channel 3
-                measuredVoltage3 = self.msgIF.GetMeasuredVoltage(3) * scaleFactor3
-                print("measuredVoltage3 =", measuredVoltage3)
-                self.voltageMeasurementDisplay3.actualVoltageEdit.setText("{:2.3f}".format(measuredVoltage3))
-                self.voltageMeasurementDisplay3.updateMeasurementsArray(measuredVoltage3)
-                self.voltageMeasurementDisplay3.updatePlot("Channel3: ")
-
-                # channel 4
-                measuredVoltage4 = self.msgIF.GetMeasuredVoltage(4) * scaleFactor4
-                print("measuredVoltage4 =", measuredVoltage4)
-                self.voltageMeasurementDisplay4.actualVoltageEdit.setText("{:2.3f}".format(measuredVoltage4))
-                self.voltageMeasurementDisplay4.updateMeasurementsArray(measuredVoltage4)
-                self.voltageMeasurementDisplay4.updatePlot("Channel4: ")
-                
-            except TypeError:
-                print("failed to get correct measurements")
-                
+        # process the batch of samples from the measurements worker, the plots are drawn with the next frame
+        with instrumentation.timed('handleMeasurements'):
+            timestamps = np.array([sample.timestamp for sample in samples])
+            measuredVoltages = np.array([sample.voltages for sample in samples], dtype=np.float64).T
+            switchStates = np.array([sample.switchStates for sample in samples]).T
+            self.processMeasurements(timestamps, measuredVoltages, switchStates)
+        instrumentation.count('samples', len(samples))
+        self.plotRefresher.requestRefresh()
+
+    def updatePlots(self):
+        with instrumentation.timed('updatePlots'):
+            self.voltageMeasurementDisplay1.updatePlot("Channel1: ")
+            self.voltageMeasurementDisplay2.updatePlot("Channel2: ")
+            self.voltageMeasurementDisplay3.updatePlot("Channel3: ")
+            self.voltageMeasurementDisplay4.updatePlot("Channel4: ")
+        instrumentation.count('frames')
+
+    def processMeasurements(self, timestamps, measuredVoltages, switchStates):
+        # measuredVoltages and switchStates of the block with one row per channel, the worker
+        # also hands over the samples acquired until it turned the measurements off
+        # the voltages at the inputs of the channels, calibrated and scaled with the divider ratios,
+        # the acquisition daemon publishes them already calibrated
+        if self.useDaemon:
+            inputVoltages = measuredVoltages
+        else:
+            inputVoltages = self.calibration.apply(measuredVoltages, switchStates)
+        # the switch status and voltage displays show the last sample of the block,
+        # a replayed recording is not mixed with the last samples
+        if not self.showingRecording:
+            dividerTexts = self.calibration.dividerTexts(switchStates[:, -1])
+            for k, display in enumerate(self.voltageMeasurementDisplays[:self.noChannels]):
+                display.actualSwitchStatusEdit.setText("{:}".format(dividerTexts[k]))
+                display.actualVoltageEdit.setText("{:2.3f}".format(inputVoltages[k, -1]))
+                display.updateMeasurementsBlock(inputVoltages[k])
+
+        # record the scaled voltages and the switch states of the configured channels
+        if self.recorder is not None:
+            self.recorder.recordBlock(timestamps, np.vstack((inputVoltages[:self.noChannels],
+                                                             switchStates[:self.noChannels])).T)
+
     def OnOffGenMeasurements(self):
         if self.OnOffControlValueMeasurements == 1:
             self.OnOffControlValueMeasurements = 0
             self.onOffControlLabelMeasurements.setText(self.tr("Measurements are <b>OFF</b>"))
-            self.msgIF.TurnOffMeasurements()
+            self.measurementsOnRequested.emit(False)
             self.statusLabel.setText("stopped")
         else:
             self.OnOffControlValueMeasurements = 1
+            self.showingRecording = False
             self.onOffControlLabelMeasurements.setText(self.tr("Measurements are <b>ON</b>"))
-            self.msgIF.TurnOnMeasurements()
+            self.measurementsOnRequested.emit(True)
             self.statusLabel.setText("running")
  
     def resetGenMeasurements(self):
-        # set the default state (on)
+        # set the default state (on), the worker turns the measurements on again if they were off
+        if self.OnOffControlValueMeasurements == 0:
+            self.measurementsOnRequested.emit(True)
+            self.statusLabel.setText("running")
         self.OnOffControlValueMeasurements = 1
+        self.showingRecording = False
         self.onOffControlLabelMeasurements.setText(self.tr("Measurements are <b>ON</b>"))
-        self.msgIF.ResetMeasurements()
+        self.resetRequested.emit()
+
+    def closeEvent(self, event):
+        self.performanceTimer.stop()
+        self.plotRefresher.stop()
+        self.measurementsWorker.stopThread()
+        # process the last samples handed over by the worker before the recording is closed
+        QCoreApplication.processEvents()
+        if self.recorder is not None:
+            self.recorder.close()
+        QMainWindow.closeEvent(self, event)
  
 if __name__ == '__main__':
     a = QApplication(sys.argv)
-    window = MainWindow()
+    # with --timing the timing instrumentation is enabled from the start
+    instrumentation.enable('--timing' in sys.argv)
+    # with --daemon the samples are received from a running AcquisitionDaemon.py
+    window = MainWindow(useDaemon='--daemon' in sys.argv)
     window.show()
     window.resize(1000, 1000)
     window.show()
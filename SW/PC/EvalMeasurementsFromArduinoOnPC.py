@@ -16,13 +16,12 @@ import sys
 import ntpath
 # import os
 import numpy as np
-import matplotlib
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-matplotlib.use('Qt5Agg')
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
 from MeasurementsThread import *
+import UseDASCommon
+from DASCommon.PlotCanvas import MplCanvas
+from DASCommon.MinMaxPyramid import MinMaxPyramid
 
 try:
     from PyQt5.QtCore import QString
@@ -31,12 +30,6 @@ except ImportError:
     QString = type("")
 
 
-class MplCanvas(FigureCanvasQTAgg):
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
-
 class TemperatureMeasurementsCtrlWindow(QMainWindow):
     def __init__(self, *rest):
         QMainWindow.__init__(self)
@@ -50,9 +43,9 @@ class TemperatureMeasurementsCtrlWindow(QMainWindow):
         # measured values of temperature (actual and mean)
         self.actualTemperature = 21.0
         self.meanTemperature = 21.0
-        self.noValidMeasurements = 0
         
-        # array of measurements
+        # history of measurements
+        self.historyCapacity = 100000
         self.initMeasurementsArray()  
         
         # Start the measurement thread
@@ -121,11 +114,9 @@ class TemperatureMeasurementsCtrlWindow(QMainWindow):
         titleFont.setPointSize(25)
         self.temperaturePlotGroupBox.setFont(titleFont)
         
-        self.plotCanvas =  MplCanvas(self, width=5, height=5, dpi=100)
-        self.plotCanvas.axes.plot(self.measuredTemperatureArray)
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('temperature / °C')
-        self.plotCanvas.axes.grid()
+        self.plotCanvas =  MplCanvas(self, width=5, height=5, dpi=100,
+                                     xlabel='discrete time instance', ylabel='temperature / °C')
+        self.plotCanvas.updateData(self.measuredTemperatures)
         
         # create the layout and add the plot widget
         self.temperaturePlotVBox = QVBoxLayout()
@@ -173,31 +164,21 @@ class TemperatureMeasurementsCtrlWindow(QMainWindow):
         
     
     def updatePlot(self):
-        self.plotCanvas.axes.clear()
-        self.plotCanvas.axes.plot(self.measuredTemperatureArray)
-        self.plotCanvas.axes.grid()
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel('temperature / °C')
-        # update the plot
-        self.plotCanvas.draw()
+        # update the plot, the labels are kept by the canvas
+        self.plotCanvas.updateData(self.measuredTemperatures)
         
     def updateMeanTemperature(self):
         # calculate the mean temperature value
-        self.meanTemperature = np.mean(self.measuredTemperatureArray[0:self.noValidMeasurements])
+        self.meanTemperature = self.measuredTemperatures.mean()
         # update the mean temperature edit
         self.meanTemperatureEdit.setText("{:2.2f}".format(self.meanTemperature))        
         
     def updateMeasurementsArray(self, temperatureValue):
-        self.measuredTemperatureArray[self.arrayIndex] = temperatureValue
-        self.arrayIndex = self.arrayIndex + 1
-        if (self.arrayIndex > self.maxArraySize) :
-            self.arrayIndex = 0
+        self.measuredTemperatures.append(temperatureValue)
     
     def initMeasurementsArray(self):
-        self.maxArraySize = 100
-        self.measuredTemperatureArray = 25.0*np.ones(self.maxArraySize+1)
-        self.arrayIndex = 0
-        self.noValidMeasurements = 0
+        # the last historyCapacity temperatures in chronological order
+        self.measuredTemperatures = MinMaxPyramid(self.historyCapacity)
          
     def createMeanTemperatureDisplay(self):
     ################### Measurement widgets ##############################################
@@ -397,9 +378,6 @@ class TemperatureMeasurementsCtrlWindow(QMainWindow):
                 
                 # valid measurement received   --> update plot and displays
                 self.actualTemperature = measuredTemperature
-                self.noValidMeasurements = self.noValidMeasurements + 1
-                if (self.noValidMeasurements > self.maxArraySize):
-                    self.noValidMeasurements = self.maxArraySize
                 self.actualTemperatureEdit.setText("{:2.2f}".format(measuredTemperature))
                 self.updateMeasurementsArray(measuredTemperature)
                 self.updatePlot()
@@ -0,0 +1,129 @@
+"""
+Instrumentation.py
+
+timing instrumentation of the hot paths of the acquisition and the display
+(suited for Max OSX, Windows, Linux)
+
+The stages are timed by context managers and the events are counted on the shared
+instance, from any thread:
+
+    from Instrumentation import instrumentation
+    with instrumentation.timed('updatePlots'):
+        ...
+    instrumentation.count('samples', len(samples))
+
+While disabled (the default) timed() returns a shared context manager which does
+nothing and count() returns at once, so the instrumentation can stay in the hot paths.
+When enabled, every stage keeps its count, total and maximum and the durations of its
+last calls for the percentiles. The timed calls are also kept as trace events, written
+by exportTrace() in the Chrome trace event format (chrome://tracing, Perfetto).
+
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+
+class NoTiming(object):
+    """ Context manager of the disabled instrumentation
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+noTiming = NoTiming()
+
+class StageStatistics(object):
+    def __init__(self, name, noRecent=1000):
+        self.name = name
+        self.count = 0
+        self.totalSec = 0.0
+        self.maxSec = 0.0
+        self.recentSec = deque(maxlen=noRecent)
+
+    def addDuration(self, durationSec):
+        self.count = self.count + 1
+        self.totalSec = self.totalSec + durationSec
+        self.maxSec = max(self.maxSec, durationSec)
+        self.recentSec.append(durationSec)
+
+    def asDict(self):
+        recent = 1000.0 * np.array(self.recentSec) if len(self.recentSec) > 0 else np.zeros(1)
+        return {'count': self.count,
+                'meanMs': 1000.0 * self.totalSec / self.count if self.count > 0 else 0.0,
+                'p50Ms': float(np.percentile(recent, 50)),
+                'p99Ms': float(np.percentile(recent, 99)),
+                'maxMs': 1000.0 * self.maxSec}
+
+class StageTiming(object):
+    """ Context manager timing one call of a stage
+    """
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.instrumentation.addDuration(self.name, self.startTime, time.perf_counter() - self.startTime)
+        return False
+
+class Instrumentation(object):
+    def __init__(self, traceCapacity=100000):
+        self.enabled = False
+        self.stages = {}
+        self.counters = {}
+        # (name, thread id, start time, duration) of the last traceCapacity timed calls
+        self.traceEvents = deque(maxlen=traceCapacity)
+        self.startTime = time.perf_counter()
+
+    def enable(self, enabled=True):
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.traceEvents.clear()
+        self.startTime = time.perf_counter()
+
+    def timed(self, name):
+        if not self.enabled:
+            return noTiming
+        return StageTiming(self, name)
+
+    def count(self, name, number=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + number
+
+    def addDuration(self, name, startTime, durationSec):
+        if name not in self.stages:
+            self.stages[name] = StageStatistics(name)
+        self.stages[name].addDuration(durationSec)
+        self.traceEvents.append((name, threading.current_thread().ident, startTime, durationSec))
+
+    def getSummary(self):
+        return {'elapsedSec': time.perf_counter() - self.startTime,
+                'counters': dict(self.counters),
+                'stages': dict((name, stage.asDict()) for name, stage in list(self.stages.items()))}
+
+    def exportTrace(self, fileName):
+        """ Write the trace events and the summary as Chrome trace event JSON
+        """
+        events = [{'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threadId,
+                   'ts': 1e6 * (startTime - self.startTime), 'dur': 1e6 * durationSec}
+                  for name, threadId, startTime, durationSec in list(self.traceEvents)]
+        with open(fileName, 'w') as f:
+            json.dump({'traceEvents': events, 'otherData': self.getSummary()}, f)
+        print("trace of {} events written to {}".format(len(events), fileName))
+
+# the instance shared by all modules
+instrumentation = Instrumentation()
@@ -12,11 +12,18 @@ Last change on Created 30th March 2021
 from __future__ import print_function
 # import os
 import serial
+import threading
 import time
+from collections import deque, namedtuple
 import PyCmdMessenger
 from serial.tools import list_ports
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
+from SampleFrames import SampleFrameDecoder
+import UseDASCommon
+from DASCommon.PeriodicScheduler import PeriodicScheduler
+from Instrumentation import instrumentation
+from DASCommon.AcquisitionConfig import ConfigOption, commonSchema
    
 class MeasurementsThread(QThread):
     def __init__(self, measurementHandler,periodSec):
@@ -32,44 +39,233 @@ timers = []
 
 def activateMeasurementTimer(measurementHandler,periodSec):
     print("Measurement thread started")
-    timer = QTimer()
-    timer.timeout.connect(measurementHandler)
-    timer.start(2000*periodSec)
+    # drift-free ticks every periodSec on the monotonic clock
+    timer = PeriodicScheduler(periodSec)
+    timer.tick.connect(measurementHandler)
+    timer.start()
     timers.append(timer)
 
-class MsgInterface(object):
+# sample pushed by the Arduino in streaming mode, timestamp in seconds since the Arduino start
+StreamedSample = namedtuple('StreamedSample', ['timestamp', 'voltages', 'switchStates'])
+
+class CommandLatencyStatistics(object):
+    """ Round trip latency of one command from sending until its response has arrived
+    """
     def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.lastSec = 0.0
+        self.minSec = float('inf')
+        self.maxSec = 0.0
+        self.sumSec = 0.0
+
+    def addLatency(self, latencySec):
+        self.count = self.count + 1
+        self.lastSec = latencySec
+        self.minSec = min(self.minSec, latencySec)
+        self.maxSec = max(self.maxSec, latencySec)
+        self.sumSec = self.sumSec + latencySec
+
+    def addTimeout(self):
+        self.timeouts = self.timeouts + 1
+
+    def meanSec(self):
+        if self.count == 0:
+            return 0.0
+        return self.sumSec / self.count
+
+    def __str__(self):
+        if self.count == 0:
+            return "no responses, {} timeouts".format(self.timeouts)
+        return "n = {}, timeouts = {}, mean = {:.1f} ms, min = {:.1f} ms, max = {:.1f} ms, last = {:.1f} ms".format(
+            self.count, self.timeouts, 1000.0*self.meanSec(), 1000.0*self.minSec, 1000.0*self.maxSec, 1000.0*self.lastSec)
+
+class PipelineStatistics(object):
+    """ Counters of the command pipeline, no request is ever answered with a made-up value
+    """
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        # requests without response: timed out, response lost or refused (binary streaming)
+        self.timeouts = 0
+        self.lost = 0
+        self.refused = 0
+        # responses arriving after their request had timed out
+        self.lateResponses = 0
+        # submissions which had to wait for a free slot of the in-flight window
+        self.backPressureWaits = 0
+        self.maxInFlight = 0
+
+    def asDict(self):
+        return {'submitted': self.submitted,
+                'completed': self.completed,
+                'timeouts': self.timeouts,
+                'lost': self.lost,
+                'refused': self.refused,
+                'lateResponses': self.lateResponses,
+                'backPressureWaits': self.backPressureWaits,
+                'maxInFlight': self.maxInFlight}
+
+    def __str__(self):
+        return ", ".join("{} = {}".format(key, value) for key, value in self.asDict().items())
+
+class CommandRequest(object):
+    """ Outstanding command of the pipeline, finished by its response frame, by the
+        response timeout or by a later response which shows that its response got lost
+    """
+    def __init__(self, msgIF, command, responseName):
+        self.msgIF = msgIF
+        self.command = command
+        self.responseName = responseName
+        self.sendTime = time.perf_counter()
+        # time of the request on the clock of the PeriodicScheduler
+        self.sendMonotonic = time.monotonic()
+        self.deadline = self.sendTime + msgIF.responseTimeout
+        self.response = None
+        self.error = None
+        self.finished = False
+        # the fifoSample frames of a sendSampleBlock, handed over with the sampleBlock which ends them
+        self.samples = []
+
+    def done(self):
+        return self.finished
+
+    def finish(self, response=None, error=None):
+        self.response = response
+        self.error = error
+        self.finished = True
+
+    def result(self):
+        """ Wait for the response, returns the received message or None if the command failed
+        """
+        self.msgIF.WaitForRequest(self)
+        return self.response
+
+class CountingArduinoBoard(PyCmdMessenger.ArduinoBoard):
+    """ ArduinoBoard which counts the transferred bytes for the throughput measurement
+    """
+    def __init__(self, *args, **kwargs):
+        self.bytesReceived = 0
+        self.bytesSent = 0
+        PyCmdMessenger.ArduinoBoard.__init__(self, *args, **kwargs)
+
+    def read(self):
+        byte = self.comm.read()
+        self.bytesReceived = self.bytesReceived + len(byte)
+        return byte
+
+    def write(self, msg):
+        self.comm.write(msg)
+        self.bytesSent = self.bytesSent + len(msg)
+
+# the following enum sequence has to correspond to the sequence of the enum in the Arduino part
+cmdMessengerCommands = [['commError',''],
+                        ['comment',''],
+                        ['sendAcknowledge','s'],
+                        ['areYouReady',''],
+                        ['error','s'],
+                        ['askUsIfReady',''],
+                        ['youAreReady',''],
+                        ['sendMeasuredVoltage1',''],
+                        ['sendMeasuredVoltage2',''],
+                        ['sendMeasuredVoltage3',''],
+                        ['sendMeasuredVoltage4',''],
+                        ['sendSwitchStatus1',''],
+                        ['sendSwitchStatus2',''],
+                        ['sendSwitchStatus3',''],
+                        ['sendSwitchStatus4',''],
+                        ['turnOnMeasurements',''],
+                        ['turnOffMeasurements',''],
+                        ['resetMeasurements',''],
+                        ['floatValue','f'],
+                        ['int16Value','i'],
+                        ['sendAllChannels',''],
+                        ['allChannelsValues','ffffiiii'],
+                        ['streamedSample','Lffffiiii'],
+                        ['getAdcConfig',''],
+                        ['setAdcConfig','iii'],
+                        ['adcConfigValues','iiiL'],
+                        ['sendSampleBlock','i'],
+                        ['fifoSample','Lffffiiii'],
+                        ['sampleBlock','iiL'],
+                        ['baudRateAccepted','L']]
+
+# data rates / SPS and ranges / mV of the ADS1115 supported by the Arduino
+adcDataRates = [8, 16, 32, 64, 128, 250, 475, 860]
+adcRanges = [6144, 4096, 2048, 1024, 512, 256]
+
+# configuration of the ADS1115, noOverflows counts the conversion sets lost in continuous mode
+AdcConfig = namedtuple('AdcConfig', ['continuous', 'dataRateSPS', 'rangeMV', 'noOverflows'])
+
+# samples buffered in the FIFO of the Arduino, at most sampleFifoSize samples per block
+sampleFifoSize = 24
+# bytes of a fifoSample frame on the link (escaped binary arguments), for the response deadline
+fifoSampleBytes = 40
+# samples of one sendSampleBlock, the samples still in the FIFO and the samples the
+# FIFO has lost since the Arduino start because they were not read in time
+SampleFifoBlock = namedtuple('SampleFifoBlock', ['samples', 'remaining', 'noOverflows'])
+
+# baud rate of the Arduino after reset and the baud rates which may be negotiated
+defaultBaudRate = 9600
+supportedBaudRates = [9600, 19200, 38400, 57600, 115200, 230400, 460800]
+# the Arduino falls back to the default baud rate if the new one is not confirmed within 2 s
+baudRateFallbackSec = 2.5
+
+# the options of the control file of the 4-channel DAS (Config.ctrl)
+measurementsSchema = commonSchema + [
+    ConfigOption('acquisition', 'port', str, '/dev/ttyUSB0', hotReload=False,
+                 description="serial port of the Arduino"),
+    ConfigOption('acquisition', 'baud', int, 115200, choices=supportedBaudRates,
+                 hotReload=False, description="highest baud rate to negotiate"),
+    ConfigOption('acquisition', 'channels', int, 4, minimum=1, maximum=4, hotReload=False,
+                 description="number of channels shown and recorded"),
+    ConfigOption('acquisition', 'streaming', bool, True, hotReload=False,
+                 description="the Arduino pushes the samples, otherwise they are polled"),
+    ConfigOption('acquisition', 'fifo', bool, False, hotReload=False,
+                 description="without streaming all samples buffered by the Arduino are read in blocks"),
+    ConfigOption('adc', 'continuous', bool, False,
+                 description="the ADS1115 converts continuously, otherwise single shots every period"),
+    ConfigOption('adc', 'dataRate', int, 128, choices=adcDataRates,
+                 description="data rate of the ADS1115 / SPS"),
+    ConfigOption('adc', 'range', int, 6144, choices=adcRanges,
+                 description="input range of the ADS1115 / +/- mV"),
+    ConfigOption('scaling', 'calibration', str, 'Calibration.cal',
+                 description="calibration file of the channels"),
+]
+
+class MsgInterface(object):
+    def __init__(self, portName='/dev/ttyUSB0', responseTimeout=1.0, baud=defaultBaudRate, maxBaud=None, maxInFlight=4):
         # make sure this baudrate matches the baudrate on the Arduino
+        # with maxBaud the highest baud rate supported by both sides is negotiated
+        # up to maxInFlight commands are sent before their responses have arrived
         self.running = False
-        self.baud = 9600
-        self.sem = QSemaphore(1)
-        print(self.sem)
-        # the following enum sequence has to correspond to the sequence of the enum in the Arduino part
-        self.commands = [['commError',''],
-                         ['comment',''],
-                         ['sendAcknowledge','s'],
-                         ['areYouReady',''],
-                         ['error',''],
-                         ['askUsIfReady',''],
-                         ['youAreReady',''],
-                         ['sendMeasuredVoltage1',''],
-                         ['sendMeasuredVoltage2',''],
-                         ['sendMeasuredVoltage3',''],
-                         ['sendMeasuredVoltage4',''],
-                         ['sendSwitchStatus1',''],
-                         ['sendSwitchStatus2',''],
-                         ['sendSwitchStatus3',''],
-                         ['sendSwitchStatus4',''],
-                         ['turnOnMeasurements',''],
-                         ['turnOffMeasurements',''],
-                         ['resetMeasurements',''],
-                         ['floatValue','f'],
-                         ['int16Value','i']]
+        self.baud = baud
+        # maximum time to wait for the response to a command in seconds
+        self.responseTimeout = responseTimeout
+        self.latencyStatistics = {}
+        # samples pushed by the Arduino in streaming mode
+        self.streaming = False
+        self.streamedSamples = deque()
+        # samples of the sample blocks in transfer, the overflows reported by the last block
+        self.fifoSamples = deque()
+        self.noFifoOverflows = 0
+        # compact binary sample frames instead of streamedSample frames
+        self.binaryStreaming = False
+        # the binary frames follow the acknowledge of turnOnMeasurements right away
+        self.binaryStreamingStarting = False
+        self.frameDecoder = SampleFrameDecoder()
+        # the serial I/O is shared by the GUI and the measurements thread, a caller which
+        # finds the window full waits (back-pressure) instead of skipping its request
+        self.ioLock = threading.RLock()
+        self.maxInFlight = maxInFlight
+        self.pendingCommands = deque()
+        self.pipelineStatistics = PipelineStatistics()
+        self.commands = cmdMessengerCommands
         try:
             # try to open the relevant usb port
             # self.port_name = self.list_usb_ports()[3][0]
             # self.port_name = '/dev/cu.wchusbserial1410'
-            self.port_name = '/dev/ttyUSB0'
+            self.port_name = portName
             # print('Serial port name = ',self.port_name)
             self.serial_port = serial.Serial(self.port_name, self.baud, timeout=0)
         except (serial.SerialException, IndexError):
@@ -82,21 +278,28 @@ class MsgInterface(object):
             # Initialize an ArduinoBoard instance.  This is where you specify baud rate and
             # serial timeout.  If you are using a non ATmega328 board, you might also need
             # to set the data sizes (bytes for integers, longs, floats, and doubles).  
-            self.arduino = PyCmdMessenger.ArduinoBoard(self.port_name,baud_rate=9600)
+            self.arduino = CountingArduinoBoard(self.port_name,baud_rate=self.baud,timeout=self.responseTimeout)
             # Initialize the messenger
             self.messenger  = PyCmdMessenger.CmdMessenger(self.arduino,self.commands)
             self.loopCounter = 0
+            self.lastThroughputTime = time.perf_counter()
+            self.lastBytesReceived = 0
+
+            if maxBaud is not None and maxBaud > self.baud:
+                self.NegotiateBaudRate(maxBaud)
             
     def printReceiveMsg(self):
         ReceiveMsg = self.messenger.receive()
         print('ReceiveMsg = ')
         print(ReceiveMsg)		
         
-    def list_usb_ports(self):
+    @staticmethod
+    def list_usb_ports(pattern='ttyUSB'):
         """ Use the grep generator to get a list of all USB ports.
+            Static, so the ports can be listed before a MsgInterface is opened.
         """
         # ports = [port for port in list_ports.grep('cu')]
-        ports = [port for port in list_ports.grep('ttyUSB')]
+        ports = [port for port in list_ports.grep(pattern)]
         return ports
 
     def on_error(self, received_command, *args, **kwargs):
@@ -104,117 +307,393 @@ class MsgInterface(object):
         """
         print(('Error:', args[0][0]))
 
-    def SendVoltageRequestMsg(self,  channelIndex):
-        if channelIndex == 1:
-            self.messenger.send('sendMeasuredVoltage1')
-        else:
-            if channelIndex == 2:
-                self.messenger.send('sendMeasuredVoltage2')
-            else:
-                if channelIndex == 3:
-                    self.messenger.send('sendMeasuredVoltage3')
-                else:
-                    if channelIndex == 4:
-                        self.messenger.send('sendMeasuredVoltage4')
-                    else:
-                        print("error of channel index")
-
-    def SendSwitchRequestMsg(self,  channelIndex):
-        if channelIndex == 1:
-            self.messenger.send('sendSwitchStatus1')
+    def SubmitCommand(self, command, responseName, *args, **kwargs):
+        """ Send a command without waiting for its response, returns its CommandRequest.
+            Waits for the oldest outstanding command while maxInFlight commands are outstanding.
+        """
+        request = CommandRequest(self, command, responseName)
+        self.pipelineStatistics.submitted = self.pipelineStatistics.submitted + 1
+        if self.binaryStreaming:
+            # binary frames cannot be told apart from CmdMessenger responses
+            print("error: command", command, "not available in binary streaming mode")
+            self.pipelineStatistics.refused = self.pipelineStatistics.refused + 1
+            request.finish(error='refused')
+            return request
+        with self.ioLock:
+            if len(self.pendingCommands) >= self.maxInFlight:
+                self.pipelineStatistics.backPressureWaits = self.pipelineStatistics.backPressureWaits + 1
+                while len(self.pendingCommands) >= self.maxInFlight:
+                    self.ReceiveResponses()
+            request.sendTime = time.perf_counter()
+            request.deadline = request.sendTime + self.responseTimeout
+            self.messenger.send(command, *args, **kwargs)
+            self.pendingCommands.append(request)
+            self.pipelineStatistics.maxInFlight = max(self.pipelineStatistics.maxInFlight, len(self.pendingCommands))
+        return request
+
+    def SendAndReceive(self, command, responseName, *args, **kwargs):
+        """ Send a command and wait for its response frame.
+            Returns as soon as the response has arrived or None after the response timeout.
+        """
+        with instrumentation.timed('serial.request'):
+            return self.SubmitCommand(command, responseName, *args, **kwargs).result()
+
+    def WaitForRequest(self, request):
+        while not request.done():
+            with self.ioLock:
+                # another thread may have received the response meanwhile
+                if not request.done():
+                    self.ReceiveResponses()
+
+    def ReceiveResponses(self, wait=True):
+        """ Read the frames which have arrived and finish the requests they answer.
+            With wait the first frame is waited for up to the serial timeout,
+            otherwise only the frames already on their way are read.
+        """
+        with self.ioLock:
+            while wait or self.arduino.comm.in_waiting > 0:
+                wait = False
+                try:
+                    # blocks until a complete frame or the serial timeout
+                    ReceiveMsg = self.messenger.receive()
+                except EOFError:
+                    # incomplete frame at the end of the serial timeout
+                    print("incomplete frame dropped")
+                    ReceiveMsg = None
+                except ValueError as error:
+                    print("dropped invalid frame: ", error)
+                    ReceiveMsg = None
+                if ReceiveMsg is not None:
+                    self.dispatchFrame(ReceiveMsg)
+                    if self.binaryStreamingStarting and ReceiveMsg[0] == 'sendAcknowledge':
+                        # the bytes behind the acknowledge are binary frames for the frame decoder
+                        break
+            self.expireRequests()
+
+    def dispatchFrame(self, ReceiveMsg):
+        name = ReceiveMsg[0]
+        if name == 'streamedSample':
+            # keep streamed samples arriving in between for StreamedSamples
+            self.queueStreamedSample(ReceiveMsg)
+            return
+        if name == 'fifoSample':
+            # the samples of a block arrive before the sampleBlock which ends it
+            values = ReceiveMsg[1]
+            self.fifoSamples.append(StreamedSample(values[0]/1000.0, values[1:5], values[5:9]))
+            return
+        # the Arduino answers in order: the response belongs to the oldest request waiting for it
+        for k, request in enumerate(self.pendingCommands):
+            if request.responseName == name:
+                # the responses of the requests before it got lost on the way
+                for lost in range(k):
+                    lostRequest = self.pendingCommands.popleft()
+                    print("response lost: ", lostRequest.command)
+                    self.getLatencyStatistics(lostRequest.command).addTimeout()
+                    self.pipelineStatistics.lost = self.pipelineStatistics.lost + 1
+                    lostRequest.finish(error='lost')
+                self.pendingCommands.popleft()
+                if name == 'sampleBlock':
+                    self.takeSampleBlock(request, ReceiveMsg[1][0])
+                self.getLatencyStatistics(request.command).addLatency(time.perf_counter() - request.sendTime)
+                self.pipelineStatistics.completed = self.pipelineStatistics.completed + 1
+                request.finish(response=ReceiveMsg)
+                return
+        if name in ('error', 'comment'):
+            print("dropped unexpected message: ", ReceiveMsg)
         else:
-            if channelIndex == 2:
-                self.messenger.send('sendSwitchStatus2')
-            else:
-                if channelIndex == 3:
-                    self.messenger.send('sendSwitchStatus3')
-                else:
-                    if channelIndex == 4:
-                        self.messenger.send('sendSwitchStatus4')
-                    else:
-                        print("error of channel index")
-                    
+            self.pipelineStatistics.lateResponses = self.pipelineStatistics.lateResponses + 1
+            print("dropped late response: ", ReceiveMsg)
+
+    def expireRequests(self):
+        # the requests are sent in order of their deadlines
+        now = time.perf_counter()
+        while len(self.pendingCommands) > 0 and self.pendingCommands[0].deadline <= now:
+            request = self.pendingCommands.popleft()
+            self.getLatencyStatistics(request.command).addTimeout()
+            self.pipelineStatistics.timeouts = self.pipelineStatistics.timeouts + 1
+            request.finish(error='timeout')
+            if request.responseName == 'sampleBlock' and \
+                    not any(pending.responseName == 'sampleBlock' for pending in self.pendingCommands):
+                # the samples of the failed block are no block's samples
+                self.fifoSamples.clear()
+
+    def takeSampleBlock(self, request, noSamples):
+        # the block's samples are the last ones before its end, the samples before them
+        # belong to blocks whose end got lost
+        if len(self.fifoSamples) > noSamples:
+            print("samples of an incomplete block dropped: ", len(self.fifoSamples) - noSamples)
+        while len(self.fifoSamples) > noSamples:
+            self.fifoSamples.popleft()
+        request.samples = list(self.fifoSamples)
+        self.fifoSamples.clear()
+
+    def GetPipelineStatistics(self):
+        return self.pipelineStatistics.asDict()
+
+    def setResponseTimeout(self, timeoutSec):
+        self.responseTimeout = timeoutSec
+        self.arduino.comm.timeout = timeoutSec
+
+    def getLatencyStatistics(self, command):
+        if command not in self.latencyStatistics:
+            self.latencyStatistics[command] = CommandLatencyStatistics()
+        return self.latencyStatistics[command]
+
+    def printLatencyStatistics(self):
+        for command in sorted(self.latencyStatistics):
+            print(command, ": ", self.latencyStatistics[command])
+
+    def setBaudRate(self, baud):
+        self.baud = baud
+        self.arduino.comm.baudrate = baud
+        self.arduino.baud_rate = baud
+        self.serial_port.baudrate = baud
+
+    def NegotiateBaudRate(self, maxBaud):
+        """ Ask the Arduino for the highest common baud rate up to maxBaud, switch to it
+            and confirm it with a ping. Returns the baud rate in use afterwards.
+        """
+        maxBaud = max([baud for baud in supportedBaudRates if baud <= maxBaud] + [defaultBaudRate])
+        ReceiveMsg = self.SendAndReceive('areYouReady', 'baudRateAccepted', maxBaud, arg_formats='L')
+        if ReceiveMsg is None:
+            print("baud rate negotiation not answered, keep", self.baud, "baud")
+            return self.baud
+        acceptedBaud = min(ReceiveMsg[1][0], maxBaud)
+
+        # switch and confirm the new baud rate with a ping
+        self.setBaudRate(acceptedBaud)
+        self.arduino.comm.reset_input_buffer()
+        if self.SendAndReceive('areYouReady', 'sendAcknowledge') is not None:
+            print("baud rate negotiated: ", acceptedBaud)
+            return self.baud
+
+        # wait for the Arduino to fall back to the default baud rate
+        print("baud rate", acceptedBaud, "failed, fall back to", defaultBaudRate)
+        time.sleep(baudRateFallbackSec)
+        self.setBaudRate(defaultBaudRate)
+        self.arduino.comm.reset_input_buffer()
+        self.SendAndReceive('areYouReady', 'sendAcknowledge')
+        return self.baud
+
+    def GetReceivedBytesPerSec(self):
+        """ Effective receive rate of the link since the previous call in bytes/s
+        """
+        now = time.perf_counter()
+        bytesPerSec = (self.arduino.bytesReceived - self.lastBytesReceived) / max(now - self.lastThroughputTime, 1e-9)
+        self.lastThroughputTime = now
+        self.lastBytesReceived = self.arduino.bytesReceived
+        return bytesPerSec
+
+    def MeasureLinkThroughput(self, durationSec=2.0):
+        """ Poll all channels back-to-back for durationSec and report the bytes/s achieved
+            compared to the maximum of the baud rate (10 bits per byte).
+        """
+        startReceived = self.arduino.bytesReceived
+        startSent = self.arduino.bytesSent
+        noRequests = 0
+        startTime = time.perf_counter()
+        # the window is kept full, SubmitCommand waits for a free slot
+        requests = deque()
+        while time.perf_counter() - startTime < durationSec:
+            requests.append(self.SubmitCommand('sendAllChannels', 'allChannelsValues'))
+            while len(requests) > 0 and requests[0].done():
+                requests.popleft()
+            noRequests = noRequests + 1
+        for request in requests:
+            request.result()
+        elapsedSec = time.perf_counter() - startTime
+        result = {'baud': self.baud,
+                  'requestsPerSec': noRequests / elapsedSec,
+                  'receivedBytesPerSec': (self.arduino.bytesReceived - startReceived) / elapsedSec,
+                  'sentBytesPerSec': (self.arduino.bytesSent - startSent) / elapsedSec,
+                  'maxBytesPerSec': self.baud / 10.0}
+        print("link throughput: {requestsPerSec:.1f} requests/s, received {receivedBytesPerSec:.0f} bytes/s, "
+              "sent {sentBytesPerSec:.0f} bytes/s of max. {maxBytesPerSec:.0f} bytes/s at {baud} baud".format(**result))
+        return result
+
     def GetMeasuredVoltage(self,  channelIndex):
-        #print("GetMeasuredVoltage1")
-        #print("channel index =", channelIndex)        
-        try:
-            if self.sem.available() > 0:
-                self.sem.acquire(1)
-                self.SendVoltageRequestMsg(channelIndex)
-                time.sleep(0.1)        
-                self.loopCounter = self.loopCounter +1
-                # print("loop counter = ", self.loopCounter)
-                # self.printReceiveMsg()
-                ReceiveMsg = self.messenger.receive()
-                self.sem.release(1)
-                return ReceiveMsg[1][0]
-            else:
-                ReceiveMsg = ('measure value skipped', [0.0,0.0])
-                self.sem.release(1)
-                self.printReceiveMsg()
-                return ReceiveMsg[1][0]
-        except TypeError:
-            print("channel 1 measured value receive error")
-            ReceiveMsg = self.messenger.receive()
-            ReceiveMsg = ('channel 1 measured value receive error', [0.0,0.0])
-            return ReceiveMsg[1][0]
+        # returns the voltage or None if the request failed (counted in the pipeline statistics)
+        ReceiveMsg = self.SendAndReceive('sendMeasuredVoltage{}'.format(channelIndex), 'floatValue')
+        if ReceiveMsg is None:
+            print("channel", channelIndex, "measured value not received")
+            return None
+        self.loopCounter = self.loopCounter +1
+        return ReceiveMsg[1][0]
 
     def GetSwitchStatus(self,  channelIndex):
-        #print("GetSwitchStatus")
-        #print("channel index =", channelIndex)        
-        try:
-            if self.sem.available() > 0:
-                self.sem.acquire(1)
-                self.SendSwitchRequestMsg(channelIndex)
-                time.sleep(0.1)        
-                # self.loopCounter = self.loopCounter +1
-                # print("loop counter = ", self.loopCounter)
-                # self.printReceiveMsg()
-                ReceiveMsg = self.messenger.receive()
-                self.sem.release(1)
-                return ReceiveMsg[1][0]
-            else:
-                ReceiveMsg = ('measure value skipped', [0.0,0.0])
-                self.sem.release(1)
-                return ReceiveMsg[1][0]
-        except TypeError:
-            print("Switch status receive error")
-            ReceiveMsg = self.messenger.receive()
-            ReceiveMsg = ('Switch status receive error', [0.0,0.0])
-            return ReceiveMsg[1][0]
-
-    def TurnOnMeasurements(self):
-        if self.sem.available() > 0:
-            self.sem.acquire(1)
-            self.messenger.send('turnOnMeasurements')
-            time.sleep(0.1)
-            ReceiveMsg = self.messenger.receive()
-            print("TurnOnMeasurements: ",ReceiveMsg)
-            self.sem.release(1)
+        # returns the switch status or None if the request failed
+        ReceiveMsg = self.SendAndReceive('sendSwitchStatus{}'.format(channelIndex), 'int16Value')
+        if ReceiveMsg is None:
+            print("channel", channelIndex, "switch status not received")
+            return None
+        return ReceiveMsg[1][0]
+
+    def GetAllChannels(self):
+        # request all voltages and switch states with a single command
+        # returns ([voltage1..voltage4], [switch1..switch4]) or None if the request failed
+        ReceiveMsg = self.SendAndReceive('sendAllChannels', 'allChannelsValues')
+        if ReceiveMsg is None:
+            print("all channels measured values not received")
+            return None
+        self.loopCounter = self.loopCounter +1
+        return ReceiveMsg[1][0:4], ReceiveMsg[1][4:8]
+
+    def SendControlCommand(self, command, label, *args, **kwargs):
+        ReceiveMsg = self.SendAndReceive(command, 'sendAcknowledge', *args, **kwargs)
+        if ReceiveMsg is None:
+            print("error: could not " + label)
+            return False
+        print(label + ": ",ReceiveMsg)
+        return True
+
+    def TurnOnMeasurements(self, streaming=False, binaryFrames=False):
+        if streaming and binaryFrames:
+            # the Arduino pushes every new sample as compact binary frame
+            self.frameDecoder.reset()
+            self.binaryStreamingStarting = True
+            try:
+                self.streaming = self.SendControlCommand('turnOnMeasurements', "turn on the measurements binary streaming",
+                                                         2, arg_formats='i')
+            finally:
+                self.binaryStreamingStarting = False
+            self.binaryStreaming = self.streaming
+        elif streaming:
+            # the Arduino pushes every new sample as streamedSample frame
+            self.streaming = self.SendControlCommand('turnOnMeasurements', "turn on the measurements streaming",
+                                                     1, arg_formats='i')
         else:
-            print("error: could not turn on the measurements")
+            self.SendControlCommand('turnOnMeasurements', "turn on the measurements")
 
     def TurnOffMeasurements(self):
-        if self.sem.available() > 0:
-            self.sem.acquire(1)
-            self.messenger.send('turnOffMeasurements')
-            time.sleep(0.1)
-            ReceiveMsg = self.messenger.receive()
-            print("TurnOffMeasurements: ",ReceiveMsg)
-            self.sem.release(1)
+        if self.binaryStreaming:
+            self.StopBinaryStreaming()
         else:
-            print("error: could not turn off the measurements")
+            self.SendControlCommand('turnOffMeasurements', "turn off the measurements")
+        self.streaming = False
+
+    def StopBinaryStreaming(self):
+        # the acknowledge arrives behind the binary frames still on their way
+        acknowledge = b'to PC: turn off measurements;'
+        with self.ioLock:
+            self.messenger.send('turnOffMeasurements')
+            received = b''
+            deadline = time.perf_counter() + self.responseTimeout
+            while acknowledge not in received and time.perf_counter() < deadline:
+                received += self.arduino.comm.read(max(1, self.arduino.comm.in_waiting))
+            self.arduino.bytesReceived = self.arduino.bytesReceived + len(received)
+            end = received.find(acknowledge)
+            if end < 0:
+                print("error: turn off the measurements not acknowledged")
+                end = len(received)
+            self.queueSampleBlock(self.frameDecoder.decode(received[:end]))
+        self.binaryStreaming = False
+        print("turn off the measurements binary streaming: ", self.GetFrameStatistics())
+
+    def ReadSampleBlock(self):
+        """ Decode all binary sample frames received so far in one go, never waits for new frames.
+            Returns a SampleBlock with one row per sample.
+        """
+        with self.ioLock:
+            data = self.arduino.comm.read(self.arduino.comm.in_waiting)
+            self.arduino.bytesReceived = self.arduino.bytesReceived + len(data)
+        return self.frameDecoder.decode(data)
+
+    def GetFrameStatistics(self):
+        return {'frames': self.frameDecoder.noFrames,
+                'crcErrors': self.frameDecoder.noCrcErrors,
+                'lostSamples': self.frameDecoder.noLostSamples,
+                'skippedBytes': self.frameDecoder.noSkippedBytes}
+
+    def queueSampleBlock(self, block):
+        for k in range(len(block.timestamps)):
+            self.streamedSamples.append(StreamedSample(float(block.timestamps[k]), block.voltages[k].tolist(),
+                                                       block.switchStates[k].tolist()))
+
+    def queueStreamedSample(self, ReceiveMsg):
+        values = ReceiveMsg[1]
+        self.streamedSamples.append(StreamedSample(values[0]/1000.0, values[1:5], values[5:9]))
+
+    def StreamedSamples(self):
+        """ Generator over the streamed samples received so far, never waits for new samples.
+            Only the rest of a frame which has already started to arrive is read.
+        """
+        with instrumentation.timed('serial.stream'):
+            if self.binaryStreaming:
+                self.queueSampleBlock(self.ReadSampleBlock())
+            else:
+                # responses to outstanding requests arriving in between are handed to them
+                self.ReceiveResponses(wait=False)
+        while len(self.streamedSamples) > 0:
+            yield self.streamedSamples.popleft()
         
-    def ResetMeasurements(self):
-        if self.sem.available() > 0:
-            self.sem.acquire(1)
-            self.messenger.send('resetMeasurements')   
-            time.sleep(0.1)
-            ReceiveMsg = self.messenger.receive()
-            print("ResetMeasurements: ",ReceiveMsg)
-            self.sem.release(1)
+    def GetAdcConfig(self):
+        # returns the AdcConfig of the Arduino or None if the request failed
+        ReceiveMsg = self.SendAndReceive('getAdcConfig', 'adcConfigValues')
+        if ReceiveMsg is None:
+            print("ADC configuration not received")
+            return None
+        return self.applyAdcConfig(ReceiveMsg[1])
+
+    def SetAdcConfig(self, continuous, dataRateSPS, rangeMV):
+        """ Switch the ADS1115 to continuous (True) or single shot mode with the data rate
+            and range, returns the AdcConfig in use afterwards or None if the request failed.
+            Raises ValueError for data rates and ranges the ADS1115 does not support.
+        """
+        if dataRateSPS not in adcDataRates:
+            raise ValueError("data rate {} SPS is not one of {}".format(dataRateSPS, adcDataRates))
+        if rangeMV not in adcRanges:
+            raise ValueError("range {} mV is not one of {}".format(rangeMV, adcRanges))
+        ReceiveMsg = self.SendAndReceive('setAdcConfig', 'adcConfigValues', 1 if continuous else 0,
+                                         dataRateSPS, rangeMV, arg_formats='iii')
+        if ReceiveMsg is None:
+            print("error: ADC configuration not acknowledged")
+            return None
+        adcConfig = self.applyAdcConfig(ReceiveMsg[1])
+        if (adcConfig.continuous, adcConfig.dataRateSPS, adcConfig.rangeMV) != (bool(continuous), dataRateSPS, rangeMV):
+            print("error: ADC configuration not applied, in use: ", adcConfig)
         else:
-            print("error: could not reset the measurements")
+            print("ADC configuration: ", adcConfig)
+        return adcConfig
+
+    def applyAdcConfig(self, values):
+        # the codes of the binary frames are scaled with the range in use
+        adcConfig = AdcConfig(values[0] == 1, values[1], values[2], values[3])
+        self.frameDecoder.fullScaleVolt = adcConfig.rangeMV / 1000.0
+        return adcConfig
+
+    def ReadSampleFifo(self, maxSamples=sampleFifoSize):
+        """ Read up to maxSamples of the samples buffered by the Arduino, the oldest first.
+            Returns a SampleFifoBlock or None if the request failed.
+        """
+        with self.ioLock:
+            request = self.SubmitCommand('sendSampleBlock', 'sampleBlock', maxSamples, arg_formats='i')
+            # the whole block has to arrive before its end
+            request.deadline = request.deadline + maxSamples * fifoSampleBytes * 10.0 / self.baud
+        ReceiveMsg = request.result()
+        if ReceiveMsg is None:
+            print("error: sample block not received")
+            return None
+        noSamples, remaining, noOverflows = ReceiveMsg[1]
+        if len(request.samples) < noSamples:
+            print("sample block incomplete: ", len(request.samples), "of", noSamples, "samples received")
+        self.noFifoOverflows = noOverflows
+        return SampleFifoBlock(request.samples, remaining, noOverflows)
+
+    def DrainSampleFifo(self, maxBlocks=4):
+        """ All samples buffered by the Arduino (with at most maxBlocks requests), the oldest first
+        """
+        samples = []
+        for k in range(maxBlocks):
+            block = self.ReadSampleFifo()
+            if block is None:
+                break
+            samples.extend(block.samples)
+            if block.remaining == 0:
+                break
+        return samples
+
+    def ResetMeasurements(self):
+        self.SendControlCommand('resetMeasurements', "reset the measurements")
                 
     def wrapper(self, command):
         # ser = serial.Serial('/dev/cu.wchusbserial1410', 9600, timeout=1, rtscts=1)
@@ -224,3 +703,127 @@ class MsgInterface(object):
         s = ser.read(100)
         print(s)
         ser.close()
+
+class MeasurementsWorker(QObject):
+    """ Acquisition worker which owns the MsgInterface and does all serial I/O in its own thread.
+        The samples are handed to the GUI as batches by the queued samplesReady signal,
+        so the GUI only consumes them and no sample is dropped while the GUI is busy.
+
+        worker = MeasurementsWorker(msgIF, periodSec, streaming=True)
+        worker.samplesReady.connect(guiSlot)
+        worker.startInThread()
+    """
+    # list of StreamedSample
+    samplesReady = pyqtSignal(object)
+
+    def __init__(self, msgIF, periodSec, streaming=False, binaryFrames=False, fifo=False):
+        QObject.__init__(self)
+        self.msgIF = msgIF
+        self.periodSec = periodSec
+        self.streaming = streaming
+        self.binaryFrames = binaryFrames
+        # without streaming the samples buffered by the Arduino are read in blocks
+        self.fifo = fifo
+        self.measurementsOn = False
+        self.scheduler = None
+        # polling requests sent but not yet handed over
+        self.pendingRequests = deque()
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.start)
+
+    def startInThread(self):
+        self.thread.start()
+
+    def stopThread(self):
+        # stop the timer in the worker thread before the thread is stopped
+        QMetaObject.invokeMethod(self, "stop", Qt.BlockingQueuedConnection)
+        self.thread.quit()
+        self.thread.wait()
+
+    @pyqtSlot()
+    def start(self):
+        print("Measurements worker started")
+        self.scheduler = PeriodicScheduler(self.periodSec)
+        self.scheduler.tick.connect(self.acquire)
+        self.scheduler.start()
+        self.setMeasurementsOn(True)
+
+    @pyqtSlot()
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            print("measurements timing: ", self.scheduler.statistics)
+        if self.measurementsOn:
+            self.setMeasurementsOn(False)
+
+    def getTimingStatistics(self):
+        if self.scheduler is None:
+            return {}
+        return self.scheduler.getStatistics()
+
+    @pyqtSlot()
+    def acquire(self):
+        if not self.measurementsOn:
+            return
+        with instrumentation.timed('acquire'):
+            self.acquireSamples()
+
+    def acquireSamples(self):
+        if self.streaming:
+            # all samples pushed since the last call
+            samples = list(self.msgIF.StreamedSamples())
+        elif self.fifo:
+            # all samples the Arduino has buffered since the last period, timestamps of the Arduino
+            samples = self.msgIF.DrainSampleFifo()
+        else:
+            # request all voltages and switch states in one frame, timestamp taken on the PC when
+            # sent. Only the oldest outstanding request is waited for, if the round trip is longer
+            # than the period the later requests stay outstanding. Failed requests give no sample.
+            self.pendingRequests.append(self.msgIF.SubmitCommand('sendAllChannels', 'allChannelsValues'))
+            self.pendingRequests[0].result()
+            samples = []
+            while len(self.pendingRequests) > 0 and self.pendingRequests[0].done():
+                request = self.pendingRequests.popleft()
+                if request.response is not None:
+                    values = request.response[1]
+                    samples.append(StreamedSample(request.sendMonotonic, values[0:4], values[4:8]))
+        instrumentation.count('samplesAcquired', len(samples))
+        if len(samples) > 0:
+            self.samplesReady.emit(samples)
+
+    @pyqtSlot(bool)
+    def setMeasurementsOn(self, on):
+        if on:
+            self.msgIF.TurnOnMeasurements(streaming=self.streaming, binaryFrames=self.binaryFrames)
+        else:
+            self.msgIF.TurnOffMeasurements()
+            # hand over the samples received until the measurements were turned off
+            samples = list(self.msgIF.StreamedSamples())
+            if len(samples) > 0:
+                self.samplesReady.emit(samples)
+        self.measurementsOn = on
+
+    @pyqtSlot(float)
+    def setPeriod(self, periodSec):
+        self.periodSec = periodSec
+        if self.scheduler is not None:
+            self.scheduler.setPeriod(periodSec)
+
+    @pyqtSlot(bool, int, int)
+    def setAdcConfig(self, continuous, dataRateSPS, rangeMV):
+        # no command response can be told apart from the binary frames, the binary
+        # streaming is paused while the ADS1115 is configured
+        pauseStreaming = self.measurementsOn and self.binaryFrames
+        if pauseStreaming:
+            self.setMeasurementsOn(False)
+        try:
+            self.msgIF.SetAdcConfig(continuous, dataRateSPS, rangeMV)
+        except ValueError as e:
+            print("error:", e)
+        if pauseStreaming:
+            self.setMeasurementsOn(True)
+
+    @pyqtSlot()
+    def resetMeasurements(self):
+        self.msgIF.ResetMeasurements()
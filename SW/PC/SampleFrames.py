@@ -0,0 +1,133 @@
+"""
+SampleFrames.py
+
+compact binary sample frames streamed by the Arduino in binary streaming mode
+(suited for Max OSX, Windows, Linux)
+
+Frame layout (little endian, 19 bytes), has to match SampleFrame in CmdMessengerPC.h:
+
+    sync        2 bytes   0xA5 0x5A
+    sequence    uint16    incremented with every sample
+    timestamp   uint32    milliseconds since the Arduino start
+    codes       4 x int16 raw ADS1115 conversion results of the channels 1..4
+    switches    uint8     bit k set if the switch of channel k+1 is in position 1:1
+    crc         uint16    CRC-16/CCITT (poly 0x1021, init 0xFFFF) over sequence..switches
+
+"""
+import struct
+from collections import namedtuple
+import numpy as np
+
+SYNC_BYTES = b'\xa5\x5a'
+FRAME_SIZE = 19
+NO_CHANNELS = 4
+
+frameDtype = np.dtype([('sync', '<u2'),
+                       ('sequence', '<u2'),
+                       ('timestamp', '<u4'),
+                       ('codes', '<i2', (NO_CHANNELS,)),
+                       ('switches', 'u1'),
+                       ('crc', '<u2')])
+
+# block of decoded samples, one row per sample
+SampleBlock = namedtuple('SampleBlock', ['sequence', 'timestamps', 'codes', 'voltages', 'switchStates'])
+
+def makeCrcTable():
+    table = np.zeros(256, dtype=np.uint16)
+    for byte in range(256):
+        crc = byte << 8
+        for bit in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xffff
+            else:
+                crc = (crc << 1) & 0xffff
+        table[byte] = crc
+    return table
+
+crcTable = makeCrcTable()
+
+def crc16(data):
+    crc = 0xffff
+    for byte in bytearray(data):
+        crc = ((crc << 8) & 0xffff) ^ int(crcTable[((crc >> 8) ^ byte) & 0xff])
+    return crc
+
+def encodeSampleFrame(sequence, timestampMs, codes, switchMask):
+    """ Build a frame like the Arduino does, used by the simulator
+    """
+    payload = struct.pack('<HL4hB', sequence & 0xffff, timestampMs & 0xffffffff,
+                          codes[0], codes[1], codes[2], codes[3], switchMask)
+    return SYNC_BYTES + payload + struct.pack('<H', crc16(payload))
+
+class SampleFrameDecoder(object):
+    def __init__(self, fullScaleVolt=6.144):
+        # voltage of the full scale code 32768 for the selected ADS1115 range
+        self.fullScaleVolt = fullScaleVolt
+        self.buffer = b''
+        self.lastSequence = None
+        # link quality counters
+        self.noFrames = 0
+        self.noCrcErrors = 0
+        self.noLostSamples = 0
+        self.noSkippedBytes = 0
+
+    def decode(self, data):
+        """ Append the received bytes and decode all complete frames at once.
+            Bytes which do not belong to a valid frame are skipped, so the decoder
+            resynchronizes on the next sync bytes after garbage or a corrupted frame.
+        """
+        buf = np.frombuffer(self.buffer + data, dtype=np.uint8)
+        noBytes = len(buf)
+
+        # candidate frame starts: sync bytes with a complete frame behind
+        starts = np.flatnonzero((buf[:-1] == SYNC_BYTES[0]) & (buf[1:] == SYNC_BYTES[1]))
+        starts = starts[starts + FRAME_SIZE <= noBytes]
+
+        # gather the candidate frames as rows and check the CRC of all rows together
+        frames = buf[starts[:, None] + np.arange(FRAME_SIZE)]
+        crc = np.full(len(starts), 0xffff, dtype=np.uint16)
+        for column in range(2, FRAME_SIZE - 2):
+            crc = (crc << 8) ^ crcTable[((crc >> 8) ^ frames[:, column]) & 0xff]
+        receivedCrc = frames[:, FRAME_SIZE - 2].astype(np.uint16) | (frames[:, FRAME_SIZE - 1].astype(np.uint16) << 8)
+        valid = crc == receivedCrc
+
+        # sync bytes inside a valid frame are payload, not frame starts
+        validStarts = starts[valid]
+        if np.any(np.diff(validStarts) < FRAME_SIZE):
+            keep = np.zeros(len(validStarts), dtype=bool)
+            frameEnd = 0
+            for k, start in enumerate(validStarts):
+                if start >= frameEnd:
+                    keep[k] = True
+                    frameEnd = start + FRAME_SIZE
+            validStarts = validStarts[keep]
+            valid[np.flatnonzero(valid)[~keep]] = False
+        samples = frames[valid].copy().view(frameDtype).reshape(-1)
+
+        # keep the bytes which may start an incomplete frame
+        if len(validStarts) > 0:
+            consumedEnd = max(validStarts[-1] + FRAME_SIZE, noBytes - FRAME_SIZE + 1)
+        else:
+            consumedEnd = max(0, noBytes - FRAME_SIZE + 1)
+        self.buffer = buf[consumedEnd:].tobytes()
+
+        # update the link quality counters
+        self.noFrames += len(samples)
+        self.noCrcErrors += int(np.count_nonzero(~valid))
+        self.noSkippedBytes += int(consumedEnd) - len(samples) * FRAME_SIZE
+        sequence = samples['sequence']
+        if len(sequence) > 0:
+            if self.lastSequence is not None:
+                sequence = np.concatenate(([self.lastSequence], sequence)).astype(np.uint16)
+            self.noLostSamples += int(np.sum((np.diff(sequence) - 1).astype(np.uint16)))
+            self.lastSequence = samples['sequence'][-1]
+
+        # convert to physical values
+        codes = samples['codes']
+        voltages = codes * (self.fullScaleVolt / 32768.0)
+        switchStates = (samples['switches'][:, None] >> np.arange(NO_CHANNELS)) & 1
+        return SampleBlock(samples['sequence'], samples['timestamp'] / 1000.0, codes, voltages, switchStates)
+
+    def reset(self):
+        self.buffer = b''
+        self.lastSequence = None
@@ -12,29 +12,23 @@ Last change on 20th May 2021
 
 """
 import numpy as np
-import matplotlib
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-matplotlib.use('Qt5Agg')
 from PyQt5.Qt import *
 from PyQt5.QtCore import *
 from MeasurementsThread import *
-
-class MplCanvas(FigureCanvasQTAgg):
-    def __init__(self, parent=None, width=7, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
+import UseDASCommon
+from DASCommon.PlotCanvas import MplCanvas
+from DASCommon.MinMaxPyramid import MinMaxPyramid
+from Instrumentation import instrumentation
 
 class VoltageMeasurementsWindow(QWidget):
-    def __init__(self, channelString):
+    def __init__(self, channelString, historyCapacity=1000000):
         QWidget.__init__(self)
         
         # measured values of voltage (actual and mean)
         self.actualVoltage = 0.0
-        self.noValidMeasurements = 0
         
-        # array of measurements
+        # history of measurements
+        self.historyCapacity = historyCapacity
         self.initMeasurementsArray() 
         
         # create the plot widget
@@ -50,11 +44,8 @@ class VoltageMeasurementsWindow(QWidget):
         titleFont.setPointSize(25)
         self.voltagePlotGroupBox.setFont(titleFont)
         
-        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100)
-        self.plotCanvas.axes.plot(self.measuredVoltageArray)
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel(channelString + 'voltage / V')
-        self.plotCanvas.axes.grid()
+        self.plotCanvas =  MplCanvas(self, width=7, height=3, dpi=100,
+                                     xlabel='discrete time instance', ylabel=channelString + 'Voltage / V')
         self.plotCanvas.setFixedSize(700, 370)
         
         # create the layout and add the plot widget
@@ -129,22 +120,23 @@ class VoltageMeasurementsWindow(QWidget):
         return stylesheet    
 
     def updatePlot(self,  channelString):
-        self.plotCanvas.axes.clear()
-        self.plotCanvas.axes.plot(self.measuredVoltageArray)
-        self.plotCanvas.axes.grid()
-        self.plotCanvas.axes.set_xlabel('discrete time instance')
-        self.plotCanvas.axes.set_ylabel(channelString + 'Voltage / V')
-        # update the plot
-        self.plotCanvas.draw()
+        # update the plot, the labels are kept by the canvas
+        with instrumentation.timed('updatePlot'):
+            self.plotCanvas.updateData(self.measuredVoltages)
                 
     def updateMeasurementsArray(self, VoltageValue):
-        self.measuredVoltageArray[self.arrayIndex] = VoltageValue
-        self.arrayIndex = self.arrayIndex + 1
-        if (self.arrayIndex > self.maxArraySize) :
-            self.arrayIndex = 0
+        self.measuredVoltages.append(VoltageValue)
+
+    def updateMeasurementsBlock(self, voltageValues):
+        self.measuredVoltages.extend(voltageValues)
     
+    def setHistoryCapacity(self, historyCapacity):
+        # the newest voltages are kept
+        voltages = self.measuredVoltages.view()
+        self.historyCapacity = historyCapacity
+        self.initMeasurementsArray()
+        self.measuredVoltages.extend(voltages[-historyCapacity:])
+
     def initMeasurementsArray(self):
-        self.maxArraySize = 100
-        self.measuredVoltageArray = 0.0*np.ones(self.maxArraySize+1)
-        self.arrayIndex = 0
-        self.noValidMeasurements = 0
+        # the last historyCapacity voltages in chronological order
+        self.measuredVoltages = MinMaxPyramid(self.historyCapacity)
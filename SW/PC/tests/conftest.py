@@ -0,0 +1,21 @@
+"""
+Fixtures of the tests of the PC application, the modules are imported as when the
+application is started from SW/PC:
+
+  python3 -m pytest -q SW/PC/tests
+
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ArduinoSimulator import ArduinoSimulator
+
+@pytest.fixture
+def simulator():
+    simulator = ArduinoSimulator(samplePeriodSec=0.01)
+    simulator.start()
+    yield simulator
+    simulator.stop()
@@ -0,0 +1,139 @@
+"""
+Tests of the asyncio transport against the ArduinoSimulator on a pty pair
+"""
+import asyncio
+import struct
+import threading
+import time
+import pytest
+from PyQt5.QtCore import QCoreApplication
+from AsyncMsgInterface import AsyncMsgInterface, CommandError, QtAsyncioBridge, splitFrames
+
+def runWithInterface(simulator, check, **kwargs):
+    """ Run check(msgIF) on an interface opened to the simulator, closed afterwards
+    """
+    async def run():
+        msgIF = AsyncMsgInterface(simulator.port_name, settleSec=0.05, **kwargs)
+        await msgIF.open()
+        try:
+            return await check(msgIF)
+        finally:
+            msgIF.close()
+    return asyncio.run(run())
+
+def test_splitFrames_complete_frames_and_rest():
+    frames, rest = splitFrames(b'18,abc;19,de;2,x')
+    assert frames == [b'18,abc;', b'19,de;']
+    assert rest == b'2,x'
+
+def test_splitFrames_escaped_separators():
+    # an escaped separator belongs to the argument, an escaped escape does not escape the separator
+    frames, rest = splitFrames(b'18,a/;b;19,c//;20,d///;e;')
+    assert frames == [b'18,a/;b;', b'19,c//;', b'20,d///;e;']
+    assert rest == b''
+
+@pytest.mark.parametrize('chunkSize', [1, 2, 3, 5, 7])
+def test_splitFrames_across_chunk_boundaries(chunkSize):
+    stream = b'18,a/;b;19,c//;20,/,/;/;;21,' + struct.pack('<f', 2.737074613571167) + b';'
+    expected, expectedRest = splitFrames(stream)
+    frames = []
+    received = b''
+    # the chunks also end between an escape character and the separator it escapes
+    for start in range(0, len(stream), chunkSize):
+        newFrames, received = splitFrames(received + stream[start:start + chunkSize])
+        frames.extend(newFrames)
+    assert frames == expected
+    assert received == expectedRest
+
+def test_responses_are_framed(simulator):
+    async def check(msgIF):
+        voltages = [await msgIF.GetMeasuredVoltage(k) for k in range(1, 5)]
+        switchStates = [await msgIF.GetSwitchStatus(k) for k in range(1, 5)]
+        allChannels = await msgIF.GetAllChannels()
+        return voltages, switchStates, allChannels
+    voltages, switchStates, (allVoltages, allSwitchStates) = runWithInterface(simulator, check)
+    assert voltages == pytest.approx(simulator.measuredVoltages)
+    assert switchStates == simulator.switchStatus
+    assert allVoltages == pytest.approx(simulator.measuredVoltages)
+    assert allSwitchStates == simulator.switchStatus
+
+def test_pipelined_responses_reach_their_commands(simulator):
+    async def check(msgIF):
+        return await asyncio.gather(msgIF.GetSwitchStatus(1), msgIF.GetMeasuredVoltage(2),
+                                    *[msgIF.GetMeasuredVoltage(k % 4 + 1) for k in range(40)])
+    results = runWithInterface(simulator, check, maxInFlight=8)
+    assert results[0] == simulator.switchStatus[0]
+    assert results[1] == pytest.approx(simulator.measuredVoltages[1])
+    assert results[2:] == pytest.approx([simulator.measuredVoltages[k % 4] for k in range(40)])
+
+def test_escaped_separators_in_binary_arguments(simulator):
+    # float32 values whose bytes are the field, command and escape separators
+    simulator.measuredVoltages = [struct.unpack('<f', value)[0] for value in
+                                  (b'\x3b\x2c\x2f\x40', b'\x2f\x2f\x3b\x40', b'\x2c\x3b\x3b\x40', b'\x00\x2f\x2c\x40')]
+    async def check(msgIF):
+        return [await msgIF.GetMeasuredVoltage(k) for k in range(1, 5)], await msgIF.GetAllChannels()
+    voltages, (allVoltages, allSwitchStates) = runWithInterface(simulator, check)
+    assert voltages == simulator.measuredVoltages
+    assert allVoltages == simulator.measuredVoltages
+    assert allSwitchStates == simulator.switchStatus
+
+def test_streamed_samples_between_responses(simulator):
+    async def check(msgIF):
+        await msgIF.TurnOnMeasurements(streaming=True)
+        responses = await asyncio.gather(*[msgIF.GetAllChannels() for k in range(20)])
+        await asyncio.sleep(0.2)
+        await msgIF.TurnOffMeasurements()
+        return responses, list(msgIF.StreamedSamples())
+    responses, samples = runWithInterface(simulator, check)
+    assert all(switchStates == simulator.switchStatus for voltages, switchStates in responses)
+    assert len(samples) > 0
+    assert samples[0].voltages == pytest.approx(simulator.measuredVoltages)
+
+def test_response_timeout(simulator):
+    simulator.latencySec = 0.3
+    async def check(msgIF):
+        with pytest.raises(asyncio.TimeoutError):
+            await msgIF.GetMeasuredVoltage(1)
+        # the late response is dropped, the next command gets its own response
+        msgIF.responseTimeout = 1.0
+        return await msgIF.GetSwitchStatus(1), msgIF.latencyStatistics['sendMeasuredVoltage1']
+    switchStatus, statistics = runWithInterface(simulator, check, responseTimeout=0.1)
+    assert switchStatus == simulator.switchStatus[0]
+    assert statistics.timeouts == 1
+
+def test_error_response_fails_the_oldest_command(simulator):
+    async def check(msgIF):
+        # the simulator does not know askUsIfReady and answers with an error
+        with pytest.raises(CommandError):
+            await msgIF.SendAndReceive('askUsIfReady', 'sendAcknowledge')
+        return await msgIF.GetMeasuredVoltage(3)
+    assert runWithInterface(simulator, check) == pytest.approx(simulator.measuredVoltages[2])
+
+def test_QtAsyncioBridge_delivers_to_the_Qt_thread(simulator):
+    application = QCoreApplication.instance() or QCoreApplication([])
+    bridge = QtAsyncioBridge()
+    bridge.start()
+    msgIF = AsyncMsgInterface(simulator.port_name, settleSec=0.05)
+    results = []
+    try:
+        bridge.submit(msgIF.open()).result(timeout=5.0)
+        future = bridge.submit(msgIF.GetAllChannels(),
+                               lambda result: results.append((threading.current_thread(), result)))
+        future.result(timeout=5.0)
+        # a failed command is reported, its callback is not called
+        failed = bridge.submit(msgIF.SendAndReceive('askUsIfReady', 'sendAcknowledge'), results.append)
+        with pytest.raises(CommandError):
+            failed.result(timeout=5.0)
+        # the queued results are delivered by the Qt event loop
+        deadline = time.monotonic() + 2.0
+        while len(results) == 0 and time.monotonic() < deadline:
+            application.processEvents()
+        application.processEvents()
+    finally:
+        bridge.loop.call_soon_threadsafe(msgIF.close)
+        bridge.stop()
+    assert len(results) == 1
+    thread, (voltages, switchStates) = results[0]
+    assert thread is threading.current_thread()
+    assert voltages == pytest.approx(simulator.measuredVoltages)
+    assert switchStates == simulator.switchStatus